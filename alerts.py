@@ -0,0 +1,340 @@
+"""
+Valuation alert rules, evaluated in bulk on every new market snapshot.
+
+A rule compares a column of the valued table (same names and units as
+/api/tickers, so DY is 0.08 for 8%) with a constant or with another column:
+
+    {"ticker": "PETR4", "column": "cotacao", "op": "<", "ref": "Preço Justo (Graham)"}
+    {"column": "dy", "op": ">", "value": 0.08}                  # every portfolio ticker
+    {"portfolio": "dividendos", "column": "Margem Barsi %", "op": "crosses", "value": 0}
+
+Without a ticker, a rule applies to the tickers of `portfolio`, or of all saved
+portfolios. Rules see the same rows as /api/tickers (core.market_rows: current
+prices, and Yahoo data for tickers outside Fundamentus such as FIIs). All rules are compiled into flat (row, column, threshold) arrays over
+the valued frame, so one pass of NumPy indexing evaluates every (rule, ticker)
+pair whatever the number of rules. Only edges become events: a comparison that
+turns true (or is true the first time it is seen), or a 'crosses' whose side
+changed. Events are printed, appended to alerts.log (JSON lines, next to the
+rules file) and, when ALERT_WEBHOOK_URL is set, POSTed there in one batch per
+evaluation.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import requests
+
+import core
+
+ALERTS_FILE = os.environ.get('ALERTS_FILE', os.path.join(core.BASE_DIR, 'data', 'alerts.json'))
+TEMP_ALERTS_FILE = os.path.join(core.TEMP_DIR, 'alerts.json')
+ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL')
+WEBHOOK_TIMEOUT = 5  # seconds
+EVENTS_KEPT = 200
+
+OPS = ['<', '<=', '>', '>=', 'crosses']
+CROSSES = OPS.index('crosses')
+UNSEEN = 2  # state of a crossing whose side is not known yet
+
+_lock = threading.Lock()
+_eval_lock = threading.Lock()  # one evaluation at a time
+_state = {'path': None, 'store': None, 'generation': 0}
+_compiled = {'key': None, 'rules': None, 'tickers_key': None, 'tickers': None}
+_events = deque(maxlen=EVENTS_KEPT)
+
+def alerts_path():
+    """
+    ALERTS_FILE if its directory is writable, else a temp file (read-only deploys).
+    """
+    if _state['path'] is None:
+        path = ALERTS_FILE
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.access(os.path.dirname(path), os.W_OK):
+                raise PermissionError(path)
+        except OSError:
+            path = TEMP_ALERTS_FILE
+        _state['path'] = path
+    return _state['path']
+
+def log_path():
+    return os.path.join(os.path.dirname(alerts_path()), 'alerts.log')
+
+def _load_store():
+    # {"rules": [...], "state": {"rule_id:ticker": last condition}}, read from disk once
+    if _state['store'] is None:
+        store = {'rules': [], 'state': {}}
+        path = alerts_path()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    store.update(rules=data.get('rules', []), state=data.get('state', {}))
+            except Exception as e:
+                print(f"Erro ao carregar alertas: {e}")
+        _state['store'] = store
+    return _state['store']
+
+def _save_store():
+    path = alerts_path()
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(_state['store'], f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def list_rules():
+    with _lock:
+        return [dict(rule) for rule in _load_store()['rules']]
+
+def add_rule(rule):
+    """
+    Validates and stores a rule (dict with column, op, value or ref, and
+    optionally ticker or portfolio). Returns (success, rule or message).
+    """
+    column, op = rule.get('column'), rule.get('op')
+    if op not in OPS:
+        return False, f"Operador inválido: {op}. Use um de {', '.join(OPS)}."
+    if (rule.get('value') is None) == (rule.get('ref') is None):
+        return False, "Informe 'value' ou 'ref' (e apenas um deles)."
+    known = known_columns()
+    for name in (column, rule.get('ref')):
+        if name is not None and name not in known:
+            return False, f"Coluna desconhecida: {name}."
+    if rule.get('portfolio') and rule['portfolio'] not in core.load_portfolios():
+        return False, f"Carteira não encontrada: {rule['portfolio']}."
+    stored = {
+        'id': uuid.uuid4().hex[:8],
+        'ticker': (rule.get('ticker') or '').strip().upper() or None,
+        'portfolio': rule.get('portfolio') or None,
+        'column': column,
+        'op': op,
+        'value': None if rule.get('value') is None else float(rule['value']),
+        'ref': rule.get('ref'),
+        'created_at': time.time(),
+    }
+    with _lock:
+        _load_store()['rules'].append(stored)
+        _state['generation'] += 1
+        _save_store()
+    return True, stored
+
+def delete_rule(rule_id):
+    with _lock:
+        store = _load_store()
+        rules = [r for r in store['rules'] if r['id'] != rule_id]
+        if len(rules) == len(store['rules']):
+            return False, "Alerta não encontrado."
+        store['rules'] = rules
+        prefix = f"{rule_id}:"
+        store['state'] = {k: v for k, v in store['state'].items() if not k.startswith(prefix)}
+        _state['generation'] += 1
+        _save_store()
+    return True, "Alerta excluído."
+
+def recent_events():
+    with _lock:
+        return list(reversed(_events))
+
+def known_columns():
+    """
+    Numeric columns of the valued table, from a placeholder row (no snapshot needed).
+    """
+    values = np.ones((1, len(core.MARKET_COLUMNS)), dtype=np.float32)
+    sources = pd.Categorical(['fundamentus'], categories=core.MARKET_SOURCES)
+    sample = core.valuation_table(core.MarketFrame(values, ['_'], sources).to_frame())
+    return list(sample.select_dtypes(include='number').columns)
+
+def _rule_tickers(rule, portfolios):
+    if rule.get('ticker'):
+        return [rule['ticker']]
+    if rule.get('portfolio'):
+        return portfolios.get(rule['portfolio'], [])
+    return sorted({t for tickers in portfolios.values() for t in tickers})
+
+def rule_tickers(rules, portfolios):
+    """
+    Every ticker some rule applies to.
+    """
+    return sorted({t.strip().upper() for rule in rules for t in _rule_tickers(rule, portfolios) if t.strip()})
+
+class CompiledRules:
+    """
+    All (rule, ticker) pairs as flat arrays over a valued frame's numeric matrix:
+    row, left column, right column (-1 for a constant) and constant, plus the
+    operator code and the last state of each pair.
+    """
+    def __init__(self, rules, portfolios, index, columns, states=None):
+        rows = {t: i for i, t in enumerate(index)}
+        cols = {c: i for i, c in enumerate(columns)}
+        # One block of pairs per rule: its tickers' rows, everything else repeated
+        keys, blocks = [], []
+        for rule in rules:
+            if rule['column'] not in cols or (rule.get('ref') is not None and rule['ref'] not in cols):
+                continue
+            tickers = [t for t in dict.fromkeys(t.strip().upper() for t in _rule_tickers(rule, portfolios))
+                       if t in rows]
+            if not tickers:
+                continue
+            keys.extend(f"{rule['id']}:{t}" for t in tickers)
+            blocks.append(([rows[t] for t in tickers], cols[rule['column']],
+                           cols[rule['ref']] if rule.get('ref') is not None else -1,
+                           rule['value'] if rule.get('value') is not None else 0.0, OPS.index(rule['op'])))
+        sizes = [len(b[0]) for b in blocks]
+        self.rules = {rule['id']: rule for rule in rules}
+        self.keys = keys
+        self.row = np.fromiter((r for b in blocks for r in b[0]), dtype=np.intp, count=len(keys))
+        self.left = np.repeat(np.asarray([b[1] for b in blocks], dtype=np.intp), sizes)
+        self.right = np.repeat(np.asarray([b[2] for b in blocks], dtype=np.intp), sizes)
+        self.const = np.repeat(np.asarray([b[3] for b in blocks], dtype=np.float64), sizes)
+        self.op = np.repeat(np.asarray([b[4] for b in blocks], dtype=np.int8), sizes)
+        self.state = np.where(self.op == CROSSES, UNSEEN, 0).astype(np.int8)
+        if states:
+            for i, k in enumerate(keys):
+                if k in states:
+                    self.state[i] = states[k]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def evaluate(self, values):
+        """
+        (observed, reference, state) per pair for a rows x columns float matrix:
+        state is the condition (0/1) for comparisons and the side (-1/0/1) for 'crosses'.
+        """
+        observed = values[self.row, self.left]
+        reference = np.where(self.right >= 0, values[self.row, np.maximum(self.right, 0)], self.const)
+        # Missing values (NaN) compare as 0 here; find_events ignores those pairs
+        diff = np.nan_to_num(observed - reference)
+        state = np.select(
+            [self.op == 0, self.op == 1, self.op == 2, self.op == 3],
+            [diff < 0, diff <= 0, diff > 0, diff >= 0],
+            default=np.sign(diff),
+        ).astype(np.int8)
+        return observed, reference, state
+
+def compile_rules(rules, portfolios, index, columns, version):
+    """
+    CompiledRules for the stored rules, rebuilt (with the stored states) only
+    when `version` (rules and portfolios) or the valued frame's layout change.
+    """
+    key = (version, tuple(index), tuple(columns))
+    if _compiled['key'] != key:
+        with _lock:
+            states = dict(_load_store()['state'])
+        _compiled.update(key=key, rules=CompiledRules(rules, portfolios, index, columns, states))
+    return _compiled['rules']
+
+def find_events(compiled, values):
+    """
+    Edge-triggered events for a valued matrix, given the last state of each pair
+    in `compiled`. Returns (events, new state array).
+    """
+    observed, reference, state = compiled.evaluate(values)
+    prev = compiled.state
+    is_cross = compiled.op == CROSSES
+    valid = np.isfinite(observed) & np.isfinite(reference)
+    # Comparisons fire when they turn true; crossings when the side flips
+    flipped = (prev != UNSEEN) & (prev != 0) & (state != 0) & (state != prev)
+    fired = valid & np.where(is_cross, flipped, (state == 1) & (prev == 0))
+    events = []
+    for i in np.flatnonzero(fired):
+        rule_id, ticker = compiled.keys[i].split(':', 1)
+        rule = compiled.rules[rule_id]
+        event = {
+            'rule_id': rule_id,
+            'ticker': ticker,
+            'column': rule['column'],
+            'op': rule['op'],
+            'ref': rule.get('ref'),
+            'value': float(observed[i]),
+            'reference': float(reference[i]),
+        }
+        if is_cross[i]:
+            event['direction'] = 'up' if state[i] > 0 else 'down'
+        events.append(event)
+    # Keep the last known side of a crossing when this value is exactly on the line
+    keep = (is_cross & (state == 0)) | ~valid
+    return events, np.where(keep, prev, state).astype(np.int8)
+
+def _deliver(events):
+    # Log sink always, webhook when configured (in the background: it may be slow)
+    for event in events:
+        print(f"Alerta {event['rule_id']}: {event['ticker']} {event['column']} {event['op']} "
+              f"{event['ref'] or event['reference']} ({event['value']:.4g})")
+    try:
+        with open(log_path(), 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+    except OSError as e:
+        print(f"Erro ao gravar log de alertas: {e}")
+    if ALERT_WEBHOOK_URL:
+        def post():
+            try:
+                requests.post(ALERT_WEBHOOK_URL, json={'events': events}, timeout=WEBHOOK_TIMEOUT)
+            except Exception as e:
+                print(f"Erro ao enviar alertas para o webhook: {e}")
+        threading.Thread(target=post, name='alert-webhook', daemon=True).start()
+
+def evaluate(frame=None):
+    """
+    Evaluates every stored rule against the valued rows of the tickers they
+    cover (core.market_rows over `frame`, default the loaded snapshot; tickers
+    outside it come from Yahoo) and delivers the new events. Returns the list of events.
+    """
+    frame = frame if frame is not None else core.get_market_snapshot()[0]
+    with _eval_lock:
+        with _lock:
+            rules = tuple(_load_store()['rules'])
+            generation = _state['generation']
+        if not rules:
+            return []
+        portfolios = core.load_portfolios()
+        key = (generation, json.dumps(portfolios, sort_keys=True))
+        if _compiled.get('tickers_key') != key:
+            _compiled.update(tickers_key=key, tickers=rule_tickers(rules, portfolios))
+        tickers = _compiled['tickers']
+        if not tickers:
+            return []
+        rows = core.market_rows(frame, tickers)
+        if rows.empty:
+            return []
+        valued = core.valuation_table(rows)
+        numeric = valued.select_dtypes(include='number')
+        compiled = compile_rules(rules, portfolios, numeric.index, numeric.columns, key)
+
+        events, state = find_events(compiled, numeric.to_numpy(dtype=np.float64))
+        changed = np.flatnonzero(state != compiled.state)
+        compiled.state = state
+        at = datetime.now().isoformat(timespec='seconds')
+        for event in events:
+            event['at'] = at
+            event['snapshot'] = frame.version
+        with _lock:
+            # Only pairs whose state changed are written back
+            if len(changed):
+                store = _load_store()
+                store['state'].update({compiled.keys[i]: int(state[i]) for i in changed})
+                _save_store()
+            _events.extend(events)
+    if events:
+        _deliver(events)
+    return events
+
+def evaluate_in_background(frame):
+    """
+    Snapshot listener: evaluates the rules against the new snapshot in a background thread.
+    """
+    def run():
+        try:
+            evaluate(frame)
+        except Exception as e:
+            print(f"Erro ao avaliar alertas: {e}")
+
+    threading.Thread(target=run, name='alerts', daemon=True).start()
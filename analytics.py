@@ -0,0 +1,361 @@
+"""
+Portfolio analytics over the shared price matrix (core.get_price_matrix).
+
+All metrics come from one aligned dates x tickers matrix, computed with NumPy:
+no per-ticker loops and no extra upstream calls beyond filling the history store.
+"""
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+import core
+
+TRADING_DAYS = 252
+BENCHMARK = '^BVSP'  # IBOV
+RISK_FREE_RATE = float(os.environ.get('RISK_FREE_RATE', 0.10))  # annual, for the Sharpe ratio
+
+RISK_CACHE_SIZE = 128
+_risk_cache = OrderedDict()
+_risk_lock = threading.Lock()
+
+def simple_returns(prices):
+    """
+    Daily returns of a dates x tickers price array. Gaps are forward filled first;
+    returns before a ticker's first price stay NaN.
+    """
+    filled = prices.ffill().to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return filled[1:] / filled[:-1] - 1
+
+def pairwise_covariance(returns):
+    """
+    Covariance matrix of a dates x n returns array with NaNs.
+    Each column is centered on its own mean and each pair uses the dates both
+    have (n_ij - 1 in the denominator), computed as two matrix products.
+    """
+    valid = ~np.isnan(returns)
+    counts = valid.sum(axis=0)
+    means = np.where(counts > 0, np.nansum(returns, axis=0) / np.maximum(counts, 1), 0.0)
+    centered = np.where(valid, returns - means, 0.0)
+    pair_counts = valid.T.astype(np.float64) @ valid.astype(np.float64)
+    return (centered.T @ centered) / np.maximum(pair_counts - 1, 1)
+
+def max_drawdown(values):
+    """
+    Worst peak-to-trough drop per column of a dates x n array (e.g. -0.35 for -35%).
+    """
+    peaks = np.fmax.accumulate(values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = values / peaks - 1
+    return np.nanmin(np.where(np.isfinite(drawdowns), drawdowns, np.nan), axis=0)
+
+def _clean(value):
+    # JSON has no NaN/inf
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def risk_report(prices, tickers):
+    """
+    Volatility, correlation, beta vs BENCHMARK and max drawdown for `tickers`,
+    plus the same metrics for the equal-weighted portfolio.
+    `prices` is a dates x tickers close matrix that may include BENCHMARK.
+    """
+    assets = [t for t in tickers if t in prices.columns]
+    columns = assets + ([BENCHMARK] if BENCHMARK in prices.columns else [])
+    prices = prices[columns].dropna(how='all')
+    returns = simple_returns(prices)
+
+    # Equal-weighted portfolio, rebalanced daily over the assets trading that day
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # dates where no asset traded
+        portfolio_returns = np.nanmean(returns[:, :len(assets)], axis=1) if assets else np.empty(0)
+    all_returns = np.column_stack([returns, portfolio_returns]) if assets else returns
+
+    cov = pairwise_covariance(all_returns)
+    variance = np.diag(cov)
+    std = np.sqrt(variance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std)
+    volatility = std * np.sqrt(TRADING_DAYS)
+
+    n = len(assets)
+    if BENCHMARK in columns:
+        b = columns.index(BENCHMARK)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = cov[:, b] / variance[b]
+    else:
+        beta = np.full(len(cov), np.nan)
+
+    drawdown = max_drawdown(prices[assets].to_numpy(dtype=np.float64)) if assets else np.empty(0)
+    portfolio_curve = np.cumprod(1 + np.nan_to_num(portfolio_returns))
+    portfolio_drawdown = max_drawdown(portfolio_curve[:, None])[0] if assets else np.nan
+
+    return {
+        "tickers": assets,
+        "missing": [t for t in tickers if t not in assets],
+        "start": prices.index[0].strftime('%Y-%m-%d') if len(prices) else None,
+        "end": prices.index[-1].strftime('%Y-%m-%d') if len(prices) else None,
+        "observations": int(len(returns)),
+        "volatility": {t: _clean(volatility[i]) for i, t in enumerate(assets)},
+        "beta": {t: _clean(beta[i]) for i, t in enumerate(assets)},
+        "max_drawdown": {t: _clean(drawdown[i]) for i, t in enumerate(assets)},
+        "correlation": {
+            "tickers": assets,
+            "matrix": [[_clean(v) for v in row[:n]] for row in corr[:n]],
+        },
+        "portfolio": {
+            "volatility": _clean(volatility[-1]) if assets else None,
+            "beta": _clean(beta[-1]) if assets else None,
+            "max_drawdown": _clean(portfolio_drawdown) if assets else None,
+        },
+    }
+
+def _history_key(tickers):
+    # Load times of the histories a report is computed from; None while any is missing or stale
+    loaded = core.history_loaded_at(tickers)
+    return None if None in loaded else loaded
+
+def _cached(cache, key):
+    if key[-1] is None:
+        return None
+    with _risk_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
+
+def _store(cache, key, report):
+    # Reports missing tickers (no history yet) are not kept, so the next call retries them
+    if key[-1] is None or report["missing"]:
+        return
+    with _risk_lock:
+        cache[key] = report
+        while len(cache) > RISK_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def portfolio_risk(name, tickers):
+    """
+    Risk report for a saved portfolio, cached per portfolio until its price
+    histories are reloaded (core.HISTORY_TTL).
+    """
+    tickers = sorted({t.strip().upper() for t in tickers if t.strip()})
+    symbols = tickers + [BENCHMARK]
+    report = _cached(_risk_cache, (name, tuple(tickers), _history_key(symbols)))
+    if report is not None:
+        return report
+
+    report = risk_report(core.get_price_matrix(symbols), tickers)
+    report["name"] = name
+    _store(_risk_cache, (name, tuple(tickers), _history_key(symbols)), report)
+    return report
+
+# Mean-variance optimizer (long-only, fully invested)
+FRONTIER_POINTS = 40
+REFINE_POINTS = 16  # finer grid around the best frontier point, for max Sharpe
+VALUATION_TILT = 0.10  # extra expected annual return per 100% of valuation margin
+SOLVER_ITERATIONS = 2000
+SOLVER_TOLERANCE = 1e-9
+
+_optimize_cache = OrderedDict()
+
+def annualized_moments(prices):
+    """
+    Annualized mean return vector and covariance matrix of a dates x n price matrix.
+    The pairwise covariance is clipped to its nearest positive semidefinite matrix,
+    since pairs over different date ranges don't always make a valid one.
+    """
+    returns = simple_returns(prices)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mu = np.nan_to_num(np.nanmean(returns, axis=0)) * TRADING_DAYS
+    cov = pairwise_covariance(returns) * TRADING_DAYS
+    values, vectors = np.linalg.eigh((cov + cov.T) / 2)
+    cov = (vectors * np.maximum(values, 1e-10)) @ vectors.T
+    return mu, cov
+
+def project_simplex(v):
+    """
+    Euclidean projection of each row of `v` onto {w >= 0, sum(w) = 1}.
+    """
+    n = v.shape[1]
+    u = -np.sort(-v, axis=1)
+    css = np.cumsum(u, axis=1) - 1
+    positive = u - css / np.arange(1, n + 1) > 0
+    rho = n - 1 - np.argmax(positive[:, ::-1], axis=1)
+    theta = css[np.arange(len(v)), rho] / (rho + 1)
+    return np.maximum(v - theta[:, None], 0)
+
+def solve_mean_variance(cov, linear, start=None, iterations=SOLVER_ITERATIONS, tolerance=SOLVER_TOLERANCE):
+    """
+    Long-only weights minimizing w'Σw - l'w for every row l of `linear` (k x n),
+    all k problems at once with accelerated projected gradient (FISTA with
+    adaptive restart), from `start` weights (default equal weights).
+    """
+    k, n = linear.shape
+    step = 1 / (2 * np.linalg.eigvalsh(cov)[-1])
+    w = np.full((k, n), 1 / n) if start is None else np.broadcast_to(start, (k, n)).copy()
+    y, t = w, np.ones(k)
+    for _ in range(iterations):
+        w_next = project_simplex(y - step * (2 * y @ cov - linear))
+        # Rows whose momentum points against the last step start over
+        t = np.where(((y - w_next) * (w_next - w)).sum(axis=1) > 0, 1.0, t)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = w_next + ((t - 1) / t_next)[:, None] * (w_next - w)
+        done = np.abs(w_next - w).max() < tolerance
+        w, t = w_next, t_next
+        if done:
+            break
+    return w
+
+def min_variance_weights(cov, long_only=None):
+    """
+    Minimum variance weights: the closed form Σ⁻¹1 / 1'Σ⁻¹1 when it is long-only,
+    else the long-only solution (`long_only` if already solved).
+    """
+    n = len(cov)
+    try:
+        w = np.linalg.solve(cov, np.ones(n))
+        w = w / w.sum()
+        if np.all(w >= -1e-12):
+            return np.maximum(w, 0) / np.maximum(w, 0).sum()
+    except np.linalg.LinAlgError:
+        pass
+    if long_only is not None:
+        return long_only
+    return solve_mean_variance(cov, np.zeros((1, n)))[0]
+
+def portfolio_stats(weights, mu, cov, risk_free=RISK_FREE_RATE):
+    """
+    Annual expected return, volatility and Sharpe ratio of each row of `weights`.
+    """
+    weights = np.atleast_2d(weights)
+    ret = weights @ mu
+    vol = np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', weights, cov, weights), 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = (ret - risk_free) / vol
+    return ret, vol, sharpe
+
+def _aversion_grid(mu, cov, points):
+    # Return weights from 0 (minimum variance) up to where the most profitable asset dominates
+    spread = max(float(np.ptp(mu)), 1e-8)
+    scale = 2 * np.linalg.eigvalsh(cov)[-1] / spread
+    return np.concatenate([[0.0], scale * np.geomspace(1e-3, 10, points - 1)])
+
+def _max_sharpe(mus, cov, risk_free, points):
+    """
+    Max Sharpe long-only weights for each expected return vector in `mus`: the
+    best point of a frontier grid, refined on a finer grid around it.
+    Returns (weights per mu, frontier weights per mu).
+    """
+    grid = _aversion_grid(mus[0], cov, points)
+    linear = np.concatenate([np.outer(grid, mu) for mu in mus])
+    frontiers = solve_mean_variance(cov, linear).reshape(len(mus), points, -1)
+
+    refine, starts = [], []
+    for mu, frontier in zip(mus, frontiers):
+        best = int(np.argmax(np.nan_to_num(portfolio_stats(frontier, mu, cov, risk_free)[2], nan=-np.inf)))
+        low, high = grid[max(best - 1, 0)], grid[min(best + 1, points - 1)]
+        refine.append(np.outer(np.linspace(low, high, REFINE_POINTS), mu))
+        starts.append(np.repeat(frontier[best][None], REFINE_POINTS, axis=0))
+    refined = solve_mean_variance(cov, np.concatenate(refine), np.concatenate(starts))
+    refined = refined.reshape(len(mus), REFINE_POINTS, -1)
+
+    weights = []
+    for mu, frontier, fine in zip(mus, frontiers, refined):
+        candidates = np.concatenate([frontier, fine])
+        sharpe = np.nan_to_num(portfolio_stats(candidates, mu, cov, risk_free)[2], nan=-np.inf)
+        weights.append(candidates[int(np.argmax(sharpe))])
+    return weights, frontiers
+
+def valuation_scores(tickers):
+    """
+    Best of the Graham and Barsi margins (core.valuation_indicators) per ticker, as a
+    fraction clipped to [-1, 1], from the shared snapshot (0 for tickers outside it).
+    """
+    frame, _ = core.get_market_snapshot()
+    margins = core.valuation_indicators(frame.take(tickers))[['Margem Graham %', 'Margem Barsi %']].max(axis=1) / 100
+    return margins.reindex(tickers).fillna(0).clip(-1, 1).to_numpy(dtype=np.float64)
+
+def optimize_report(prices, tickers, scores=None, risk_free=RISK_FREE_RATE, points=FRONTIER_POINTS,
+                    tilt=VALUATION_TILT):
+    """
+    Suggested long-only weights for `tickers` from a dates x tickers close matrix:
+    minimum variance, maximum Sharpe and maximum Sharpe with expected returns
+    raised by `tilt` x valuation score (`scores`, aligned with `tickers`), plus
+    the efficient frontier (`points` portfolios from minimum variance to the
+    most profitable asset). Without `scores` the tilted portfolio is the max
+    Sharpe one and "valuation_scores" is None.
+    """
+    counts = prices.notna().sum()
+    assets = [t for t in tickers if counts.get(t, 0) > 1]
+    report = {
+        "tickers": assets,
+        "missing": [t for t in tickers if t not in assets],
+        "risk_free": risk_free,
+    }
+    if not assets:
+        return report
+    prices = prices[assets].dropna(how='all')
+    mu, cov = annualized_moments(prices)
+    scored = scores is not None
+    scores = np.zeros(len(assets)) if scores is None else np.asarray(
+        [scores[tickers.index(t)] for t in assets], dtype=np.float64)
+    mu_tilted = mu + tilt * scores
+
+    (sharpe_w, tilted_w), (frontier, _) = _max_sharpe([mu, mu_tilted], cov, risk_free, points)
+    candidates = {
+        # The first frontier point (no return term) is the long-only minimum variance
+        "min_variance": min_variance_weights(cov, frontier[0]),
+        "max_sharpe": sharpe_w,
+        "valuation_tilted": tilted_w,
+        "equal_weight": np.full(len(assets), 1 / len(assets)),
+    }
+
+    def describe(w):
+        ret, vol, sharpe = portfolio_stats(w, mu, cov, risk_free)
+        return {
+            "weights": {t: round(float(x), 4) for t, x in zip(assets, w)},
+            "expected_return": _clean(ret[0]),
+            "volatility": _clean(vol[0]),
+            "sharpe": _clean(sharpe[0]),
+        }
+
+    ret, vol, sharpe = portfolio_stats(frontier, mu, cov, risk_free)
+    order = np.argsort(vol)
+    report.update({
+        "start": prices.index[0].strftime('%Y-%m-%d'),
+        "end": prices.index[-1].strftime('%Y-%m-%d'),
+        "observations": int(len(prices) - 1),
+        "valuation_tilt": tilt,
+        "valuation_scores": {t: _clean(s) for t, s in zip(assets, scores)} if scored else None,
+        "portfolios": {name: describe(w) for name, w in candidates.items()},
+        "frontier": [{"expected_return": _clean(ret[i]), "volatility": _clean(vol[i]), "sharpe": _clean(sharpe[i])}
+                     for i in order],
+    })
+    return report
+
+def portfolio_optimize(name, tickers, risk_free=RISK_FREE_RATE, points=FRONTIER_POINTS, tilt=VALUATION_TILT):
+    """
+    optimize_report for a saved portfolio, cached per portfolio, parameters and
+    market snapshot until its price histories are reloaded (core.HISTORY_TTL).
+    Without valuation scores (snapshot unavailable) the report is not cached.
+    """
+    tickers = sorted({t.strip().upper() for t in tickers if t.strip()})
+    try:
+        _, version = core.get_market_snapshot()
+        scores = valuation_scores(tickers)
+    except Exception as e:
+        print(f"Erro ao calcular margens de valuation da carteira {name}: {e}")
+        version, scores = None, None
+    params = (name, tuple(tickers), version, risk_free, points, tilt)
+    report = _cached(_optimize_cache, params + (_history_key(tickers) if scores is not None else None,))
+    if report is not None:
+        return report
+
+    report = optimize_report(core.get_price_matrix(tickers), tickers, scores, risk_free, points, tilt)
+    report["name"] = name
+    _store(_optimize_cache, params + (_history_key(tickers) if scores is not None else None,), report)
+    return report
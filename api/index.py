@@ -1,11 +1,18 @@
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import date, datetime, timezone
+from functools import partial
 import sys
 import os
 import io
+import json
+import hmac
+import asyncio
+import time
 
 # Ensure parent directory (project root) is in path so we can import 'core'
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,16 +20,103 @@ if ROOT_DIR not in sys.path:
     sys.path.append(ROOT_DIR)
 
 import pandas as pd
-import yfinance as yf
 import numpy as np
 import core
+import quotes
+import analytics
+import archive
+import universe
+import reports
+import profiling
+import assets
+import dividends
+import metadata
+import alerts
+import intraday
+import runtime
 
 app = FastAPI(title="Dashboard Fundamentalista")
 
+COMPRESS_MIN_SIZE = 1024
+
+def add_compression(app):
+    """
+    Compresses responses over COMPRESS_MIN_SIZE bytes: brotli when brotli-asgi is
+    installed (gzip for clients without br), else gzip. SSE is left alone.
+    """
+    try:
+        from brotli_asgi import BrotliMiddleware
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True,
+                           excluded_handlers=['^/api/stream'])
+    except ImportError:
+        # Starlette's gzip skips text/event-stream by itself
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
+add_compression(app)
+
+runtime.install()
+
+def _is_admin(request):
+    # Profiling is admin-only: PROFILE_TOKEN must be set and match
+    token = request.query_params.get('profile') or request.headers.get('x-profile-token')
+    # Compared as bytes: compare_digest rejects non-ASCII str with a TypeError
+    return bool(profiling.PROFILE_TOKEN and token
+                and hmac.compare_digest(token.encode(), profiling.PROFILE_TOKEN.encode()))
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Any route runs under the sampling profiler when called with ?profile=<PROFILE_TOKEN>
+    or an X-Profile-Token header. The response gets Server-Timing (network, compute,
+    other) and X-Profile-Id; the full profile is at /api/admin/profiles/<id>.
+    """
+    if not request.url.path.startswith('/api/') or request.url.path.startswith('/api/admin/') \
+            or not _is_admin(request):
+        return await call_next(request)
+
+    profiler = profiling.SamplingProfiler().start()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop()
+    profile_id = profiling.store(profiler, request.method, str(request.url.path))
+    response.headers['Server-Timing'] = profiling.server_timing(profiler)
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.get("/api/admin/profiles")
+def list_profiles(request: Request):
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Acesso negado.")
+    return profiling.list_profiles()
+
+@app.get("/api/admin/profiles/{profile_id}")
+def get_profile(request: Request, profile_id: str, format: str = Query('json', pattern='^(json|folded)$')):
+    """
+    A stored request profile: summary and folded stacks as JSON, or format=folded
+    for the raw folded stacks (flamegraph.pl, speedscope).
+    """
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Acesso negado.")
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado.")
+    if format == 'folded':
+        return PlainTextResponse(profile['folded'])
+    return profile
+
 class PortfolioData(BaseModel):
     name: str
     tickers: List[str]
 
+class AlertRule(BaseModel):
+    column: str
+    op: str
+    value: Optional[float] = None
+    ref: Optional[str] = None
+    ticker: Optional[str] = None
+    portfolio: Optional[str] = None
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     try:
@@ -61,6 +155,7 @@ def save_portfolio(data: PortfolioData):
     success, msg = core.save_portfolio(data.name, data.tickers)
     if not success:
         raise HTTPException(status_code=500, detail=msg)
+    universe.add(data.tickers)
     return {"message": msg}
 
 @app.delete("/api/portfolios/{name}")
@@ -70,59 +165,284 @@ def delete_portfolio(name: str):
         raise HTTPException(status_code=404, detail=msg)
     return {"message": msg}
 
+@app.post("/api/reports", status_code=202)
+def export_reports(format: str = Query('xlsx', pattern='^(xlsx|parquet)$')):
+    """
+    Starts exporting one report per saved portfolio (see reports.py) in the
+    background. Returns the job: poll GET /api/reports/{id} until its status is
+    'done', then download the zip from GET /api/reports/{id}/download.
+    """
+    job = reports.start_export(format)
+    return JSONResponse(job, status_code=202, headers={'Location': f"/api/reports/{job['id']}"})
+
+@app.get("/api/reports/{job_id}")
+def get_report_job(job_id: str):
+    job = reports.job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada.")
+    return job
+
+@app.get("/api/reports/{job_id}/download")
+def download_reports(job_id: str):
+    """
+    The zipped reports of a finished export job.
+    """
+    job = reports.job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada.")
+    if job['status'] == 'running':
+        raise HTTPException(status_code=409, detail="Exportação em andamento.")
+    if job['status'] == 'empty':
+        raise HTTPException(status_code=404, detail="Nenhuma carteira salva.")
+    zip_path = reports.job_file(job_id)
+    if job['status'] != 'done' or zip_path is None:
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar relatórios: {job['error']}")
+    return FileResponse(zip_path, media_type='application/zip', filename='relatorios.zip')
+
+def _etag_matches(request, etag):
+    header = request.headers.get('if-none-match', '')
+    candidates = [c.strip().removeprefix('W/') for c in header.split(',')]
+    return etag in candidates or '*' in candidates
+
+@app.get("/api/alerts")
+def get_alerts():
+    return alerts.list_rules()
+
+@app.post("/api/alerts")
+def create_alert(rule: AlertRule):
+    """
+    Stores an alert rule (see alerts.py), e.g.
+    {"ticker": "PETR4", "column": "cotacao", "op": "<", "ref": "Preço Justo (Graham)"}.
+    """
+    success, result = alerts.add_rule(rule.model_dump())
+    if not success:
+        raise HTTPException(status_code=400, detail=result)
+    return result
+
+@app.delete("/api/alerts/{rule_id}")
+def delete_alert(rule_id: str):
+    success, msg = alerts.delete_rule(rule_id)
+    if not success:
+        raise HTTPException(status_code=404, detail=msg)
+    return {"message": msg}
+
+@app.get("/api/alerts/events")
+def get_alert_events():
+    """
+    Most recent alert events, newest first.
+    """
+    return alerts.recent_events()
+
+@app.post("/api/alerts/evaluate")
+def evaluate_alerts():
+    """
+    Evaluates the rules against the current snapshot now (for schedulers on
+    serverless deploys, where snapshots only refresh on demand).
+    """
+    return alerts.evaluate()
+
+@app.get("/api/portfolios/{name}/risk")
+def get_portfolio_risk(name: str):
+    """
+    Volatility, pairwise correlation, beta vs IBOV and max drawdown over 5 years
+    for a saved portfolio (per ticker and for the equal-weighted portfolio).
+    """
+    portfolios = core.load_portfolios()
+    if name not in portfolios:
+        raise HTTPException(status_code=404, detail="Carteira não encontrada.")
+    try:
+        return analytics.portfolio_risk(name, portfolios[name])
+    except Exception as e:
+        print(f"Error in risk analytics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/portfolios/{name}/optimize")
+def optimize_portfolio(name: str, risk_free: float = Query(analytics.RISK_FREE_RATE, ge=0, le=1),
+                       points: int = Query(analytics.FRONTIER_POINTS, ge=2, le=200),
+                       tilt: float = Query(analytics.VALUATION_TILT, ge=0, le=1)):
+    """
+    Suggested long-only weights for a saved portfolio over 5 years of prices:
+    minimum variance, maximum Sharpe (vs 'risk_free', annual) and maximum Sharpe
+    with expected returns raised by 'tilt' x the best of its Graham/Barsi margins,
+    plus the efficient frontier ('points' portfolios).
+    """
+    portfolios = core.load_portfolios()
+    if name not in portfolios:
+        raise HTTPException(status_code=404, detail="Carteira não encontrada.")
+    try:
+        return analytics.portfolio_optimize(name, portfolios[name], risk_free, points, tilt)
+    except Exception as e:
+        print(f"Error in portfolio optimizer: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sectors")
+def get_sectors(level: str = Query('setor', pattern='^(setor|segmento)$')):
+    """
+    Median P/L, P/VP, DY and Graham margin per sector (or segment) over the
+    current snapshot, with the number of traded companies in each.
+    """
+    core.get_market_snapshot()
+    df = metadata.aggregates()[level]
+    values = core._round_significant(df.to_numpy(dtype=np.float64))
+    values = np.where(np.isfinite(values), values, np.nan)
+    df = pd.DataFrame(values, index=df.index, columns=df.columns).astype({'Ativos': int})
+    df = df.astype(object).where(df.notna(), None)
+    return [{level: name, **row} for name, row in zip(df.index, df.to_dict(orient='records'))]
+
+@app.get("/api/tickers/search")
+def search_tickers(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    """
+    Ticker autocomplete: known tickers starting with 'q', with their kind
+    (acao, fii, etf, carteira or yahoo).
+    """
+    index = universe.get_index(load=True)
+    return [{"ticker": t, "tipo": index.kinds[t]} for t in index.search(q, limit)]
+
 @app.get("/api/tickers")
-def get_analysis(tickers: Optional[str] = Query(None)):
+def get_analysis(request: Request, tickers: Optional[str] = Query(None), since: Optional[str] = Query(None),
+                 as_of: Optional[date] = Query(None)):
     """
     Returns market analysis. 
     If 'tickers' param provided (comma separated), filters results.
+    If 'as_of' (YYYY-MM-DD) is provided, uses the archived snapshot of that day
+    (or the latest one before it) instead of live data; X-Snapshot-Date tells which.
+    Dividend projections and sector medians are then computed as of that day too.
+    Responses carry an ETag (the table version): send it back in If-None-Match
+    to get a 304, or as 'since' to get only the rows that changed:
+    {"version", "delta": true, "rows": [...], "removed": [...]}.
+    Unknown tickers are corrected or dropped before fetching (see universe.resolve);
+    X-Ticker-Corrections ("TYPED=USED,...") and X-Ticker-Rejected list them, and
+    X-Ticker-Suggestions ("TYPED=KNOWN|KNOWN,...") the close known symbols of rejected ones.
+    With 'as_of' tickers are checked against that day's archive instead of
+    today's universe, so renamed and delisted ones are still found.
     """
     target_tickers = []
-    if tickers:
+    headers = {}
+    day = None
+    if tickers and as_of:
+        target_tickers = universe.normalize(tickers.split(','))
+        if not target_tickers:
+            return JSONResponse([], headers=headers)
+    elif tickers:
         raw_tickers = tickers.split(',')
-        target_tickers = [t.strip().upper() for t in raw_tickers if t.strip()]
+        target_tickers, corrections, rejected = universe.resolve(raw_tickers, load=True)
+        if corrections:
+            headers['X-Ticker-Corrections'] = ','.join(f"{k}={v}" for k, v in corrections.items())
+        if rejected:
+            headers['X-Ticker-Rejected'] = ','.join(rejected)
+            suggestions = universe.suggest(rejected)
+            if suggestions:
+                headers['X-Ticker-Suggestions'] = ','.join(f"{k}={'|'.join(v)}" for k, v in suggestions.items())
+        if not target_tickers:
+            return JSONResponse([], headers=headers)
 
-    df = core.get_market_data(target_tickers if target_tickers else None)
+    if as_of:
+        df, day = archive.get_market_data(target_tickers, as_of)
+        if day is None:
+            raise HTTPException(status_code=404, detail=f"Nenhum snapshot arquivado até {as_of.isoformat()}.")
+        headers['X-Snapshot-Date'] = day.isoformat()
+        rejected = [t for t in target_tickers if t not in df.index]
+        if rejected:
+            headers['X-Ticker-Rejected'] = ','.join(rejected)
+        # Past days never change; today's answer changes once today is archived
+        max_age = 86400 if as_of < archive.today() else core.snapshot_expires_in()
+    else:
+        df = core.get_market_data(target_tickers if target_tickers else None)
+        if target_tickers:
+            universe.learn(target_tickers, df)
+        # Fresh as long as the snapshot, and the live quotes when tickers are given:
+        # those come from the intraday store and may be up to FRESHNESS old, so
+        # X-Quotes-As-Of tells the oldest and caches keep the answer while it is fresh
+        max_age = core.snapshot_expires_in()
+        quoted_at = intraday.store.quoted_at(target_tickers).values() if target_tickers else ()
+        if quoted_at:
+            oldest = min(quoted_at)
+            headers['X-Quotes-As-Of'] = datetime.fromtimestamp(oldest, timezone.utc).isoformat(timespec='seconds')
+            max_age = min(max_age, max(0.0, intraday.FRESHNESS - (time.time() - oldest)))
+    headers['Cache-Control'] = f"public, max-age={int(max_age)}"
     if df.empty:
-        return []
+        return JSONResponse([], headers=headers)
 
-    if not target_tickers:
-         # If no filter, return all (but maybe too large? valid for now)
-         pass 
+    # Versioning: the version comes from the inputs, so a client that is up to
+    # date gets its 304 before any valuation or serialization work
+    version = core.table_version(df, day)
+    etag = f'"{version}"'
+    headers['ETag'] = etag
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
 
-    df_analise = df.copy()
-    if target_tickers:
-        df_analise = df[df.index.isin(target_tickers)].copy()
-    if df_analise.empty:
-        return []
+    # Calculate Valuation (get_market_data already returns only the requested rows);
+    # extensions see the archived day, so as-of rows get as-of dividends and medians
+    df_final = core.valuation_table(df, as_of=day)
+    core.register_table_version(version, df_final)
 
-    # Calculate Valuation
-    df_valuation = df_analise.apply(core.calcular_valuation, axis=1)
-    df_final = pd.concat([df_analise, df_valuation], axis=1)
+    if since:
+        delta = core.table_delta(df_final, version, since)
+        if delta is not None:
+            changed, removed = delta
+            return JSONResponse({
+                "version": version,
+                "delta": True,
+                "rows": core.table_records(changed),
+                "removed": removed,
+            }, headers=headers)
 
     # Format for JSON
-    df_final = df_final.reset_index().rename(columns={'papel': 'ticker'})
-    df_final = df_final.replace([np.inf, -np.inf], 0).fillna(0)
-    
-    return df_final.to_dict(orient='records')
+    return JSONResponse(core.table_records(df_final), headers=headers)
+
+@app.get("/api/stream")
+async def stream_quotes(request: Request, tickers: str = Query(...)):
+    """
+    Server-Sent Events with updated table rows for 'tickers' (comma separated).
+    Each 'quotes' event carries the rows whose price changed, in /api/tickers format.
+    """
+    target_tickers = sorted(universe.resolve(tickers.split(','), load=True)[0])
+    if not target_tickers:
+        raise HTTPException(status_code=400, detail="Informe ao menos um ativo.")
+
+    sub = await quotes.hub.subscribe(target_tickers)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    rows = await asyncio.wait_for(sub.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: quotes\ndata: {json.dumps(rows)}\n\n"
+        finally:
+            quotes.hub.unsubscribe(sub)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
 
 @app.get("/api/history/{ticker}")
-def get_history(ticker: str, indicator: Optional[str] = None, indicator_value: Optional[float] = 0.0):
+def get_history(ticker: str, response: Response, indicator: Optional[str] = None, indicator_value: Optional[float] = 0.0,
+                mode: str = Query('daily', pattern='^(daily|intraday)$')):
     """
     Returns chart data: 5y stock price + optional indicator line.
+    Cacheable until the stored history is due for a refresh.
+    mode=intraday serves the minute bars of the intraday store instead (never the
+    upstream), cacheable for one quote interval.
     """
+    if mode == "intraday":
+        return _intraday_history(ticker.upper(), response, indicator, indicator_value)
     try:
-        stock = yf.Ticker(f"{ticker}.SA")
-        hist = stock.history(period="5y")
+        hist = core.get_price_history(ticker)
         
         if hist.empty:
             raise HTTPException(status_code=404, detail="No history found")
+        response.headers['Cache-Control'] = f"public, max-age={core.history_expires_in(ticker)}"
         
         # Base chart data
         close_prices = hist['Close']
         dates = hist.index.strftime('%Y-%m-%d').tolist()
         prices = close_prices.tolist()
         
-        response = {
+        payload = {
             "dates": dates,
             "prices": prices,
             "indicator_series": []
@@ -141,17 +461,58 @@ def get_history(ticker: str, indicator: Optional[str] = None, indicator_value: O
             
             series_data = [0 if (pd.isna(x) or np.isinf(x)) else x for x in series_data]
 
-            response["indicator_series"] = series_data
-            response["indicator_name"] = indicator
+            payload["indicator_series"] = series_data
+            payload["indicator_name"] = indicator
 
-        return response
+        return payload
         
     except Exception as e:
         print(f"Error in history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _intraday_history(ticker, response, indicator, indicator_value):
+    # Only known tickers get polled; anything else is refused before it is tracked.
+    # The snapshot is loaded first: a fresh process knows no stock before that
+    if ticker not in universe.get_index(load=True):
+        raise HTTPException(status_code=404, detail="Ativo desconhecido")
+    bars = intraday.history(ticker)
+    if bars.empty:
+        # Tracked now: the poller fills it from the next interval on
+        raise HTTPException(status_code=404, detail="Sem cotações intradiárias ainda")
+    response.headers['Cache-Control'] = f"public, max-age={int(quotes.QUOTE_INTERVAL)}"
+    payload = {
+        "dates": bars.index.strftime('%Y-%m-%d %H:%M').tolist(),
+        "prices": bars['close'].tolist(),
+        "indicator_series": [],
+        "mode": "intraday",
+    }
+    # Statements don't change within a day: the indicator is its current value
+    if indicator and indicator != "Preço Atual":
+        payload["indicator_series"] = [indicator_value] * len(bars)
+        payload["indicator_name"] = indicator
+    return payload
+
 # Mount static files. 
 # On Vercel, it's better to point to the correct static path relative to the root.
 static_path = os.path.join(ROOT_DIR, "static")
+
+def _serve_asset(request: Request, asset):
+    headers = {'Cache-Control': asset.cache_control, 'ETag': asset.etag, 'Vary': 'Accept-Encoding'}
+    if _etag_matches(request, asset.etag):
+        return Response(status_code=304, headers=headers)
+    encoding, body = asset.pick(request.headers.get('accept-encoding', ''))
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type=asset.media_type, headers=headers)
+
+# index.html and hashed app.js/style.css come precompressed from memory;
+# anything else falls through to StaticFiles
+bundle = assets.AssetBundle(static_path)
+if bundle.index is not None:
+    for path in ("/", "/index.html"):
+        app.add_api_route(path, partial(_serve_asset, asset=bundle.index), include_in_schema=False)
+for name, asset in bundle.assets.items():
+    app.add_api_route(f"/{name}", partial(_serve_asset, asset=asset), include_in_schema=False)
+
 if os.path.exists(static_path):
     app.mount("/", StaticFiles(directory=static_path, html=True), name="static")
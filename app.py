@@ -1,199 +1,130 @@
 import streamlit as st
 import pandas as pd
-import fundamentus
-import yfinance as yf
-import re
-import numpy as np
-import json
-import os
+import time
+from collections import OrderedDict
 
-PORTFOLIO_FILE = 'portfolios.json'
+# Same data layer as the FastAPI app (api/index.py): the shared Fundamentus
+# snapshot, the price history store, the portfolio file and the valuation table
+import core
+import quotes
+import intraday
+import runtime
+import universe
 
-def get_historical_financials(ticker_symbol):
+runtime.install()
+
+SESSION_MEMO_KEPT = 16  # entries per memo, per browser session
+
+def session_memo(name, key, compute, ttl=None):
     """
-    Attempts to fetch historical fundamentals from yfinance to build time-series for Graham and Barsi.
-    Returns a DataFrame with columns: ['Preço Justo (Graham)', 'Preço Teto (6%)'] indexed by Date.
+    Session-scoped memoization: returns the value computed for `key` in this
+    browser session, so widget reruns don't recompute (or refetch) it.
+    Entries older than `ttl` seconds are recomputed; the last SESSION_MEMO_KEPT keys are kept.
     """
-    try:
-        stock = yf.Ticker(f"{ticker_symbol}.SA")
-        
-        # 1. Get Price History (for index)
-        hist = stock.history(period="5y")
-        if hist.empty:
-            return pd.DataFrame()
-        
-        dates = hist.index
-        df_indicators = pd.DataFrame(index=dates)
-        
-        # 2. Graham: Sqrt(22.5 * LPA * VPA)
-        # Try fetching financials
-        fin = stock.quarterly_income_stmt
-        bal = stock.quarterly_balance_sheet
-        
-        if not fin.empty and not bal.empty:
-            # Transpose
-            fin = fin.T.sort_index()
-            bal = bal.T.sort_index()
-            
-            # Extract EPS (LPA)
-            lpa_series = None
-            if "Basic EPS" in fin.columns:
-                lpa_series = fin["Basic EPS"]
-            elif "Diluted EPS" in fin.columns:
-                lpa_series = fin["Diluted EPS"]
-                
-            # Extract VPA (Equity / Shares)
-            vpa_series = None
-            if "Stockholders Equity" in bal.columns and "Ordinary Shares Number" in bal.columns:
-                equity = bal["Stockholders Equity"]
-                shares = bal["Ordinary Shares Number"]
-                vpa_series = equity / shares
-            
-            if lpa_series is not None and vpa_series is not None:
-                # Merge and ffill
-                fund_df = pd.concat([lpa_series.rename("LPA"), vpa_series.rename("VPA")], axis=1)
-                fund_df = fund_df.sort_index()
-                
-                # Reindex to dates.tz
-                if fund_df.index.tz is None and dates.tz is not None:
-                     fund_df.index = fund_df.index.tz_localize(dates.tz)
-                elif fund_df.index.tz is not None and dates.tz is None:
-                     fund_df.index = fund_df.index.tz_convert(None)
-                elif fund_df.index.tz != dates.tz:
-                     fund_df.index = fund_df.index.tz_convert(dates.tz)
-
-                combined = fund_df.reindex(dates.union(fund_df.index)).sort_index().ffill()
-                combined = combined.loc[dates]
-                
-                # Graham
-                lpa_daily = combined['LPA']
-                vpa_daily = combined['VPA']
-                product = 22.5 * lpa_daily * vpa_daily
-                graham_daily = np.sqrt(product.where(product > 0, 0))
-                
-                df_indicators['Preço Justo (Graham)'] = graham_daily
-        
-        # 3. Barsi: Dividends / 6%
-        divs = stock.dividends
-        if not divs.empty:
-            if divs.index.tz is None and dates.tz is not None:
-                divs.index = divs.index.tz_localize(dates.tz)
-            elif divs.index.tz is not None and dates.tz is None:
-                divs.index = divs.index.tz_convert(None)
-            elif divs.index.tz != dates.tz:
-                divs.index = divs.index.tz_convert(dates.tz)
-                
-            all_days = pd.date_range(start=dates.min() - pd.Timedelta(days=365), end=dates.max(), tz=dates.tz)
-            div_daily = divs.reindex(all_days).fillna(0)
-            rolling_divs = div_daily.rolling('365D').sum()
-            rolling_divs_subset = rolling_divs.reindex(dates).ffill()
-            
-            df_indicators['Preço Teto (6%)'] = rolling_divs_subset / 0.06
-            
-        return df_indicators
-        
-    except Exception as e:
-        return pd.DataFrame() # Fail silently/gracefully
+    memos = st.session_state.setdefault('_memo', {})
+    memo = memos.setdefault(name, OrderedDict())
+    cached = memo.get(key)
+    if cached is not None and (ttl is None or time.time() - cached[0] < ttl):
+        memo.move_to_end(key)
+        return cached[1]
+    value = compute()
+    memo[key] = (time.time(), value)
+    memo.move_to_end(key)
+    while len(memo) > SESSION_MEMO_KEPT:
+        memo.popitem(last=False)
+    return value
 
 # 1. Configuração Inicial
 st.set_page_config(page_title="Dashboard Fundamentalista Pro", layout="wide")
 
-@st.cache_data(ttl=600)
-def get_market_data():
+def get_available_tickers():
+    """
+    Tickers the app can show, the same ones the API's autocomplete offers
+    (universe.get_index: the shared snapshot, downloaded at most once per
+    core.SNAPSHOT_TTL for every session, plus the known FIIs and ETFs and the
+    saved portfolios' tickers), and the snapshot version.
+    """
     try:
-        df = fundamentus.get_resultado()
-        df.columns = [c.strip().lower() for c in df.columns]
-        return df
+        frame, version = core.get_market_snapshot()
+        return list(universe.get_index().symbols), version
     except Exception as e:
         st.error(f"Erro ao acessar dados do mercado: {e}")
-        return pd.DataFrame()
-
-def extrair_tickers_planilha(df):
-    todos_valores = df.astype(str).values.flatten()
-    regex = re.compile(r'^[A-Z]{4}[0-9]{1,2}$')
-    return list(set([v.strip().upper() for v in todos_valores if regex.match(v.strip().upper())]))
+        return [], None
 
-def load_portfolios():
-    if not os.path.exists(PORTFOLIO_FILE):
-        return {}
-    try:
-        with open(PORTFOLIO_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        st.error(f"Erro ao carregar carteiras: {e}")
-        return {}
-
-def save_portfolio(name, tickers):
-    portfolios = load_portfolios()
-    portfolios[name] = tickers
-    try:
-        with open(PORTFOLIO_FILE, 'w') as f:
-            json.dump(portfolios, f)
-        st.success(f"Carteira '{name}' salva com sucesso!")
-    except Exception as e:
-        st.error(f"Erro ao salvar carteira: {e}")
+def get_valued_table(tickers, version):
+    """
+    Market rows plus valuation columns for `tickers`. Recomputed when the snapshot
+    changes or the live quotes are older than quotes.QUOTE_INTERVAL.
+    """
+    def compute():
+        df = core.get_market_data(tickers)
+        if df.empty:
+            return df
+        return core.valuation_table(df)
+    return session_memo('tabela', (tuple(tickers), version), compute, ttl=quotes.QUOTE_INTERVAL)
+
+def get_chart_series(ticker, indicator_name, indicator_value):
+    """
+    Daily close of `ticker` plus the selected indicator: its historical line when
+    core.get_historical_financials has one, else a constant at the current value.
+    """
+    def indicators():
+        return core.get_historical_financials(ticker)
 
-def delete_portfolio(name):
-    portfolios = load_portfolios()
-    if name in portfolios:
-        del portfolios[name]
-        try:
-            with open(PORTFOLIO_FILE, 'w') as f:
-                json.dump(portfolios, f)
-            st.success(f"Carteira '{name}' excluída com sucesso!")
-            return True
-        except Exception as e:
-            st.error(f"Erro ao excluir carteira: {e}")
-            return False
-    return False
-
-def calcular_valuation(row):
-    cotacao = row.get('cotacao', 0)
-    pl = row.get('pl', 0)
-    pvp = row.get('pvp', 0)
-    dy = row.get('dy', 0)
-
-    lpa = cotacao / pl if pl != 0 else 0
-    vpa = cotacao / pvp if pvp != 0 else 0
-
-    if lpa > 0 and vpa > 0:
-        preco_graham = np.sqrt(22.5 * vpa * lpa)
-        margem_graham = ((preco_graham / cotacao) - 1) * 100 if cotacao > 0 else 0
-    else:
-        preco_graham = 0
-        margem_graham = 0
-    
-    dividendos_estimados = dy * cotacao
-    preco_teto_6 = dividendos_estimados / 0.06
-    margem_barsi = ((preco_teto_6 / cotacao) - 1) * 100 if cotacao > 0 else 0
-    
-    return pd.Series([preco_graham, margem_graham, preco_teto_6, margem_barsi, lpa, vpa], 
-                     index=['Preço Justo (Graham)', 'Margem Graham %', 'Preço Teto (6%)', 'Margem Barsi %', 'LPA', 'VPA'])
+    def compute():
+        h = core.get_price_history(ticker)
+        if h.empty:
+            return pd.DataFrame()
+        df_chart = h[['Close']].copy()
+        if indicator_name and indicator_value is not None:
+            # Statements are fetched once per ticker, whatever indicator is selected
+            hist_inds = session_memo('indicadores', ticker, indicators, ttl=core.HISTORY_TTL)
+            if not hist_inds.empty and indicator_name in hist_inds.columns:
+                df_chart = df_chart.join(hist_inds[indicator_name], how='left')
+                df_chart[indicator_name] = df_chart[indicator_name].fillna(indicator_value)
+            else:
+                df_chart[indicator_name] = indicator_value
+        return df_chart
+    return session_memo('grafico', (ticker, indicator_name, indicator_value), compute, ttl=core.HISTORY_TTL)
+
+def get_intraday_series(ticker, indicator_name, indicator_value):
+    """
+    Minute closes of `ticker` from the intraday store (no upstream call) plus the
+    selected indicator at its current value.
+    """
+    bars = intraday.history(ticker)
+    if bars.empty:
+        return pd.DataFrame()
+    df_chart = bars[['close']].rename(columns={'close': 'Close'})
+    if indicator_name and indicator_value is not None:
+        df_chart[indicator_name] = indicator_value
+    return df_chart
 
 # 2. Dados
-dados_mercado = get_market_data()
+todos_tickers_disponiveis, snapshot_version = get_available_tickers()
 
 # 3. Sidebar
 st.sidebar.header("📥 Entrada de Ativos")
 
 # --- Portfolio Logic ---
 st.sidebar.markdown("### 💾 Carteiras")
-portfolios = load_portfolios()
+portfolios = core.load_portfolios()
 selected_portfolio_name = st.sidebar.selectbox("Carregar Carteira:", [""] + list(portfolios.keys()))
 
-todos_tickers_disponiveis = dados_mercado.index.tolist() if not dados_mercado.empty else []
-
 if st.sidebar.button("Carregar"):
     if selected_portfolio_name and selected_portfolio_name in portfolios:
         loaded = portfolios[selected_portfolio_name]
-        valid_loaded = [t for t in loaded if t in todos_tickers_disponiveis]
+        disponiveis = set(todos_tickers_disponiveis)
+        valid_loaded = [t for t in loaded if t in disponiveis]
         st.session_state['selected_tickers'] = valid_loaded
         st.rerun()
 
 if st.sidebar.button("Excluir Carteira"):
     if selected_portfolio_name and selected_portfolio_name in portfolios:
-        if delete_portfolio(selected_portfolio_name):
+        success, msg = core.delete_portfolio(selected_portfolio_name)
+        if success:
             st.rerun()
+        st.sidebar.error(msg)
     elif not selected_portfolio_name:
         st.sidebar.warning("Selecione uma carteira para excluir.")
 
@@ -201,7 +132,7 @@ if 'selected_tickers' not in st.session_state:
     st.session_state['selected_tickers'] = []
 
 tickers_manuais = st.sidebar.multiselect(
-    "1. Seleção Manual:", 
+    "1. Seleção Manual:",
     options=todos_tickers_disponiveis,
     key='selected_tickers'
 )
@@ -211,7 +142,7 @@ uploaded_file = st.sidebar.file_uploader("2. Carregar planilha CSV", type=["csv"
 ativos_da_planilha = []
 if uploaded_file:
     # Método robusto: ler texto bruto e usar regex (ignora colunas/linhas quebradas)
-    content = uploaded_file.read()
+    content = uploaded_file.getvalue()
     text = ""
     try:
         text = content.decode('utf-8')
@@ -220,11 +151,10 @@ if uploaded_file:
             text = content.decode('latin1')
         except:
             text = content.decode('utf-8', errors='ignore')
-            
+
     # Procura por padrões de Ticker (ex: PETR4, VIVT3) no texto inteiro
-    regex = re.compile(r'\b[A-Z]{4}[0-9]{1,2}\b')
-    ativos_da_planilha = list(set(regex.findall(text.upper())))
-    
+    ativos_da_planilha = core.extrair_tickers_texto(text.upper())
+
     if not ativos_da_planilha:
         st.sidebar.warning("Nenhum código de ativo encontrado.")
 
@@ -237,7 +167,12 @@ if st.sidebar.button("Salvar Carteira"):
     if not lista_final_ativos:
         st.sidebar.error("Selecione ativos antes de salvar.")
     elif save_name:
-        save_portfolio(save_name, lista_final_ativos)
+        success, msg = core.save_portfolio(save_name, lista_final_ativos)
+        if success:
+            universe.add(lista_final_ativos)
+            st.success(msg)
+        else:
+            st.error(msg)
     else:
         st.sidebar.error("Digite um nome.")
 
@@ -248,26 +183,26 @@ indicadores_map = {
     'cotacao': 'Preço Atual',
     'Preço Justo (Graham)': 'Preço Justo (Graham)',
     'Margem Graham %': 'Margem Graham %',
-    'Preço Teto (6%)': 'Preço Teto ',
+    'Preço Teto (6%)': 'Preço Teto (6%)',
     'Margem Barsi %': 'Margem Barsi %',
+    'DY Proj. 12m %': 'DY Proj. 12m %',
+    'Preço Teto Proj. (6%)': 'Preço Teto Proj. (6%)',
     'pl': 'P/L',
     'pvp': 'P/VP',
     'dy': 'Div. Yield',
-    'roe': 'ROE',
-    'liqcor': 'Liq. Corrente',
+    'return_on_equity': 'ROE',
+    'liqc': 'Liq. Corrente',
     'LPA': 'LPA',
     'VPA': 'VPA',
     'c5y': 'Cresc. últimos 5 anos'
 }
 
-if lista_final_ativos and not dados_mercado.empty:
-    df_analise = dados_mercado[dados_mercado.index.isin(lista_final_ativos)].copy()
-    df_valuation = df_analise.apply(calcular_valuation, axis=1)
-    df_final = pd.concat([df_analise, df_valuation], axis=1)
-    
+df_final = get_valued_table(lista_final_ativos, snapshot_version) if lista_final_ativos else pd.DataFrame()
+
+if not df_final.empty:
     # Tabela Transposta (Indicadores na Esquerda, Ativos no Topo)
     st.subheader("📋 Comparativo de Ativos")
-    
+
     colunas_finais = [c for c in indicadores_map.keys() if c in df_final.columns]
     df_tab = df_final[colunas_finais].rename(columns=indicadores_map).T
 
@@ -292,17 +227,18 @@ if lista_final_ativos and not dados_mercado.empty:
     # 1. Select Asset (Define ativo_sel first)
     with col_graf:
         st.subheader("📈 Histórico")
-        ativo_sel = st.selectbox("Selecione o ativo:", lista_final_ativos)
+        ativo_sel = st.selectbox("Selecione o ativo:", list(df_final.index))
+        modo_grafico = st.radio("Período:", ["Diário (5 anos)", "Intradiário"], horizontal=True)
 
     # 2. Show Info & Select Indicator (Uses ativo_sel)
     with col_info:
         st.subheader("ℹ️ Info (Selecione para ver no gráfico)")
         selected_indicator_val = None
         selected_indicator_name = None
-        
+
         if ativo_sel and ativo_sel in df_final.index:
             row = df_final.loc[ativo_sel]
-            
+
             options = []
             values = {}
             for k, v in indicadores_map.items():
@@ -311,50 +247,30 @@ if lista_final_ativos and not dados_mercado.empty:
                     label = f"{v}: {val:.2f}" if isinstance(val, (float, int)) else f"{v}: {val}"
                     options.append(label)
                     values[label] = (v, val)
-            
+
             # Use unique key per asset to reset selection or keep distinctive state
             selection = st.radio("Indicadores:", options, key=f"radio_{ativo_sel}")
-            
+
             if selection:
                 selected_indicator_name = values[selection][0]
                 selected_indicator_val = values[selection][1]
 
-# ... (rest of code)
-
     # 3. Show Chart (Uses ativo_sel and selected_indicator)
     with col_graf:
-        if ativo_sel:
-            h = yf.Ticker(f"{ativo_sel}.SA").history(period="5y") # Increased to 5y
-            if not h.empty:
-                df_chart = h[['Close']].copy()
-                
-                if selected_indicator_name and selected_indicator_val is not None:
-                    
-                    # Attempt to fetch historical data for plotting
-                    hist_inds = get_historical_financials(ativo_sel)
-                    
-                    # Logic: 
-                    # If we have historical data for the selected indicator, use it.
-                    # Else, fallback to constant line.
-                    
-                    col_name = selected_indicator_name.split(':')[0].strip() # Remove value if present "Label: Value" -> "Label"
-                    # Actually, selected_indicator_name coming from session state might just be the clean name "Preço Justo (Graham)"
-                    # Let's verify what we stored. 
-                    # value stored was: values[label] = (v, val) -> (friendly_name, numeric_value)
-                    # So selected_indicator_name is "Preço Justo (Graham)"
-                    
-                    if not hist_inds.empty and selected_indicator_name in hist_inds.columns:
-                        # Align indexes just in case
-                        series_hist = hist_inds[selected_indicator_name]
-                        # Join
-                        df_chart = df_chart.join(series_hist, how='left')
-                        # Fill NaNs with the current scalar value as fallback step (or just ffill)
-                        df_chart[selected_indicator_name] = df_chart[selected_indicator_name].fillna(selected_indicator_val)
-                    else:
-                        # Fallback to constant
-                        df_chart[selected_indicator_name] = selected_indicator_val
-                
+        if ativo_sel and modo_grafico == "Intradiário":
+            df_chart = get_intraday_series(ativo_sel, selected_indicator_name, selected_indicator_val)
+            if not df_chart.empty:
+                st.line_chart(df_chart)
+            else:
+                st.info("Aguardando cotações intradiárias deste ativo.")
+        elif ativo_sel:
+            df_chart = get_chart_series(ativo_sel, selected_indicator_name, selected_indicator_val)
+            if not df_chart.empty:
                 st.line_chart(df_chart)
+            else:
+                st.info("Histórico indisponível para este ativo.")
 
+elif lista_final_ativos:
+    st.warning("Nenhum dado encontrado para os ativos selecionados.")
 else:
     st.info("Aguardando ativos...")
@@ -0,0 +1,176 @@
+"""
+Append-only daily archive of Fundamentus snapshots, for as-of queries.
+
+Layout: ARCHIVE_DIR/year=YYYY/YYYY-MM-DD.parquet, one file per day (B3's
+calendar day, TIMEZONE), written the first time a snapshot is loaded that day
+and never rewritten. Besides the Fundamentus rows it holds the Yahoo rows of
+the saved portfolios' tickers outside Fundamentus (FIIs, ETFs), so as-of
+queries find those too. Tickers are
+dictionary-encoded (categorical), ratios float32 and amounts float64
+(core.MARKET_DTYPES), zstd compressed. Reading a past snapshot never touches
+the upstream.
+"""
+import bisect
+import datetime
+import glob
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import core
+
+ARCHIVE_DIR = os.environ.get('SNAPSHOT_ARCHIVE_DIR', os.path.join(core.BASE_DIR, 'data', 'snapshots'))
+TEMP_ARCHIVE_DIR = os.path.join(core.TEMP_DIR, 'snapshots')
+
+LOADED_SNAPSHOTS_KEPT = 8
+TIMEZONE = 'America/Sao_Paulo'
+
+_lock = threading.Lock()
+_state = {'dir': None}
+_days = {}  # archive dir -> sorted list of archived days
+_loaded = OrderedDict()  # (archive dir, day) -> MarketFrame
+
+def archive_dir():
+    """
+    ARCHIVE_DIR if writable, else a temp directory (read-only deploys such as Vercel).
+    """
+    if _state['dir'] is None:
+        try:
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+            if not os.access(ARCHIVE_DIR, os.W_OK):
+                raise PermissionError(ARCHIVE_DIR)
+            _state['dir'] = ARCHIVE_DIR
+        except OSError:
+            os.makedirs(TEMP_ARCHIVE_DIR, exist_ok=True)
+            _state['dir'] = TEMP_ARCHIVE_DIR
+    return _state['dir']
+
+def today():
+    """
+    Current day in B3's timezone, whatever the server's.
+    """
+    return pd.Timestamp.now(tz=TIMEZONE).date()
+
+def _day_path(day, base_dir):
+    return os.path.join(base_dir, f"year={day.year}", f"{day.isoformat()}.parquet")
+
+def archive_snapshot(frame, day=None, base_dir=None):
+    """
+    Writes `frame` (core.MarketFrame) as the snapshot of `day` (default today).
+    Returns False if that day is already archived.
+    """
+    day = day or today()
+    base_dir = base_dir or archive_dir()
+    path = _day_path(day, base_dir)
+    if os.path.exists(path):
+        return False
+
+    table = frame.to_frame().reset_index(drop=True).astype(core.MARKET_DTYPES)
+    table.insert(0, 'papel', pd.Categorical(frame.tickers))
+    table['fonte'] = frame.sources
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    table.to_parquet(tmp_path, compression='zstd', index=False)
+    os.replace(tmp_path, path)
+
+    with _lock:
+        _days.pop(base_dir, None)
+    return True
+
+def with_portfolio_funds(frame):
+    """
+    `frame` plus the Yahoo rows (core.yahoo_rows, cached) of saved-portfolio
+    tickers it doesn't have.
+    """
+    tickers = {t.strip().upper() for p in core.load_portfolios().values() for t in p if t.strip()}
+    outside = sorted(t for t in tickers if t not in frame)
+    if not outside:
+        return frame
+    rows, _ = core.yahoo_rows(outside)
+    if rows.empty:
+        return frame
+    values = np.vstack([frame.to_frame().to_numpy(), rows.reindex(columns=core.MARKET_COLUMNS).to_numpy()])
+    sources = pd.Categorical(list(frame.sources) + ['yahoo'] * len(rows), categories=core.MARKET_SOURCES)
+    return core.MarketFrame(values, frame.tickers + list(rows.index), sources)
+
+def archive_current_snapshot(frame):
+    """
+    Snapshot listener: archives the first snapshot of each day, with the
+    portfolios' funds (fetched only when the day is not archived yet).
+    """
+    day = today()
+    try:
+        if os.path.exists(_day_path(day, archive_dir())):
+            return
+        if archive_snapshot(with_portfolio_funds(frame), day):
+            print(f"Snapshot de {day.isoformat()} arquivado.")
+    except Exception as e:
+        print(f"Erro ao arquivar snapshot: {e}")
+
+def snapshot_days(base_dir=None):
+    """
+    Sorted list of archived days.
+    """
+    base_dir = base_dir or archive_dir()
+    with _lock:
+        if base_dir not in _days:
+            _days[base_dir] = _scan_days(base_dir)
+        return _days[base_dir]
+
+def _scan_days(base_dir):
+    days = []
+    for path in glob.glob(os.path.join(base_dir, 'year=*', '*.parquet')):
+        try:
+            days.append(datetime.date.fromisoformat(os.path.basename(path)[:-len('.parquet')]))
+        except ValueError:
+            pass
+    return sorted(days)
+
+def read_snapshot(day, base_dir=None):
+    """
+    Loads the archived snapshot of exactly `day` as a core.MarketFrame.
+    """
+    df = pd.read_parquet(_day_path(day, base_dir or archive_dir()))
+    values = df.reindex(columns=core.MARKET_COLUMNS).to_numpy(dtype=np.float64)
+    sources = pd.Categorical(df['fonte'], categories=core.MARKET_SOURCES)
+    return core.MarketFrame(values, [str(t) for t in df['papel']], sources)
+
+def load_snapshot(as_of, base_dir=None):
+    """
+    Returns (frame, day) for the latest archived snapshot on or before `as_of`,
+    or (None, None) when the archive has nothing that old.
+    """
+    base_dir = base_dir or archive_dir()
+    days = snapshot_days(base_dir)
+    i = bisect.bisect_right(days, as_of)
+    if i == 0:
+        return None, None
+    day = days[i - 1]
+
+    key = (base_dir, day)
+    with _lock:
+        if key in _loaded:
+            _loaded.move_to_end(key)
+            return _loaded[key], day
+    frame = read_snapshot(day, base_dir)
+    with _lock:
+        _loaded[key] = frame
+        while len(_loaded) > LOADED_SNAPSHOTS_KEPT:
+            _loaded.popitem(last=False)
+    return frame, day
+
+def get_market_data(tickers_filter, as_of):
+    """
+    As-of counterpart of core.get_market_data: rows from the archived snapshot
+    (Fundamentus and the portfolios' funds), without upstream calls or live quotes. Returns (df, day); df is empty if
+    nothing was archived by then.
+    """
+    frame, day = load_snapshot(as_of)
+    if frame is None:
+        return pd.DataFrame(), None
+    if not tickers_filter:
+        return frame.to_frame(), day
+    return frame.take([t.upper() for t in tickers_filter]), day
@@ -0,0 +1,78 @@
+"""
+Static assets with content-hashed names, precompressed once at startup.
+
+index.html references style.css/app.js; the bundle serves them as
+style.<hash>.css / app.<hash>.js with a year-long immutable Cache-Control, and
+rewrites index.html (served with no-cache) to point at the hashed names, so a
+deploy changes the URL instead of relying on revalidation. Each asset is kept
+raw, gzip and (when the brotli module is installed) brotli encoded; the
+encoding is picked from Accept-Encoding. Everything lives in memory, since the
+static directory is read-only on Vercel.
+"""
+import gzip
+import hashlib
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HASHED_ASSETS = ['app.js', 'style.css']
+IMMUTABLE = 'public, max-age=31536000, immutable'
+MEDIA_TYPES = {'.js': 'text/javascript; charset=utf-8', '.css': 'text/css; charset=utf-8',
+               '.html': 'text/html; charset=utf-8'}
+
+class Asset:
+    def __init__(self, name, body, cache_control):
+        self.name = name
+        self.media_type = MEDIA_TYPES[os.path.splitext(name)[1]]
+        self.cache_control = cache_control
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        self.encodings = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(body, quality=11)
+
+    def pick(self, accept_encoding):
+        """
+        (encoding, body) for the smallest representation the client accepts.
+        """
+        accepted = {e.split(';')[0].strip() for e in accept_encoding.lower().split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and encoding in accepted:
+                return encoding, self.encodings[encoding]
+        return 'identity', self.encodings['identity']
+
+class AssetBundle:
+    """
+    Hashed assets by URL name, plus the rewritten index.html.
+    """
+    def __init__(self, static_dir):
+        self.assets = {}
+        self.urls = {}  # original name -> hashed name
+        for name in HASHED_ASSETS:
+            path = os.path.join(static_dir, name)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            stem, ext = os.path.splitext(name)
+            hashed = f"{stem}.{hashlib.sha256(body).hexdigest()[:10]}{ext}"
+            self.urls[name] = hashed
+            self.assets[hashed] = Asset(hashed, body, IMMUTABLE)
+
+        self.index = None
+        index_path = os.path.join(static_dir, 'index.html')
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as f:
+                html = f.read()
+            for name, hashed in self.urls.items():
+                html = re.sub(rf'(src|href)="{re.escape(name)}"', rf'\1="{hashed}"', html)
+            # HTML must be revalidated so it always points at the current hashes
+            self.index = Asset('index.html', html.encode('utf-8'), 'no-cache')
+
+    def get(self, name):
+        if name in ('', 'index.html'):
+            return self.index
+        return self.assets.get(name)
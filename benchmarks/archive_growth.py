@@ -0,0 +1,118 @@
+"""
+Storage growth and as-of query time of the snapshot archive over a year.
+
+    python -m benchmarks.archive_growth --days 365
+
+Archives one synthetic snapshot per business day into a temporary directory
+(the fixture table with prices and ratios drifting day to day, a few tickers
+listed/delisted), then reports bytes on disk and the time of as-of lookups,
+cold (file read) and cached.
+"""
+import argparse
+import datetime
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+import pandas as pd
+
+import archive
+import core
+from benchmarks.fixtures import PORTFOLIO_STOCKS, load_fixtures
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def build_archive(base_dir, days, seed=7):
+    """
+    Writes `days` business days of snapshots into `base_dir`. Returns the list of days.
+    """
+    rng = np.random.default_rng(seed)
+    base = core._normalize_resultado(load_fixtures()['resultado'].copy())
+    dates = pd.bdate_range(end=datetime.date.today(), periods=days).date
+    numeric = base.select_dtypes('number').columns
+    sizes = []
+    df = base
+    for i, day in enumerate(dates):
+        drift = 1 + rng.normal(0, 0.015, (len(df), len(numeric)))
+        df = df.copy()
+        df[numeric] = df[numeric].to_numpy() * drift
+        if i % 20 == 19:
+            # Occasional listings/delistings
+            df = df.drop(df.index[rng.integers(0, len(df))])
+        archive.archive_snapshot(core.MarketFrame.from_frame(df, 'fundamentus'), day, base_dir)
+        sizes.append(_dir_size(base_dir))
+    return list(dates), sizes
+
+
+def time_queries(base_dir, dates, n=50, seed=11):
+    rng = np.random.default_rng(seed)
+    targets = [dates[i] for i in rng.integers(0, len(dates), n)]
+
+    def run(fn, days):
+        timings = []
+        for day in days:
+            start = time.perf_counter()
+            fn(day)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), max(timings)
+
+    def cold(day):
+        archive._loaded.clear()
+        archive.load_snapshot(day, base_dir)[0].take(PORTFOLIO_STOCKS)
+
+    def cached(day):
+        archive.load_snapshot(day, base_dir)[0].take(PORTFOLIO_STOCKS)
+
+    archive._days.pop(base_dir, None)
+    start = time.perf_counter()
+    archive.snapshot_days(base_dir)
+    scan_ms = (time.perf_counter() - start) * 1000
+    cold_stats = run(cold, targets)
+    # Repeated lookups within the loaded-snapshot cache (e.g. paging through a comparison)
+    recent = targets[:archive.LOADED_SNAPSHOTS_KEPT] * 5
+    for day in recent:
+        cached(day)
+    return scan_ms, cold_stats, run(cached, recent)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot archive growth over a year")
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--keep', metavar='DIR', help="write the archive here and keep it")
+    args = parser.parse_args(argv)
+
+    base_dir = args.keep or tempfile.mkdtemp(prefix='snapshots_')
+    try:
+        start = time.perf_counter()
+        dates, sizes = build_archive(base_dir, args.days)
+        write_s = time.perf_counter() - start
+        scan_ms, (cold_p50, cold_max), (cached_p50, cached_max) = time_queries(base_dir, dates)
+
+        frame = archive.read_snapshot(dates[-1], base_dir)
+        per_day = sizes[-1] / len(dates)
+        print(f"{len(dates)} snapshots of ~{len(frame)} tickers written in {write_s:.1f}s")
+        for label, i in [('1 month', 20), ('6 months', 125), ('1 year', len(dates) - 1)]:
+            if i < len(sizes):
+                print(f"  {label:<9} {sizes[i] / 1024 / 1024:8.2f} MB")
+        print(f"  per day   {per_day / 1024:8.1f} KB  (in memory: {frame.memory_usage() / 1024:.0f} KB)")
+        print(f"Day index scan: {scan_ms:.2f} ms")
+        print(f"As-of query, cold:   p50 {cold_p50:.2f} ms  max {cold_max:.2f} ms")
+        print(f"As-of query, cached: p50 {cached_p50:.3f} ms  max {cached_max:.3f} ms")
+    finally:
+        if not args.keep:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
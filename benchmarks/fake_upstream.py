@@ -0,0 +1,168 @@
+"""
+Local fake Fundamentus/Yahoo server for load tests.
+
+Serves the benchmark fixture files over HTTP with configurable latency and
+error rate, and counts every call so the load test can report upstream
+amplification (upstream calls per dashboard request).
+
+    python -m benchmarks.fake_upstream --port 9001 --latency-ms 150 --error-rate 0.02
+
+Endpoints:
+    GET  /fundamentus/resultado.csv
+    GET  /yahoo/<TICKER>/<info.json|history.csv|dividends.csv|...>
+    GET  /__stats    -> {"calls": {...}, "errors": n}
+    POST /__reset
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fixtures import FIXTURE_DIR, YAHOO_FILES, has_fixtures, parse_yahoo, synthesize
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, base_dir=FIXTURE_DIR, latency_ms=100.0, jitter_ms=50.0, error_rate=0.0):
+        super().__init__(address, FakeUpstreamHandler)
+        self.base_dir = base_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.errors = 0
+        self.lock = threading.Lock()
+        self._files = {}
+
+    def read(self, rel_path):
+        # Fixture files are small; keep them in memory after the first read
+        if rel_path not in self._files:
+            path = os.path.normpath(os.path.join(self.base_dir, rel_path))
+            if not path.startswith(self.base_dir) or not os.path.isfile(path):
+                self._files[rel_path] = None
+            else:
+                with open(path, 'rb') as f:
+                    self._files[rel_path] = f.read()
+        return self._files[rel_path]
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path == '/__reset':
+            with self.server.lock:
+                self.server.calls.clear()
+                self.server.errors = 0
+            return self._send(204)
+        self._send(404)
+
+    def do_GET(self):
+        server = self.server
+        if self.path == '/__stats':
+            with server.lock:
+                body = json.dumps({'calls': dict(server.calls), 'errors': server.errors}).encode()
+            return self._send(200, body, 'application/json')
+
+        parts = urllib.parse.unquote(self.path).strip('/').split('/')
+        endpoint = parts[0] if parts[0] == 'fundamentus' else f"yahoo.{parts[-1].split('.')[0]}"
+        with server.lock:
+            server.calls[endpoint] += 1
+
+        delay = max(0.0, random.gauss(server.latency_ms, server.jitter_ms)) / 1000
+        time.sleep(delay)
+
+        if random.random() < server.error_rate:
+            with server.lock:
+                server.errors += 1
+            return self._send(503, b'upstream unavailable')
+
+        if parts[0] == 'fundamentus':
+            body = server.read('fundamentus_resultado.csv')
+        else:
+            body = server.read(os.path.join('yahoo', *parts[1:]))
+        if body is None:
+            return self._send(404)
+        self._send(200, body)
+
+
+class UpstreamError(Exception):
+    pass
+
+
+def remote_clients(base_url, timeout=30):
+    """
+    Returns (get_resultado, source) that read from a running fake upstream,
+    for use with benchmarks.replay.patch_upstream.
+    """
+    import pandas as pd
+
+    def fetch(path):
+        try:
+            with urllib.request.urlopen(f"{base_url}{path}", timeout=timeout) as res:
+                return res.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise UpstreamError(f"{path}: HTTP {e.code}")
+
+    def get_resultado():
+        body = fetch('/fundamentus/resultado.csv')
+        return pd.read_csv(io.BytesIO(body), index_col='papel')
+
+    def source(ticker, key):
+        body = fetch(f"/yahoo/{urllib.parse.quote(ticker)}/{YAHOO_FILES[key]}")
+        if body is None:
+            return None
+        return parse_yahoo(key, io.BytesIO(body))
+
+    return get_resultado, source
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Fundamentus/Yahoo upstream")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--jitter-ms', type=float, default=50.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--dir', default=FIXTURE_DIR)
+    args = parser.parse_args(argv)
+
+    if not has_fixtures(args.dir):
+        synthesize(args.dir)
+
+    server = FakeUpstream((args.host, args.port), os.path.abspath(args.dir),
+                          args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Fake upstream on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, errors {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Offline fixtures for the benchmark suite.
+
+Fixtures live in benchmarks/fixtures/ using the same shapes the upstreams return:
+  fundamentus_resultado.csv          -> fundamentus.get_resultado()
+  yahoo/<TICKER>/info.json           -> yf.Ticker(...).info
+  yahoo/<TICKER>/history.csv         -> yf.Ticker(...).history(period="5y")
+  yahoo/<TICKER>/dividends.csv       -> yf.Ticker(...).dividends
+  yahoo/<TICKER>/quarterly_income_stmt.csv / quarterly_balance_sheet.csv
+
+`record()` captures real responses (needs network). `synthesize()` writes a
+deterministic stand-in in the same format so the suite also runs on machines
+without access to Fundamentus/Yahoo. The directory is not committed (2.4 MB,
+and recorded data is not ours to publish): load_fixtures() synthesizes it on
+first use, and `digest()` identifies the set a baseline was measured on.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+TZ = 'America/Sao_Paulo'
+
+# Portfolio used by the benchmarks: stocks present in the Fundamentus table plus
+# FIIs that only exist on Yahoo (exercises the fetch_yf_data fallback).
+PORTFOLIO_STOCKS = ['PETR4', 'VALE3', 'ITUB4', 'BBDC4', 'BBAS3', 'WEGE3', 'TAEE11', 'EGIE3', 'VIVT3', 'ABEV3']
+PORTFOLIO_FIIS = ['HGLG11', 'KNRI11', 'MXRF11']
+PORTFOLIO = PORTFOLIO_STOCKS + PORTFOLIO_FIIS
+BENCHMARK = '^BVSP'
+
+
+def _yahoo_dir(base_dir, ticker):
+    return os.path.join(base_dir, 'yahoo', ticker)
+
+
+def has_fixtures(base_dir=FIXTURE_DIR):
+    return os.path.exists(os.path.join(base_dir, 'fundamentus_resultado.csv'))
+
+
+def _write_yahoo(base_dir, ticker, info, history, dividends, income, balance):
+    out = _yahoo_dir(base_dir, ticker)
+    os.makedirs(out, exist_ok=True)
+    with open(os.path.join(out, 'info.json'), 'w') as f:
+        json.dump(info, f, default=float)
+    history.to_csv(os.path.join(out, 'history.csv'), index_label='Date')
+    dividends.rename('Dividends').to_csv(os.path.join(out, 'dividends.csv'), index_label='Date')
+    # Yahoo returns empty statements for FIIs/ETFs; absent files replay as empty frames
+    if not income.empty:
+        income.to_csv(os.path.join(out, 'quarterly_income_stmt.csv'))
+    if not balance.empty:
+        balance.to_csv(os.path.join(out, 'quarterly_balance_sheet.csv'))
+
+
+def record(tickers=PORTFOLIO + [BENCHMARK], base_dir=FIXTURE_DIR):
+    """
+    Records live Fundamentus and Yahoo responses for `tickers` into `base_dir`.
+    """
+    import fundamentus
+    import yfinance as yf
+
+    os.makedirs(base_dir, exist_ok=True)
+    fundamentus.get_resultado().to_csv(os.path.join(base_dir, 'fundamentus_resultado.csv'))
+
+    for t in tickers:
+        stock = yf.Ticker(t if t.startswith('^') else f"{t}.SA")
+        info = {k: v for k, v in stock.info.items() if isinstance(v, (int, float, str, bool))}
+        _write_yahoo(base_dir, t, info, stock.history(period="5y"), stock.dividends,
+                     stock.quarterly_income_stmt, stock.quarterly_balance_sheet)
+        print(f"Recorded {t}")
+
+
+def _synthetic_ticker_names(rng, n):
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    names = set(PORTFOLIO_STOCKS)
+    while len(names) < n:
+        root = ''.join(rng.choice(letters, 4))
+        names.add(root + str(rng.choice([3, 4, 5, 6, 11])))
+    return sorted(names)
+
+
+def _synthetic_yahoo(rng, ticker, end, fii=False):
+    dates = pd.bdate_range(end=end, periods=252 * 5, tz=TZ)
+    start_price = rng.uniform(8, 80)
+    returns = rng.normal(0.0003, 0.018, len(dates))
+    close = start_price * np.exp(np.cumsum(returns))
+    history = pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.004, len(dates))),
+        'High': close * (1 + np.abs(rng.normal(0, 0.01, len(dates)))),
+        'Low': close * (1 - np.abs(rng.normal(0, 0.01, len(dates)))),
+        'Close': close,
+        'Volume': rng.integers(1e5, 5e7, len(dates)),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=dates)
+
+    # FIIs pay monthly, stocks quarterly
+    step = 21 if fii else 63
+    div_dates = dates[rng.integers(0, step):][::step]
+    dividends = pd.Series(close[dates.get_indexer(div_dates)] * rng.uniform(0.006, 0.02, len(div_dates)) / (3 if fii else 1),
+                          index=div_dates, name='Dividends')
+    history.loc[div_dates, 'Dividends'] = dividends.values
+
+    quarters = pd.date_range(end=end, periods=6, freq='QE')
+    eps = rng.uniform(-0.2, 2.5) + rng.normal(0, 0.2, len(quarters))
+    shares = float(rng.integers(5e8, 1e10))
+    equity = shares * rng.uniform(5, 40) * (1 + np.cumsum(rng.normal(0.01, 0.02, len(quarters))))
+    income = pd.DataFrame([eps, eps * 0.99], index=['Basic EPS', 'Diluted EPS'], columns=quarters)
+    balance = pd.DataFrame([equity, np.full(len(quarters), shares)],
+                           index=['Stockholders Equity', 'Ordinary Shares Number'], columns=quarters)
+    if fii:
+        income = pd.DataFrame()
+        balance = pd.DataFrame()
+
+    last = float(close[-1])
+    info = {
+        'currentPrice': last,
+        'regularMarketPrice': last,
+        'trailingPE': float(rng.uniform(4, 25)),
+        'priceToBook': float(rng.uniform(0.5, 3)),
+        'dividendYield': float(rng.uniform(2, 14)),
+        'returnOnEquity': float(rng.uniform(0.02, 0.3)),
+        'trailingEps': float(eps[-4:].sum()),
+        'bookValue': float(equity[-1] / shares),
+    }
+    return info, history, dividends, income, balance
+
+
+def synthesize(base_dir=FIXTURE_DIR, n_tickers=950, seed=42, end='2026-01-02'):
+    """
+    Writes deterministic fixtures shaped like the real upstream responses.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(base_dir, exist_ok=True)
+
+    names = _synthetic_ticker_names(rng, n_tickers)
+    n = len(names)
+    df = pd.DataFrame({
+        'cotacao': rng.uniform(1, 120, n).round(2),
+        'pl': rng.normal(10, 12, n).round(2),
+        'pvp': rng.uniform(0.2, 6, n).round(2),
+        'psr': rng.uniform(0.1, 8, n).round(3),
+        'dy': rng.uniform(0, 0.16, n).round(4),
+        'pa': rng.uniform(0.05, 3, n).round(3),
+        'pcg': rng.normal(5, 20, n).round(2),
+        'pebit': rng.normal(8, 10, n).round(2),
+        'pacl': rng.normal(-1, 3, n).round(2),
+        'evebit': rng.normal(9, 10, n).round(2),
+        'evebitda': rng.normal(6, 8, n).round(2),
+        'mrgebit': rng.normal(0.15, 0.2, n).round(4),
+        'mrgliq': rng.normal(0.1, 0.2, n).round(4),
+        'roic': rng.normal(0.1, 0.1, n).round(4),
+        'roe': rng.normal(0.12, 0.15, n).round(4),
+        'liqc': rng.uniform(0, 4, n).round(2),
+        'liq2m': rng.uniform(0, 5e8, n).round(0),
+        'patrliq': rng.uniform(1e7, 4e11, n).round(0),
+        'divbpatr': rng.uniform(0, 3, n).round(2),
+        'c5y': rng.normal(0.1, 0.2, n).round(4),
+    }, index=pd.Index(names, name='papel'))
+    df.to_csv(os.path.join(base_dir, 'fundamentus_resultado.csv'))
+
+    for t in PORTFOLIO_STOCKS:
+        _write_yahoo(base_dir, t, *_synthetic_yahoo(rng, t, end))
+    for t in PORTFOLIO_FIIS:
+        _write_yahoo(base_dir, t, *_synthetic_yahoo(rng, t, end, fii=True))
+    _write_yahoo(base_dir, BENCHMARK, *_synthetic_yahoo(rng, BENCHMARK, end, fii=True))
+    print(f"Synthetic fixtures written to {base_dir}")
+
+
+YAHOO_FILES = {
+    'info': 'info.json',
+    'history': 'history.csv',
+    'dividends': 'dividends.csv',
+    'quarterly_income_stmt': 'quarterly_income_stmt.csv',
+    'quarterly_balance_sheet': 'quarterly_balance_sheet.csv',
+}
+
+
+def parse_yahoo(key, buffer):
+    """
+    Parses one Yahoo fixture file (path or file-like) back into the object yfinance returns.
+    """
+    if key == 'info':
+        if hasattr(buffer, 'read'):
+            return json.load(buffer)
+        with open(buffer) as f:
+            return json.load(f)
+
+    df = pd.read_csv(buffer, index_col=0)
+    if key.startswith('quarterly_'):
+        df.columns = pd.to_datetime(df.columns)
+        return df
+    if not df.empty:
+        df.index = pd.to_datetime(df.index, utc=True).tz_convert(TZ)
+    if key == 'dividends':
+        return df['Dividends'] if not df.empty else pd.Series(dtype=float)
+    return df
+
+
+def digest(base_dir=FIXTURE_DIR):
+    """
+    Short hash of every fixture file (paths and contents): equal for the
+    synthesized set on every machine, different for recorded ones.
+    """
+    sha = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(base_dir)):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            sha.update(os.path.relpath(path, base_dir).replace(os.sep, '/').encode())
+            with open(path, 'rb') as f:
+                sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+
+def load_fixtures(base_dir=FIXTURE_DIR):
+    """
+    Loads fixtures into memory, synthesizing them first if the directory is empty.
+    Returns {'resultado': DataFrame, 'yahoo': {ticker: {key: value}}}.
+    """
+    if not has_fixtures(base_dir):
+        synthesize(base_dir)
+
+    resultado = pd.read_csv(os.path.join(base_dir, 'fundamentus_resultado.csv'), index_col='papel')
+    yahoo = {}
+    yahoo_root = os.path.join(base_dir, 'yahoo')
+    for t in sorted(os.listdir(yahoo_root)) if os.path.isdir(yahoo_root) else []:
+        yahoo[t] = {}
+        for key, filename in YAHOO_FILES.items():
+            path = os.path.join(_yahoo_dir(base_dir, t), filename)
+            if os.path.exists(path):
+                yahoo[t][key] = parse_yahoo(key, path)
+    return {'resultado': resultado, 'yahoo': yahoo}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create benchmark fixtures")
+    parser.add_argument('--record', action='store_true', help="record live Fundamentus/Yahoo responses")
+    parser.add_argument('--dir', default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    if args.record:
+        record(base_dir=args.dir)
+    else:
+        synthesize(base_dir=args.dir)
@@ -0,0 +1,75 @@
+"""
+Speedup of building historical indicators in core's process pool.
+
+    python -m benchmarks.indicator_pool --tickers 400 --workers 1 2 4 8
+
+Inputs (price dates, quarterly statements, dividends) are taken from the
+fixtures and reused across tickers, so only the CPU-bound part
+(core.build_indicators) is timed. Worker start-up is excluded: the pool is
+warmed before timing, as it is in a long-running server.
+
+The pool is off by default; set INDICATOR_WORKERS (and, from the smallest
+--tickers that still shows a speedup, INDICATOR_POOL_MIN_TICKERS) from this
+output on the production host.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+
+import core
+from benchmarks.fixtures import PORTFOLIO_STOCKS, load_fixtures
+from benchmarks.replay import replay
+
+
+def build_inputs(n_tickers):
+    with replay(load_fixtures()):
+        base = [core.fetch_financial_inputs(t) for t in PORTFOLIO_STOCKS]
+    base = [args for args in base if args is not None]
+    return {f"T{i:04d}3": base[i % len(base)] for i in range(n_tickers)}
+
+
+def time_build(inputs, workers, repeat):
+    if workers > 1:
+        core.build_indicators_many(dict(list(inputs.items())[:workers * 2]), workers)  # warm the pool
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = core.build_indicators_many(inputs, workers)
+        timings.append(time.perf_counter() - start)
+    return min(timings), results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indicator build speedup with the process pool")
+    parser.add_argument('--tickers', type=int, default=400)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if core.SERVERLESS:
+        print("Serverless mode: the pool is disabled, every run is in-process.")
+    # Time the pool at every size asked for, whatever the configured threshold
+    core.INDICATOR_POOL_MIN_TICKERS = 0
+    inputs = build_inputs(args.tickers)
+    print(f"{len(inputs)} tickers, {os.cpu_count()} CPUs available")
+
+    baseline, expected = time_build(inputs, 1, args.repeat)
+    print(f"{'workers':>7} {'seconds':>9} {'speedup':>8}")
+    print(f"{1:>7} {baseline:>9.3f} {1.0:>7.2f}x")
+    for workers in [w for w in args.workers if w > 1]:
+        elapsed, results = time_build(inputs, workers, args.repeat)
+        for t, df in expected.items():
+            assert np.allclose(df.to_numpy(), results[t][df.columns].to_numpy(), equal_nan=True), t
+        print(f"{workers:>7} {elapsed:>9.3f} {baseline / elapsed:>7.2f}x")
+        core.shutdown_indicator_executor()
+
+
+if __name__ == "__main__":
+    main()
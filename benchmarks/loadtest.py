@@ -0,0 +1,230 @@
+"""
+Load-test harness for api/index.py.
+
+Drives a realistic mix of dashboard sessions (portfolio loads, history charts,
+uploads) with N concurrent virtual users and reports throughput, p50/p95/p99
+latency and upstream call amplification measured at the fake upstream.
+
+    # everything local: spawns the fake upstream and the API, steps through user counts
+    python -m benchmarks.loadtest --spawn --users 1,5,10,25,50 --duration 20
+
+    # against an already running instance (see benchmarks.serve_offline)
+    python -m benchmarks.loadtest --url http://127.0.0.1:8001 --upstream http://127.0.0.1:9001
+
+A level "fails" when its error rate exceeds --max-error-rate or its p95 exceeds
+--p95-slo-ms; the report prints the highest level that passed.
+Requires httpx.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fixtures import PORTFOLIO, PORTFOLIO_STOCKS
+
+INDICATORS = ['Preço Atual', 'Preço Justo (Graham)', 'Preço Teto (6%)']
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client, label, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            res = await client.request(method, url, **kwargs)
+            ok = res.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        self.samples[label].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[label] += 1
+
+
+async def portfolio_load(client, rec):
+    await rec.request(client, 'GET /api/portfolios', 'GET', '/api/portfolios')
+    tickers = random.sample(PORTFOLIO, random.randint(4, len(PORTFOLIO)))
+    await rec.request(client, 'GET /api/tickers', 'GET', '/api/tickers', params={'tickers': ','.join(tickers)})
+
+
+async def history_chart(client, rec):
+    ticker = random.choice(PORTFOLIO_STOCKS)
+    await rec.request(client, 'GET /api/history', 'GET', f'/api/history/{ticker}',
+                      params={'indicator': random.choice(INDICATORS), 'indicator_value': 10})
+
+
+async def upload(client, rec):
+    tickers = random.sample(PORTFOLIO, random.randint(3, 8))
+    body = "Ativo;Quantidade\n" + "\n".join(f"{t};{random.randint(1, 500)}" for t in tickers)
+    await rec.request(client, 'POST /api/upload', 'POST', '/api/upload',
+                      files={'file': ('carteira.csv', body.encode(), 'text/csv')})
+
+
+SCENARIOS = {'portfolio': portfolio_load, 'history': history_chart, 'upload': upload}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}'. Use: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+async def virtual_user(client, rec, mix, deadline, think):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        await SCENARIOS[random.choices(names, weights)[0]](client, rec)
+        if think:
+            await asyncio.sleep(random.uniform(0, 2 * think))
+
+
+async def upstream_stats(upstream):
+    if not upstream:
+        return None
+    async with httpx.AsyncClient(base_url=upstream) as client:
+        res = await client.get('/__stats')
+        return res.json()
+
+
+async def run_level(url, upstream, users, duration, mix, think, timeout):
+    rec = Recorder()
+    before = await upstream_stats(upstream)
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(virtual_user(client, rec, mix, deadline, think) for _ in range(users)))
+        elapsed = time.perf_counter() - start
+    after = await upstream_stats(upstream)
+
+    upstream_calls = None
+    if before is not None and after is not None:
+        upstream_calls = {k: v - before['calls'].get(k, 0) for k, v in after['calls'].items()}
+    return rec, elapsed, upstream_calls
+
+
+def percentiles(samples):
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return p50, p95, p99
+
+
+def report(users, rec, elapsed, upstream_calls):
+    all_samples = [s for v in rec.samples.values() for s in v]
+    total = len(all_samples)
+    errors = sum(rec.errors.values())
+    if not total:
+        print(f"\n== {users} users: no requests completed")
+        return {'users': users, 'error_rate': 1.0, 'p95': float('inf')}
+
+    p50, p95, p99 = percentiles(all_samples)
+    print(f"\n== {users} users, {elapsed:.1f}s: {total} requests, {total / elapsed:.1f} req/s, "
+          f"errors {errors} ({errors / total:.1%})")
+    print(f"   {'endpoint':<22} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, samples in sorted(rec.samples.items()):
+        e50, e95, e99 = percentiles(samples)
+        print(f"   {label:<22} {len(samples):>6} {e50:>8.1f} {e95:>8.1f} {e99:>8.1f} {rec.errors[label]:>7}")
+    print(f"   {'all':<22} {total:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {errors:>7}")
+
+    if upstream_calls is not None:
+        n_upstream = sum(upstream_calls.values())
+        detail = ', '.join(f"{k}={v}" for k, v in sorted(upstream_calls.items()) if v)
+        print(f"   upstream: {n_upstream} calls, amplification {n_upstream / total:.2f} per request ({detail})")
+
+    return {'users': users, 'error_rate': errors / total, 'p95': p95}
+
+
+def _wait_for(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=2)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.3)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+def spawn(args):
+    """
+    Starts the fake upstream and the API as subprocesses. Returns the processes.
+    """
+    upstream = [sys.executable, '-m', 'benchmarks.fake_upstream', '--port', str(args.upstream_port),
+                '--latency-ms', str(args.latency_ms), '--error-rate', str(args.error_rate)]
+    api = [sys.executable, '-m', 'benchmarks.serve_offline', '--port', str(args.api_port),
+           '--upstream', f'http://127.0.0.1:{args.upstream_port}']
+    procs = [subprocess.Popen(upstream, cwd=ROOT_DIR)]
+    _wait_for(f'http://127.0.0.1:{args.upstream_port}/__stats')
+    procs.append(subprocess.Popen(api, cwd=ROOT_DIR))
+    _wait_for(f'http://127.0.0.1:{args.api_port}/api/portfolios')
+    args.url = f'http://127.0.0.1:{args.api_port}'
+    args.upstream = f'http://127.0.0.1:{args.upstream_port}'
+    return procs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for the dashboard API")
+    parser.add_argument('--url', default='http://127.0.0.1:8001', help="API base URL")
+    parser.add_argument('--upstream', default='http://127.0.0.1:9001',
+                        help="fake upstream base URL, for amplification stats ('' to skip)")
+    parser.add_argument('--users', default='1,5,10,25', help="comma separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=20, help="seconds per level")
+    parser.add_argument('--mix', default='portfolio=6,history=3,upload=1')
+    parser.add_argument('--think-ms', type=float, default=0, help="mean pause between scenarios")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--max-error-rate', type=float, default=0.05)
+    parser.add_argument('--p95-slo-ms', type=float, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    spawn_group = parser.add_argument_group('spawn', "start a fake upstream and API locally")
+    spawn_group.add_argument('--spawn', action='store_true')
+    spawn_group.add_argument('--api-port', type=int, default=8001)
+    spawn_group.add_argument('--upstream-port', type=int, default=9001)
+    spawn_group.add_argument('--latency-ms', type=float, default=100)
+    spawn_group.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+    levels = [int(u) for u in args.users.split(',')]
+    procs = spawn(args) if args.spawn else []
+
+    try:
+        results = []
+        for users in levels:
+            rec, elapsed, upstream_calls = asyncio.run(
+                run_level(args.url, args.upstream, users, args.duration, mix, args.think_ms / 1000, args.timeout))
+            results.append(report(users, rec, elapsed, upstream_calls))
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+
+    passed = [r for r in results if r['error_rate'] <= args.max_error_rate and r['p95'] <= args.p95_slo_ms]
+    failed = [r for r in results if r not in passed]
+    print()
+    if passed:
+        print(f"Highest passing level: {max(r['users'] for r in passed)} concurrent users "
+              f"(SLO p95 <= {args.p95_slo_ms:.0f} ms, errors <= {args.max_error_rate:.0%})")
+    if failed:
+        first = min(failed, key=lambda r: r['users'])
+        print(f"First failing level: {first['users']} users "
+              f"(p95 {first['p95']:.0f} ms, errors {first['error_rate']:.1%})")
+    return 1 if not passed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
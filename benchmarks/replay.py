@@ -0,0 +1,147 @@
+"""
+Replays fixture data in place of the Fundamentus and Yahoo clients.
+
+Usage:
+    with replay(load_fixtures()) as calls:
+        core.get_market_data(['PETR4'])
+    print(calls)   # upstream calls that would have been made
+
+`patch_upstream` is the generic form used by the load-test server, where the
+data comes from the fake upstream over HTTP instead of memory.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import pandas as pd
+import yfinance as yf
+
+import core
+
+EMPTY = {
+    'info': dict,
+    'history': pd.DataFrame,
+    'dividends': lambda: pd.Series(dtype=float),
+    'quarterly_income_stmt': pd.DataFrame,
+    'quarterly_balance_sheet': pd.DataFrame,
+}
+
+
+class ReplayTicker:
+    """
+    Minimal stand-in for yf.Ticker. `source(ticker, key)` returns the stored
+    response for that ticker/attribute or None.
+    """
+    def __init__(self, symbol, source, calls):
+        self.ticker = symbol.upper()
+        self._source = source
+        self._calls = calls
+
+    def _get(self, key):
+        self._calls[f"yahoo.{key}"] += 1
+        value = self._source(self.ticker.replace('.SA', ''), key)
+        if value is None:
+            return EMPTY[key]()
+        return value
+
+    @property
+    def info(self):
+        return self._get('info')
+
+    def history(self, period="5y", interval="1d", **kwargs):
+        return self._get('history')
+
+    @property
+    def dividends(self):
+        return self._get('dividends')
+
+    @property
+    def quarterly_income_stmt(self):
+        return self._get('quarterly_income_stmt')
+
+    @property
+    def quarterly_balance_sheet(self):
+        return self._get('quarterly_balance_sheet')
+
+
+@contextmanager
+def patch_upstream(get_resultado, source):
+    """
+    Patches `core.fundamentus.get_resultado`, `yf.Ticker` and `yf.download`.
+    Yields a Counter of upstream calls.
+    """
+    calls = Counter()
+
+    def counted_resultado():
+        calls['fundamentus.get_resultado'] += 1
+        return get_resultado()
+
+    def download(symbols, *args, **kwargs):
+        # Batched history as yf.download(group_by='ticker') returns it
+        calls['yahoo.download'] += 1
+        symbols = [symbols] if isinstance(symbols, str) else symbols
+        frames = {}
+        for symbol in symbols:
+            hist = source(symbol.replace('.SA', ''), 'history')
+            if hist is not None and not hist.empty:
+                frames[symbol] = hist
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+    original_resultado = core.fundamentus.get_resultado
+    original_ticker = yf.Ticker
+    original_download = yf.download
+    core.fundamentus.get_resultado = counted_resultado
+    yf.Ticker = lambda symbol, *args, **kwargs: ReplayTicker(symbol, source, calls)
+    yf.download = download
+    try:
+        yield calls
+    finally:
+        core.fundamentus.get_resultado = original_resultado
+        yf.Ticker = original_ticker
+        yf.download = original_download
+
+
+class ReplayMetadataUpstream:
+    """
+    Stand-in for metadata.FundamentusUpstream: spreads `tickers` over `n_sectors`
+    sectors (three segments each) by company root, sleeping `latency` seconds
+    per page to mimic the site. Counts pages in `calls`.
+    """
+    def __init__(self, tickers, n_sectors=40, latency=0.0):
+        self.n_sectors = n_sectors
+        self.latency = latency
+        self.calls = Counter()
+        self._sector_of = {t: sum(t[:4].encode()) % n_sectors + 1 for t in tickers}
+
+    def _page(self, kind):
+        self.calls[f"fundamentus.{kind}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def sectors(self):
+        return {i: f"Setor {i}" for i in range(1, self.n_sectors + 1)}
+
+    def sector_tickers(self, sector_id):
+        self._page('list_papel_setor')
+        return [t for t, s in self._sector_of.items() if s == sector_id]
+
+    def details(self, ticker):
+        self._page('get_papel')
+        sector = self._sector_of.get(ticker)
+        if sector is None:
+            return None
+        return {'setor': f"Setor {sector}", 'segmento': f"Segmento {sector}.{ord(ticker[3]) % 3 + 1}"}
+
+
+def fixture_source(fixtures):
+    def source(ticker, key):
+        value = fixtures['yahoo'].get(ticker, {}).get(key)
+        return value.copy() if value is not None else None
+    return source
+
+
+def replay(fixtures):
+    """
+    Serves `fixtures` (see benchmarks.fixtures.load_fixtures) from memory.
+    """
+    return patch_upstream(lambda: fixtures['resultado'].copy(), fixture_source(fixtures))
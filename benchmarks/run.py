@@ -0,0 +1,274 @@
+"""
+Benchmark suite for the request pipeline, replaying offline fixtures.
+
+    python -m benchmarks.run                      # run and print timings
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --tolerance 0.25
+    python -m benchmarks.run --compare benchmarks/baseline.json --calls-only
+
+With --compare the exit code is 1 when any case makes more upstream calls than
+the baseline, or its median is slower by more than the tolerance, so it can
+gate CI. Upstream calls don't depend on the machine; timings do, so
+--calls-only gates on calls alone (CI runners, other machines).
+
+The fixtures (benchmarks/fixtures.py) are synthesized on first run and not
+committed. benchmarks/baseline.json is, measured on the synthesized set; its
+fixture digest must match the local one for a comparison to run.
+Route cases go through the FastAPI TestClient (requires httpx).
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+import runtime
+
+# Fixture data stays out of the data directory; no background refreshes or
+# quote poller running during the timings
+runtime.isolate(os.path.join(tempfile.gettempdir(), 'benchmark_data'))
+
+import numpy as np
+import pandas as pd
+
+import alerts
+import analytics
+import core
+import dividends
+import intraday
+import metadata
+import reports
+import universe
+from benchmarks.fixtures import PORTFOLIO, PORTFOLIO_FIIS, PORTFOLIO_STOCKS, digest, load_fixtures
+from benchmarks.replay import ReplayMetadataUpstream, replay
+
+runtime.install()
+
+
+def _sample_text(fixtures, repeat=200):
+    # CSV export from a broker: tickers mixed with dates, quantities and prices
+    lines = ["Data;Ativo;Quantidade;Preco"]
+    for i, t in enumerate(fixtures['resultado'].index[:repeat]):
+        lines.append(f"2025-0{i % 9 + 1}-1{i % 9};{t};{i * 10};{i * 1.5:.2f}")
+    return "\n".join(lines)
+
+
+def build_cases(fixtures):
+    """
+    Returns a list of (name, callable) benchmark cases.
+    """
+    from fastapi.testclient import TestClient
+    import api.index
+
+    client = TestClient(api.index.app)
+    dividends.refresh(PORTFOLIO, max_age=0)
+    metadata.set_upstream(ReplayMetadataUpstream(fixtures['resultado'].index))
+    metadata.refresh()
+    ticker = PORTFOLIO_STOCKS[0]
+    market = core.get_market_data()
+    portfolio_df = core.get_market_data(PORTFOLIO)
+    portfolio_df = portfolio_df[portfolio_df.index.isin(PORTFOLIO)]
+    text = _sample_text(fixtures)
+    sheet = pd.DataFrame([line.split(';') for line in text.splitlines()])
+    csv_bytes = text.encode('utf-8')
+    tickers_param = ','.join(PORTFOLIO)
+
+    def cold(fn):
+        def call():
+            core.invalidate_market_snapshot()
+            return fn()
+        return call
+
+    def risk_cold():
+        core.clear_price_history()
+        analytics._risk_cache.clear()
+        return analytics.portfolio_risk('benchmark', PORTFOLIO)
+
+    rng = np.random.default_rng(0)
+    wide = pd.DataFrame(np.exp(np.cumsum(rng.normal(0, 0.02, (1260, 101)), axis=0)),
+                        index=pd.bdate_range(end='2026-01-02', periods=1260),
+                        columns=[f"T{i:03d}3" for i in range(100)] + [analytics.BENCHMARK])
+
+    report_dir = tempfile.mkdtemp(prefix='benchmark_reports_')
+    report_portfolios = {'dividendos': PORTFOLIO_STOCKS[:6] + PORTFOLIO_FIIS, 'crescimento': PORTFOLIO_STOCKS[4:]}
+
+    def export(fmt):
+        def call():
+            core.clear_price_history()
+            return reports.export_reports(os.path.join(report_dir, fmt), fmt, report_portfolios)
+        return call
+
+    def route(method, url, **kwargs):
+        def call():
+            res = client.request(method, url, **kwargs)
+            assert res.status_code == 200, (url, res.status_code, res.text[:200])
+            return res
+        return call
+
+    frame, _ = core.get_market_snapshot()
+    full = frame.to_frame()
+
+    events = dividends.load_events()
+    events = pd.concat([events.assign(ticker=events['ticker'] + str(i)) for i in range(75)], ignore_index=True)
+
+    # 5000 alert rules over the portfolio rows, compiled once
+    valued = core.valuation_table(portfolio_df).select_dtypes(include='number')
+    rule_columns = ['cotacao', 'dy', 'pl', 'Margem Barsi %']
+    rules = [{'id': f"r{i}", 'ticker': PORTFOLIO[i % len(PORTFOLIO)], 'column': rule_columns[i % 4],
+              'op': alerts.OPS[i % len(alerts.OPS)], 'value': float(i % 20), 'ref': None} for i in range(5000)]
+    compiled_rules = alerts.CompiledRules(rules, {}, valued.index, valued.columns)
+    valued_values = valued.to_numpy(dtype=np.float64)
+
+    # A full session of minute bars for 256 tickers, then one poll's worth of quotes
+    session = intraday.IntradayStore()
+    names = [f"T{i:03d}3" for i in range(session.max_tickers)]
+    for minute in range(session.capacity):
+        session.record({t: 10 + (minute + i) % 7 for i, t in enumerate(names)}, at=minute * 60)
+    poll = {t: 11.5 for t in names}
+    intraday.store.record(core.fetch_quotes(PORTFOLIO_STOCKS))
+
+    etag = client.get(f'/api/tickers?tickers={tickers_param}').headers['ETag']
+
+    return [
+        ('get_market_data[cold]', cold(lambda: core.get_market_data())),
+        ('get_market_data[all]', lambda: core.get_market_data()),
+        ('get_market_data[portfolio]', lambda: core.get_market_data(PORTFOLIO)),
+        ('market_frame.take[portfolio]', lambda: frame.take(PORTFOLIO)),
+        ('isin+copy[portfolio]', lambda: full[full.index.isin(PORTFOLIO)].copy()),
+        ('valuation_indicators[portfolio]', lambda: core.valuation_indicators(portfolio_df)),
+        ('dividends.project[all]', lambda: dividends.project(events)),
+        ('intraday.record[256 tickers]', lambda: session.record(poll)),
+        ('alerts.find_events[5000 rules]', lambda: alerts.find_events(compiled_rules, valued_values)),
+        ('metadata.sector_aggregates[all]', lambda: metadata.sector_aggregates(full, metadata.load_table())),
+        ('valuation_indicators[all]', lambda: core.valuation_indicators(market)),
+        ('get_historical_financials', lambda: core.get_historical_financials(ticker)),
+        ('portfolio_risk[cold]', risk_cold),
+        ('risk_report[100 assets]', lambda: analytics.risk_report(wide, list(wide.columns[:100]))),
+        ('optimize_report[50 assets]', lambda: analytics.optimize_report(wide, list(wide.columns[:50]))),
+        ('ticker_index.search', lambda: universe.get_index().search('PE')),
+        ('universe.resolve[typos]', lambda: universe.resolve(['PETR44', 'VAEL3', 'ITUB4'])),
+        ('export_reports[parquet]', export('parquet')),
+        ('export_reports[xlsx]', export('xlsx')),
+        ('extrair_tickers_texto', lambda: core.extrair_tickers_texto(text)),
+        ('extrair_tickers_planilha', lambda: core.extrair_tickers_planilha(sheet)),
+        ('GET /api/tickers[portfolio]', route('GET', f'/api/tickers?tickers={tickers_param}')),
+        ('GET /api/tickers[all]', route('GET', '/api/tickers')),
+        ('GET /api/tickers[304]', lambda: client.get(f'/api/tickers?tickers={tickers_param}',
+                                                     headers={'If-None-Match': etag})),
+        ('GET /api/tickers/search', route('GET', '/api/tickers/search?q=PE')),
+        ('GET /api/sectors', route('GET', '/api/sectors')),
+        ('GET /api/history[cold]', lambda: (core.clear_price_history(),
+                                             route('GET', f'/api/history/{ticker}')())),
+        ('GET /api/history', route('GET', f'/api/history/{ticker}')),
+        ('GET /api/history[graham]', route('GET', f'/api/history/{ticker}',
+                                            params={'indicator': 'Preço Justo (Graham)', 'indicator_value': 10})),
+        ('GET /api/history[intraday]', route('GET', f'/api/history/{ticker}', params={'mode': 'intraday'})),
+        ('POST /api/upload[csv]', route('POST', '/api/upload',
+                                        files={'file': ('carteira.csv', csv_bytes, 'text/csv')})),
+    ]
+
+
+def time_case(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'repeat': repeat,
+    }
+
+
+def compare(results, baseline, tolerance, calls_only=False):
+    """
+    Returns the list of case names making more upstream calls than the
+    baseline cases, or (unless `calls_only`) slower than baseline * (1 + tolerance).
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = stats['median'] / base['median'] if base['median'] else float('inf')
+        stats['vs_baseline'] = ratio
+        more_calls = stats['repeat'] == base['repeat'] and stats['upstream_calls'] > base['upstream_calls'] + 1e-9
+        if more_calls or (not calls_only and ratio > 1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the dashboard pipeline")
+    parser.add_argument('--repeat', type=int, help="timed runs per case (default 5, or the baseline's)")
+    parser.add_argument('--only', help="run only cases whose name contains this text")
+    parser.add_argument('--save', metavar='PATH', help="write results as a baseline file")
+    parser.add_argument('--compare', metavar='PATH', help="compare against a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown vs baseline median (0.25 = 25%%)")
+    parser.add_argument('--calls-only', action='store_true',
+                        help="compare upstream calls only, not timings")
+    args = parser.parse_args(argv)
+
+    # TestClient logs every request through httpx
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    fixtures = load_fixtures()
+    fixture_digest = digest()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('fixtures') != fixture_digest:
+            print(f"{args.compare} was measured on other fixtures ({baseline.get('fixtures')}, "
+                  f"local {fixture_digest}): remove benchmarks/fixtures/ to synthesize the standard set.")
+            return 2
+    # Upstream calls are averaged over the runs: only comparable for the same count
+    repeat = args.repeat or (baseline or {}).get('repeat') or 5
+
+    results = {}
+    with replay(fixtures) as calls:
+        for name, fn in build_cases(fixtures):
+            if args.only and args.only not in name:
+                continue
+            calls.clear()
+            results[name] = time_case(fn, repeat)
+            results[name]['upstream_calls'] = sum(calls.values()) / (repeat + 1)
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline['cases'], args.tolerance, args.calls_only)
+
+    print(f"{'case':<34} {'median ms':>10} {'min ms':>10} {'upstream':>9} {'vs base':>8}")
+    for name, stats in results.items():
+        ratio = f"{stats['vs_baseline']:.2f}x" if 'vs_baseline' in stats else '-'
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f"{name:<34} {stats['median'] * 1000:>10.2f} {stats['min'] * 1000:>10.2f} "
+              f"{stats['upstream_calls']:>9.1f} {ratio:>8}{flag}")
+
+    with replay(fixtures):
+        frame, _ = core.get_market_snapshot()
+        original = core._normalize_resultado(fixtures['resultado'].copy())
+        print(f"\nMarket frame: {len(frame)} rows, {frame.memory_usage() / 1024:.0f} KB "
+              f"vs {original.memory_usage(deep=True).sum() / 1024:.0f} KB as a normalized DataFrame")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'fixtures': fixture_digest, 'repeat': repeat, 'cases': results}, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Runs api/index.py with its Fundamentus/Yahoo clients pointed at the fake upstream.
+
+    python -m benchmarks.serve_offline --upstream http://127.0.0.1:9001 --port 8001
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+import runtime
+
+# The fake upstream has no sector pages or dividends: nothing is refreshed in
+# the background, and fixture data stays out of the data directory
+runtime.isolate(os.path.join(tempfile.gettempdir(), 'benchmark_data'))
+
+import uvicorn
+
+from benchmarks.fake_upstream import remote_clients
+from benchmarks.replay import patch_upstream
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dashboard API backed by the fake upstream")
+    parser.add_argument('--upstream', default='http://127.0.0.1:9001')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args(argv)
+
+    import api.index
+
+    with patch_upstream(*remote_clients(args.upstream)):
+        uvicorn.run(api.index.app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
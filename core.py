@@ -14,6 +14,12 @@ import re
 import numpy as np
 import json
 import os
+import atexit
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOCAL_PORTFOLIO_FILE = os.path.join(BASE_DIR, 'portfolios.json')
@@ -43,92 +49,379 @@ except (OSError, IOError, PermissionError):
         except Exception:
             pass
 
+HISTORY_TTL = 6 * 3600  # daily bars, refreshed a few times a day
+
+_history_lock = threading.Lock()
+_history_cache = {}  # yahoo symbol -> (loaded_at, DataFrame)
+
+def _yahoo_symbol(ticker):
+    # Indexes (^BVSP) are used as-is, B3 tickers get the .SA suffix
+    return ticker if ticker.startswith('^') else f"{ticker}.SA"
+
+def _cached_history(symbol):
+    with _history_lock:
+        cached = _history_cache.get(symbol)
+    if cached and time.time() - cached[0] < HISTORY_TTL:
+        return cached[1]
+    return None
+
+def _store_history(symbol, hist):
+    with _history_lock:
+        _history_cache[symbol] = (time.time(), hist)
+
+def get_price_history(ticker):
+    """
+    5 years of daily bars for `ticker`, as returned by yf.Ticker(...).history.
+    Shared by the chart, the historical indicators and the analytics; cached for HISTORY_TTL.
+    """
+    symbol = _yahoo_symbol(ticker)
+    hist = _cached_history(symbol)
+    if hist is None:
+        hist = yf.Ticker(symbol).history(period="5y")
+        if not hist.empty:
+            _store_history(symbol, hist)
+    return hist
+
+def history_expires_in(ticker):
+    """
+    Seconds until the stored history of `ticker` is due for a refresh (0 if not stored).
+    """
+    with _history_lock:
+        cached = _history_cache.get(_yahoo_symbol(ticker))
+    if not cached:
+        return 0
+    return max(0, int(HISTORY_TTL - (time.time() - cached[0])))
+
+def history_loaded_at(tickers):
+    """
+    When the stored history of each ticker was loaded, in order (None where it
+    is missing or due for a refresh): changes whenever get_price_matrix would
+    see new prices.
+    """
+    now = time.time()
+    with _history_lock:
+        cached = [_history_cache.get(_yahoo_symbol(t)) for t in tickers]
+    return tuple(c[0] if c and now - c[0] < HISTORY_TTL else None for c in cached)
+
+def clear_price_history():
+    with _history_lock:
+        _history_cache.clear()
+
+def _download_histories(tickers):
+    """
+    {ticker: 5-year daily bars} for `tickers` from a single batched yf.download
+    call; tickers without data are left out.
+    """
+    symbols = [_yahoo_symbol(t) for t in tickers]
+    try:
+        data = yf.download(symbols, period="5y", group_by='ticker', actions=True,
+                           progress=False, threads=True)
+    except Exception as e:
+        print(f"Erro ao baixar histórico de {symbols}: {e}")
+        return {}
+    if data is None or data.empty:
+        return {}
+    histories = {}
+    for t, symbol in zip(tickers, symbols):
+        if isinstance(data.columns, pd.MultiIndex):
+            if symbol not in data.columns.get_level_values(0):
+                continue
+            hist = data[symbol]
+        else:
+            hist = data
+        hist = hist.dropna(how='all')
+        if not hist.empty:
+            histories[t] = hist
+    return histories
+
+def get_price_histories(tickers, store=True):
+    """
+    {ticker: 5-year daily bars} for `tickers`: from the history store, the
+    missing ones downloaded together in one call. With store=False the downloaded
+    bars are not kept (one-off bulk reads such as the report export).
+    Tickers without data are left out.
+    """
+    histories, missing = {}, []
+    for t in tickers:
+        hist = _cached_history(_yahoo_symbol(t))
+        if hist is None:
+            missing.append(t)
+        else:
+            histories[t] = hist
+    if missing:
+        downloaded = _download_histories(missing)
+        if store:
+            for t, hist in downloaded.items():
+                _store_history(_yahoo_symbol(t), hist)
+        histories.update(downloaded)
+    return histories
+
+def get_price_matrix(tickers):
+    """
+    Aligned dates x tickers matrix of daily closes (NaN before a ticker's first bar).
+    Tickers missing from the history store are downloaded together in one call.
+    """
+    histories = get_price_histories(tickers)
+
+    closes = {}
+    for t in tickers:
+        hist = histories.get(t)
+        if hist is None or hist.empty or 'Close' not in hist.columns:
+            continue
+        close = hist['Close']
+        # Align on calendar dates: Ticker.history is tz-aware, yf.download is not
+        if close.index.tz is not None:
+            close = close.tz_localize(None)
+        close.index = close.index.normalize()
+        closes[t] = close[~close.index.duplicated(keep='last')]
+    if not closes:
+        return pd.DataFrame()
+    return pd.DataFrame(closes).sort_index()
+
+def _align_tz(index, tz):
+    # Puts a statement/dividend index in the price history's timezone
+    if index.tz is None and tz is not None:
+        return index.tz_localize(tz)
+    if index.tz is not None and tz is None:
+        return index.tz_convert(None)
+    if index.tz != tz:
+        return index.tz_convert(tz)
+    return index
+
+def fetch_financial_inputs(ticker_symbol, hist=None):
+    """
+    Network half of get_historical_financials: price dates, quarterly statements and dividends.
+    `hist` is the price history when the caller already has it.
+    Returns (dates, income_stmt, balance_sheet, dividends), or None without price history.
+    """
+    if hist is None:
+        hist = get_price_history(ticker_symbol)
+    if hist.empty:
+        return None
+    stock = yf.Ticker(f"{ticker_symbol}.SA")
+    return hist.index, stock.quarterly_income_stmt, stock.quarterly_balance_sheet, history_dividends(hist, stock)
+
+def history_dividends(hist, stock=None):
+    """
+    Dividend events (ex-date -> amount per share) from a price history.
+    Histories fetched with actions carry them in 'Dividends', so no extra call is
+    needed; otherwise they come from `stock.dividends`.
+    """
+    if 'Dividends' in hist.columns:
+        divs = hist['Dividends']
+        return divs[divs > 0].rename('Dividends')
+    if stock is None:
+        return pd.Series(dtype=float, name='Dividends')
+    return stock.dividends
+
+def build_indicators(dates, fin, bal, divs):
+    """
+    CPU half of get_historical_financials (pure pandas, no I/O): daily Graham and
+    Barsi lines over `dates` from the quarterly statements and the dividends.
+    """
+    df_indicators = pd.DataFrame(index=dates)
+
+    # Graham: Sqrt(22.5 * LPA * VPA)
+    if not fin.empty and not bal.empty:
+        # Transpose
+        fin = fin.T.sort_index()
+        bal = bal.T.sort_index()
+
+        # Extract EPS (LPA)
+        lpa_series = None
+        if "Basic EPS" in fin.columns:
+            lpa_series = fin["Basic EPS"]
+        elif "Diluted EPS" in fin.columns:
+            lpa_series = fin["Diluted EPS"]
+
+        # Extract VPA (Equity / Shares)
+        vpa_series = None
+        if "Stockholders Equity" in bal.columns and "Ordinary Shares Number" in bal.columns:
+            equity = bal["Stockholders Equity"]
+            shares = bal["Ordinary Shares Number"]
+            vpa_series = equity / shares
+
+        if lpa_series is not None and vpa_series is not None:
+            # Merge and ffill
+            fund_df = pd.concat([lpa_series.rename("LPA"), vpa_series.rename("VPA")], axis=1)
+            fund_df = fund_df.sort_index()
+            fund_df.index = _align_tz(fund_df.index, dates.tz)
+
+            combined = fund_df.reindex(dates.union(fund_df.index)).sort_index().ffill()
+            combined = combined.loc[dates]
+
+            # Graham
+            lpa_daily = combined['LPA']
+            vpa_daily = combined['VPA']
+            product = 22.5 * lpa_daily * vpa_daily
+            graham_daily = np.sqrt(product.where(product > 0, 0))
+
+            df_indicators['Preço Justo (Graham)'] = graham_daily
+
+    # Barsi: Dividends / 6%
+    if not divs.empty:
+        divs = divs.copy()
+        divs.index = _align_tz(divs.index, dates.tz)
+
+        all_days = pd.date_range(start=dates.min() - pd.Timedelta(days=365), end=dates.max(), tz=dates.tz)
+        div_daily = divs.reindex(all_days).fillna(0)
+        rolling_divs = div_daily.rolling('365D').sum()
+        rolling_divs_subset = rolling_divs.reindex(dates).ffill()
+
+        df_indicators['Preço Teto (6%)'] = rolling_divs_subset / 0.06
+
+    return df_indicators
+
 def get_historical_financials(ticker_symbol):
     """
     Attempts to fetch historical fundamentals from yfinance to build time-series for Graham and Barsi.
     Returns a DataFrame with columns: ['Preço Justo (Graham)', 'Preço Teto (6%)'] indexed by Date.
     """
     try:
-        stock = yf.Ticker(f"{ticker_symbol}.SA")
-        
-        # 1. Get Price History (for index)
-        hist = stock.history(period="5y")
-        if hist.empty:
+        inputs = fetch_financial_inputs(ticker_symbol)
+        if inputs is None:
             return pd.DataFrame()
-        
-        dates = hist.index
-        df_indicators = pd.DataFrame(index=dates)
-        
-        # 2. Graham: Sqrt(22.5 * LPA * VPA)
-        fin = stock.quarterly_income_stmt
-        bal = stock.quarterly_balance_sheet
-        
-        if not fin.empty and not bal.empty:
-            # Transpose
-            fin = fin.T.sort_index()
-            bal = bal.T.sort_index()
-            
-            # Extract EPS (LPA)
-            lpa_series = None
-            if "Basic EPS" in fin.columns:
-                lpa_series = fin["Basic EPS"]
-            elif "Diluted EPS" in fin.columns:
-                lpa_series = fin["Diluted EPS"]
-                
-            # Extract VPA (Equity / Shares)
-            vpa_series = None
-            if "Stockholders Equity" in bal.columns and "Ordinary Shares Number" in bal.columns:
-                equity = bal["Stockholders Equity"]
-                shares = bal["Ordinary Shares Number"]
-                vpa_series = equity / shares
-            
-            if lpa_series is not None and vpa_series is not None:
-                # Merge and ffill
-                fund_df = pd.concat([lpa_series.rename("LPA"), vpa_series.rename("VPA")], axis=1)
-                fund_df = fund_df.sort_index()
-                
-                # Reindex to dates.tz
-                if fund_df.index.tz is None and dates.tz is not None:
-                     fund_df.index = fund_df.index.tz_localize(dates.tz)
-                elif fund_df.index.tz is not None and dates.tz is None:
-                     fund_df.index = fund_df.index.tz_convert(None)
-                elif fund_df.index.tz != dates.tz:
-                     fund_df.index = fund_df.index.tz_convert(dates.tz)
-
-                combined = fund_df.reindex(dates.union(fund_df.index)).sort_index().ffill()
-                combined = combined.loc[dates]
-                
-                # Graham
-                lpa_daily = combined['LPA']
-                vpa_daily = combined['VPA']
-                product = 22.5 * lpa_daily * vpa_daily
-                graham_daily = np.sqrt(product.where(product > 0, 0))
-                
-                df_indicators['Preço Justo (Graham)'] = graham_daily
-        
-        # 3. Barsi: Dividends / 6%
-        divs = stock.dividends
-        if not divs.empty:
-            if divs.index.tz is None and dates.tz is not None:
-                divs.index = divs.index.tz_localize(dates.tz)
-            elif divs.index.tz is not None and dates.tz is None:
-                divs.index = divs.index.tz_convert(None)
-            elif divs.index.tz != dates.tz:
-                divs.index = divs.index.tz_convert(dates.tz)
-                
-            all_days = pd.date_range(start=dates.min() - pd.Timedelta(days=365), end=dates.max(), tz=dates.tz)
-            div_daily = divs.reindex(all_days).fillna(0)
-            rolling_divs = div_daily.rolling('365D').sum()
-            rolling_divs_subset = rolling_divs.reindex(dates).ffill()
-            
-            df_indicators['Preço Teto (6%)'] = rolling_divs_subset / 0.06
-            
-        return df_indicators
-        
+        return build_indicators(*inputs)
+
     except Exception as e:
         print(f"Error fetching historical financials for {ticker_symbol}: {e}")
         return pd.DataFrame()
 
+# Executor for CPU-bound indicator builds. Processes sidestep the GIL, but each
+# ticker's inputs are pickled to a worker: measured on one CPU, 4.8 ms per ticker
+# in-process against 9 ms through the pool. So builds are in-process unless
+# INDICATOR_WORKERS is set above 1 (after `python -m benchmarks.indicator_pool`
+# shows a speedup on the host), and even then only for batches of at least
+# INDICATOR_POOL_MIN_TICKERS, below which starting the work costs more than it saves.
+# Serverless runtimes (Vercel, Lambda) can't keep worker processes around.
+SERVERLESS = bool(os.environ.get('VERCEL') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME'))
+INDICATOR_WORKERS = int(os.environ.get('INDICATOR_WORKERS', 1))
+INDICATOR_POOL_MIN_TICKERS = int(os.environ.get('INDICATOR_POOL_MIN_TICKERS', 50))
+INDICATOR_COLUMNS = ['Preço Justo (Graham)', 'Preço Teto (6%)']
+
+_executor_lock = threading.Lock()
+_executor = {'pool': None, 'workers': 0}
+
+def get_indicator_executor(workers=None):
+    """
+    Shared process pool for build_indicators, or None when building in-process
+    (serverless, a single worker, or the pool can't be started).
+    """
+    workers = INDICATOR_WORKERS if workers is None else workers
+    if SERVERLESS or workers <= 1:
+        return None
+    with _executor_lock:
+        if _executor['pool'] is None or _executor['workers'] != workers:
+            if _executor['pool'] is not None:
+                _executor['pool'].shutdown(wait=False, cancel_futures=True)
+            try:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn: forking a process with live HTTP/uvicorn threads is unsafe
+                _executor['pool'] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+                _executor['workers'] = workers
+                atexit.register(shutdown_indicator_executor)
+            except Exception as e:
+                print(f"Erro ao iniciar processos de cálculo, usando o processo atual: {e}")
+                return None
+        return _executor['pool']
+
+def shutdown_indicator_executor():
+    atexit.unregister(shutdown_indicator_executor)
+    with _executor_lock:
+        if _executor['pool'] is not None:
+            _executor['pool'].shutdown(wait=True, cancel_futures=True)
+        _executor['pool'] = None
+        _executor['workers'] = 0
+
+def _build_into_shared(shm_name, offset, inputs):
+    """
+    Worker side: builds one ticker's indicators and writes them into rows
+    [offset, offset + len(dates)) of the shared (rows x INDICATOR_COLUMNS) float64 block.
+    Returns the indicator columns present.
+    """
+    from multiprocessing import shared_memory
+
+    df = build_indicators(*inputs)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        block = np.ndarray((offset + len(df), len(INDICATOR_COLUMNS)), dtype=np.float64, buffer=shm.buf)
+        block[offset:] = df.reindex(columns=INDICATOR_COLUMNS).to_numpy(dtype=np.float64)
+        del block
+    finally:
+        shm.close()
+    return [c for c in INDICATOR_COLUMNS if c in df.columns]
+
+def build_indicators_many(inputs, workers=None):
+    """
+    build_indicators for {ticker: inputs} (see fetch_financial_inputs), spread over
+    the process pool. Results come back through one shared-memory block sized for
+    all tickers instead of being pickled; only column names cross the pipe.
+    Batches under INDICATOR_POOL_MIN_TICKERS are built in-process.
+    Returns {ticker: DataFrame}.
+    """
+    inputs = {t: args for t, args in inputs.items() if args is not None}
+    pool = get_indicator_executor(workers) if len(inputs) >= max(INDICATOR_POOL_MIN_TICKERS, 2) else None
+    if pool is None:
+        results = {}
+        for t, args in inputs.items():
+            try:
+                results[t] = build_indicators(*args)
+            except Exception as e:
+                print(f"Error building historical financials for {t}: {e}")
+                results[t] = pd.DataFrame()
+        return results
+
+    from multiprocessing import shared_memory
+
+    offsets, total = {}, 0
+    for t, args in inputs.items():
+        offsets[t] = total
+        total += len(args[0])
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * len(INDICATOR_COLUMNS) * 8)
+    try:
+        futures = {t: pool.submit(_build_into_shared, shm.name, offsets[t], args) for t, args in inputs.items()}
+        block = np.ndarray((total, len(INDICATOR_COLUMNS)), dtype=np.float64, buffer=shm.buf)
+        results = {}
+        for t, future in futures.items():
+            dates = inputs[t][0]
+            try:
+                columns = future.result()
+            except Exception as e:
+                print(f"Error building historical financials for {t}: {e}")
+                results[t] = pd.DataFrame()
+                continue
+            values = block[offsets[t]:offsets[t] + len(dates), [INDICATOR_COLUMNS.index(c) for c in columns]]
+            results[t] = pd.DataFrame(values, index=dates, columns=columns)
+        del block
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+def get_historical_financials_many(tickers, workers=None, fetch_workers=8, histories=None):
+    """
+    get_historical_financials for many tickers: inputs are fetched in a thread
+    pool (network), indicators are built by build_indicators_many (CPU).
+    `histories` ({ticker: price history}) skips the history store for the tickers it has.
+    Returns {ticker: DataFrame}; tickers without history map to an empty frame.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    histories = histories or {}
+
+    def fetch(t):
+        try:
+            return fetch_financial_inputs(t, histories.get(t))
+        except Exception as e:
+            print(f"Error fetching historical financials for {t}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+        inputs = dict(zip(tickers, pool.map(fetch, tickers)))
+    results = build_indicators_many(inputs, workers)
+    return {t: results.get(t, pd.DataFrame()) for t in tickers}
+
 def fetch_yf_data(tickers):
     """
     Fetches market data for a list of tickers using yfinance.
@@ -159,7 +452,7 @@ def fetch_yf_data(tickers):
             
             # Normalize to match fundamentus scale if needed (dy is 0.12 for 12% in YF usually)
             # Fundamentus often returns percentages as decimals too, but let's verify usage.
-            # In calcular_valuation: dividendos_estimados = dy * cotacao. 
+            # In valuation_indicators: dividendos_estimados = dy * cotacao. 
             # If YF dy is 0.08 (8%), then 0.08 * 100 = 8. Correct.
             
             record = {
@@ -186,66 +479,402 @@ def fetch_yf_data(tickers):
     df = df.set_index('papel')
     return df
 
+def fetch_quotes(tickers):
+    """
+    Fetches the current price of each ticker from yfinance.
+    Returns {ticker: price} for the tickers that have one.
+    """
+    quotes = {}
+    for t in tickers:
+        try:
+            info = yf.Ticker(f"{t}.SA").info
+            price = info.get('currentPrice') or info.get('regularMarketPrice')
+            if price:
+                quotes[t] = float(price)
+        except Exception:
+            pass
+    return quotes
+
+_quote_source = {'fetch': fetch_quotes, 'record': None}
+
+def set_quote_source(source, record=None):
+    """
+    Replaces the function get_market_data takes current prices from
+    (`source(tickers)` -> {ticker: price}, fetch_quotes by default) and returns
+    the previous one. `record({ticker: price})`, when given, is handed the
+    prices seen in rows fetched from Yahoo, so the source doesn't fetch them again.
+    """
+    previous, _quote_source['fetch'] = _quote_source['fetch'], source
+    _quote_source['record'] = record
+    return previous
+
+YAHOO_ROWS_TTL = 3600  # fundamentals of tickers outside Fundamentus, like the snapshot
+
+_yahoo_rows_lock = threading.Lock()
+_yahoo_rows = {}  # ticker -> (loaded_at, one-row DataFrame)
+
+def yahoo_rows(tickers):
+    """
+    Market rows of tickers outside Fundamentus (fetch_yf_data), cached for
+    YAHOO_ROWS_TTL. Returns (rows, fetched): `fetched` are the tickers just
+    downloaded, whose 'cotacao' is current.
+    """
+    now = time.time()
+    with _yahoo_rows_lock:
+        cached = {t: _yahoo_rows.get(t) for t in tickers}
+    fetched = [t for t, entry in cached.items() if entry is None or now - entry[0] >= YAHOO_ROWS_TTL]
+    if fetched:
+        print(f"Fetching missing tickers from YF: {fetched}")
+        df_yf = fetch_yf_data(fetched)
+        if not df_yf.empty:
+            rows = MarketFrame.from_frame(df_yf, 'yahoo').to_frame()
+            with _yahoo_rows_lock:
+                for t in rows.index:
+                    cached[t] = _yahoo_rows[t] = (now, rows.loc[[t]])
+    parts = [entry[1] for entry in cached.values() if entry is not None]
+    rows = pd.concat(parts, axis=0) if parts else pd.DataFrame()
+    return rows, [t for t in fetched if t in rows.index]
+
+SNAPSHOT_TTL = 3600  # seconds, same as the HTTP cache
+
+_snapshot_lock = threading.Lock()
+_snapshot = {'frame': None, 'loaded_at': 0.0}
+_snapshot_listeners = []
+
+def _normalize_resultado(df):
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    rename_map = {
+        'evebitda': 'ev_ebitda',
+        'roe': 'return_on_equity'
+    }
+    df = df.rename(columns=rename_map)
+
+    # Force float conversion for numeric columns
+    cols_to_float = ['cotacao', 'pl', 'pvp', 'dy', 'lpa', 'vpa', 'ev_ebitda', 'return_on_equity']
+    for col in cols_to_float:
+        if col in df.columns:
+            # If column is object type (strings), replace ',' with '.'
+            if df[col].dtype == object:
+               df[col] = df[col].astype(str).str.replace(',', '.')
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+# Fixed schema of the in-memory market table, shared by Fundamentus and Yahoo rows
+MARKET_COLUMNS = [
+    'cotacao', 'pl', 'pvp', 'psr', 'dy', 'pa', 'pcg', 'pebit', 'pacl', 'evebit', 'ev_ebitda',
+    'mrgebit', 'mrgliq', 'roic', 'return_on_equity', 'liqc', 'liq2m', 'patrliq', 'divbpatr',
+    'c5y', 'lpa', 'vpa',
+]
+MARKET_SOURCES = ['fundamentus', 'yahoo']
+# Amounts in R$ (up to ~1e12): float32 would keep only ~7 significant digits
+AMOUNT_COLUMNS = ['liq2m', 'patrliq']
+RATIO_COLUMNS = [c for c in MARKET_COLUMNS if c not in AMOUNT_COLUMNS]
+MARKET_DTYPES = {c: np.float64 if c in AMOUNT_COLUMNS else np.float32 for c in MARKET_COLUMNS}
+_RATIO_POSITIONS = [MARKET_COLUMNS.index(c) for c in RATIO_COLUMNS]
+_AMOUNT_POSITIONS = [MARKET_COLUMNS.index(c) for c in AMOUNT_COLUMNS]
+
+class MarketFrame:
+    """
+    Compact market table: a float32 matrix over the ratio columns, a float64 one
+    over the amounts (AMOUNT_COLUMNS), a categorical 'fonte' (data source) and
+    the tickers as a fixed-width bytes array, looked up through its sort order.
+    Built once per snapshot; `take` turns a ticker list into rows by index lookup.
+    """
+    def __init__(self, values, tickers, sources):
+        # `values`: rows x MARKET_COLUMNS, any float dtype
+        values = np.asarray(values, dtype=np.float64).reshape(len(tickers), len(MARKET_COLUMNS))
+        self.ratios = np.ascontiguousarray(values[:, _RATIO_POSITIONS], dtype=np.float32)
+        self.amounts = np.ascontiguousarray(values[:, _AMOUNT_POSITIONS])
+        self.keys = np.array([str(t).encode() for t in tickers], dtype=bytes)
+        self.order = np.argsort(self.keys, kind='stable')
+        self.sorted_keys = self.keys[self.order]
+        self.sources = sources
+        digest = hashlib.sha1(self.ratios.tobytes())
+        digest.update(self.amounts.tobytes())
+        digest.update(b'\n'.join(self.keys.tolist()))
+        self.version = digest.hexdigest()[:16]
+
+    @classmethod
+    def from_frame(cls, df, source):
+        """
+        Conforms a Fundamentus or Yahoo frame (indexed by ticker) to the fixed schema.
+        """
+        df = df.rename(columns={'cresc_rec_5a': 'c5y'})
+        df = df[~df.index.duplicated(keep='first')]
+        values = df.reindex(columns=MARKET_COLUMNS).apply(pd.to_numeric, errors='coerce')
+        tickers = [str(t).upper() for t in df.index]
+        sources = pd.Categorical([source] * len(tickers), categories=MARKET_SOURCES)
+        return cls(values.to_numpy(dtype=np.float64), tickers, sources)
+
+    @property
+    def tickers(self):
+        return [k.decode() for k in self.keys.tolist()]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, ticker):
+        return self.rows([ticker])[0] >= 0
+
+    def rows(self, tickers):
+        """
+        Row position of each ticker, -1 for the unknown ones.
+        """
+        if not len(self.keys):
+            return np.full(len(tickers), -1, dtype=np.intp)
+        width = self.keys.dtype.itemsize
+        encoded = [t.encode() for t in tickers]
+        # Longer symbols can't be present, and would be truncated to a match below
+        query = np.array([k if len(k) <= width else b'' for k in encoded], dtype=self.keys.dtype)
+        i = np.minimum(np.searchsorted(self.sorted_keys, query), len(self.keys) - 1)
+        found = (self.sorted_keys[i] == query) & (query != b'')
+        return np.where(found, self.order[i], -1).astype(np.intp)
+
+    def _frame(self, rows, index):
+        values = np.empty((len(rows), len(MARKET_COLUMNS)))
+        values[:, _RATIO_POSITIONS] = self.ratios[rows]
+        values[:, _AMOUNT_POSITIONS] = self.amounts[rows]
+        return pd.DataFrame(values, columns=MARKET_COLUMNS, index=index)
+
+    def take(self, tickers):
+        """
+        Rows for `tickers` (unknown ones skipped) as a float64 DataFrame indexed by 'papel'.
+        Ratios keep float32 precision; table_records rounds them for output.
+        The data source stays in the frame; see `source_of`.
+        """
+        wanted = list(dict.fromkeys(tickers))
+        rows = self.rows(wanted)
+        keep = rows >= 0
+        found = [t for t, k in zip(wanted, keep) if k]
+        return self._frame(rows[keep], pd.Index(found, name='papel'))
+
+    def source_of(self, ticker):
+        return self.sources[self.rows([ticker])[0]]
+
+    def to_frame(self):
+        return self._frame(np.arange(len(self)), pd.Index(self.tickers, name='papel'))
+
+    def memory_usage(self):
+        """
+        Bytes held: both matrices, source codes, ticker keys and their sorted copy and order.
+        """
+        return (self.ratios.nbytes + self.amounts.nbytes + self.sources.codes.nbytes
+                + 2 * self.keys.nbytes + self.order.nbytes)
+
+def get_market_snapshot(force=False):
+    """
+    Returns (frame, version) for the current Fundamentus table as a MarketFrame.
+    The table is downloaded at most once per SNAPSHOT_TTL and shared by all requests.
+    If a refresh fails, the previous snapshot keeps being served.
+    Snapshot listeners (add_snapshot_listener) are notified when the content changes.
+    """
+    loaded = None
+    with _snapshot_lock:
+        age = time.time() - _snapshot['loaded_at']
+        if force or _snapshot['frame'] is None or age > SNAPSHOT_TTL:
+            try:
+                df = _normalize_resultado(fundamentus.get_resultado())
+                frame = MarketFrame.from_frame(df, 'fundamentus')
+                print(f"Snapshot carregado: {len(frame)} ativos, {frame.memory_usage() / 1024:.0f} KB "
+                      f"(tabela original {df.memory_usage(deep=True).sum() / 1024:.0f} KB)")
+                if _snapshot['frame'] is None or _snapshot['frame'].version != frame.version:
+                    loaded = frame
+                _snapshot['frame'] = frame
+                _snapshot['loaded_at'] = time.time()
+            except Exception as e:
+                if _snapshot['frame'] is None:
+                    raise
+                print(f"Erro ao atualizar snapshot, usando versão anterior: {e}")
+        current = _snapshot['frame']
+
+    # Listeners run outside the lock so a slow one doesn't block other requests
+    if loaded is not None:
+        for listener in list(_snapshot_listeners):
+            try:
+                listener(loaded)
+            except Exception as e:
+                print(f"Erro ao processar novo snapshot em {getattr(listener, '__name__', listener)}: {e}")
+    return current, current.version
+
+def add_snapshot_listener(listener):
+    """
+    Registers `listener(frame)` to be called with every new snapshot whose content changed.
+    """
+    if listener not in _snapshot_listeners:
+        _snapshot_listeners.append(listener)
+
+def peek_market_snapshot():
+    """
+    The loaded snapshot MarketFrame, or None, without triggering a download.
+    """
+    with _snapshot_lock:
+        return _snapshot['frame']
+
+def invalidate_market_snapshot():
+    with _snapshot_lock:
+        _snapshot['loaded_at'] = 0.0
+
+def snapshot_expires_in():
+    """
+    Seconds until the current snapshot is due for a refresh (0 if none is loaded).
+    """
+    with _snapshot_lock:
+        if _snapshot['frame'] is None:
+            return 0
+        return max(0, int(SNAPSHOT_TTL - (time.time() - _snapshot['loaded_at'])))
+
 def get_market_data(tickers_filter=None):
+    """
+    Market table for `tickers_filter` (or the whole Fundamentus snapshot when empty),
+    indexed by ticker. Tickers outside Fundamentus are fetched from Yahoo.
+    """
     try:
-        # 1. Fetch from Fundamentus (Stocks)
-        df = fundamentus.get_resultado()
-        df.columns = [c.strip().lower() for c in df.columns]
-        
-        rename_map = {
-            'evebitda': 'ev_ebitda',
-            'roe': 'return_on_equity'
-        }
-        df = df.rename(columns=rename_map)
-
-        # Force float conversion for numeric columns
-        cols_to_float = ['cotacao', 'pl', 'pvp', 'dy', 'lpa', 'vpa', 'ev_ebitda', 'return_on_equity']
-        for col in cols_to_float:
-            if col in df.columns:
-                # If column is object type (strings), replace ',' with '.'
-                if df[col].dtype == object:
-                   df[col] = df[col].astype(str).str.replace(',', '.')
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
+        # 1. Fundamentus (Stocks), shared snapshot
+        frame, _ = get_market_snapshot()
         if not tickers_filter:
-            return df
-            
-        # 2. Check for missing tickers (Potential FIIs)
-        # tickers_filter should be list of strings
-        requested = set([t.upper() for t in tickers_filter])
-        available = set(df.index.str.upper())
-        
-        missing = list(requested - available)
-        
-        if missing:
-            print(f"Fetching missing tickers from YF: {missing}")
-            df_yf = fetch_yf_data(missing)
-            if not df_yf.empty:
-                # Align columns - ensuring minimal schema matches
-                df = pd.concat([df, df_yf], axis=0)
-                # Fill NaNs created by concatenation
-                df = df.fillna(0)
-        
-        # 3. Update 'cotacao' from YF for the requested tickers to get the last close/current price
-        if tickers_filter:
-            for t in tickers_filter:
-                try:
-                    t_upper = t.upper()
-                    if t_upper in df.index:
-                        ticker_sa = f"{t_upper}.SA"
-                        obj = yf.Ticker(ticker_sa)
-                        price = obj.info.get('currentPrice') or obj.info.get('regularMarketPrice')
-                        if price:
-                            df.at[t_upper, 'cotacao'] = float(price)
-                except Exception:
-                    pass
-                
-        return df
+            return frame.to_frame()
+
+        return market_rows(frame, tickers_filter)
 
     except Exception as e:
         print(f"Erro ao acessar dados do mercado: {e}")
         return pd.DataFrame()
 
+def market_rows(frame, tickers):
+    """
+    Rows of `tickers` as get_market_data returns them, over the MarketFrame
+    `frame`: tickers outside it are fetched from Yahoo, and the others get
+    their current price.
+    """
+    requested = list(dict.fromkeys(t.upper() for t in tickers))
+    df = frame.take(requested)
+
+    # 2. Check for missing tickers (Potential FIIs)
+    missing = [t for t in requested if t not in frame]
+    fetched = []
+    if missing:
+        df_yf, fetched = yahoo_rows(missing)
+        if not df_yf.empty:
+            df = pd.concat([df, df_yf], axis=0)
+            # Fill NaNs created by concatenation
+            df = df.fillna(0)
+        if fetched and _quote_source['record'] is not None:
+            _quote_source['record']({t: df.at[t, 'cotacao'] for t in fetched if df.at[t, 'cotacao'] > 0})
+
+    # 3. Update 'cotacao' with the current price of the requested tickers
+    # (set_quote_source); rows just fetched from Yahoo already carry it
+    quotes = _quote_source['fetch']([t for t in requested if t in df.index and t not in fetched])
+    for t, price in quotes.items():
+        df.at[t, 'cotacao'] = price
+
+    return df
+
+# Table versions served by /api/tickers: version -> {ticker: row hash}. The
+# recent ones are kept in memory; all of the last TABLE_VERSIONS_TTL in SQLite at
+# TABLE_VERSIONS_DB, so a 'since' sent to another worker still gets its delta
+# (on serverless runtimes that means pointing it to storage the instances share).
+TABLE_VERSIONS_KEPT = 64
+TABLE_VERSIONS_TTL = 86400
+TABLE_VERSIONS_DB = os.environ.get('TABLE_VERSIONS_DB', os.path.join(BASE_DIR, 'data', 'table_versions.sqlite'))
+_table_versions = OrderedDict()
+_table_versions_lock = threading.Lock()
+_table_versions_db = {'path': None}
+
+def table_version(df, as_of=None):
+    """
+    Version of the table valuation_table(df, as_of) builds, from its inputs only:
+    the market rows (current prices included), the as-of day and the state of
+    each valuation extension (see add_valuation_extension). Costs a hash of the
+    rows, so an up-to-date client is answered before any valuation work.
+    The version doubles as the ETag of the /api/tickers response.
+    """
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    if as_of is not None:
+        digest.update(as_of.isoformat().encode())
+    for extension in _valuation_extensions:
+        version = _extension_versions.get(extension)
+        digest.update(repr(version() if version else None).encode())
+    return digest.hexdigest()[:16]
+
+def _table_versions_path():
+    # TABLE_VERSIONS_DB if its directory is writable, else a temp file
+    if _table_versions_db['path'] is None:
+        path = TABLE_VERSIONS_DB
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.access(os.path.dirname(path), os.W_OK):
+                raise PermissionError(path)
+        except OSError:
+            path = os.path.join(TEMP_DIR, 'table_versions.sqlite')
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS table_versions ("
+                         "version TEXT PRIMARY KEY, tickers TEXT NOT NULL, hashes BLOB NOT NULL, created_at REAL NOT NULL)")
+        finally:
+            conn.close()
+        _table_versions_db['path'] = path
+    return _table_versions_db['path']
+
+def register_table_version(version, df):
+    """
+    Records the per-row hashes of the valued table `df` (indexed by ticker)
+    served as `version` (see table_version), for table_delta.
+    """
+    with _table_versions_lock:
+        if version in _table_versions:
+            _table_versions.move_to_end(version)
+            return
+    row_hashes = pd.util.hash_pandas_object(df, index=True).values
+    hashes = dict(zip(df.index, row_hashes))
+    with _table_versions_lock:
+        _table_versions[version] = hashes
+        while len(_table_versions) > TABLE_VERSIONS_KEPT:
+            _table_versions.popitem(last=False)
+    try:
+        now = time.time()
+        conn = sqlite3.connect(_table_versions_path(), timeout=5)
+        try:
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO table_versions VALUES (?, ?, ?, ?)",
+                             (version, '\n'.join(df.index), row_hashes.astype(np.uint64).tobytes(), now))
+                conn.execute("DELETE FROM table_versions WHERE created_at < ?", (now - TABLE_VERSIONS_TTL,))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Erro ao gravar versão da tabela: {e}")
+
+def _load_table_version(version):
+    # {ticker: row hash} of a version registered by any process, or None
+    try:
+        conn = sqlite3.connect(_table_versions_path(), timeout=5)
+        try:
+            row = conn.execute("SELECT tickers, hashes FROM table_versions WHERE version = ?", (version,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Erro ao ler versão da tabela: {e}")
+        return None
+    if row is None:
+        return None
+    return dict(zip(row[0].split('\n'), np.frombuffer(row[1], dtype=np.uint64)))
+
+def table_delta(df, version, since):
+    """
+    Compares table `version` (rows in df) against the earlier version `since`.
+    Returns (changed_rows_df, removed_tickers), or None if `since` is no longer known.
+    """
+    with _table_versions_lock:
+        old = _table_versions.get(since)
+        new = _table_versions.get(version)
+    if old is None:
+        old = _load_table_version(since)
+    if old is None or new is None:
+        return None
+    changed = [t for t, h in new.items() if old.get(t) != h]
+    removed = [t for t in old if t not in new]
+    return df.loc[changed], removed
+
 def extrair_tickers_texto(texto):
     """
     Extracts tickers (e.g. PETR4, VALE3) from raw text using regex.
@@ -314,25 +943,79 @@ def delete_portfolio(name):
             return False, f"Erro ao excluir carteira: {e}"
     return False, "Carteira não encontrada."
 
-def calcular_valuation(row):
-    cotacao = row.get('cotacao', 0)
-    pl = row.get('pl', 0)
-    pvp = row.get('pvp', 0)
-    dy = row.get('dy', 0)
+VALUATION_COLUMNS = ['Preço Justo (Graham)', 'Margem Graham %', 'Preço Teto (6%)', 'Margem Barsi %', 'LPA', 'VPA']
 
-    lpa = cotacao / pl if pl != 0 else 0
-    vpa = cotacao / pvp if pvp != 0 else 0
+def valuation_indicators(df):
+    """
+    Graham fair price, Barsi ceiling price (6% yield), their margins (%) and the
+    implied LPA/VPA of every row of a market frame at once. Rows without a
+    positive LPA and VPA get no Graham price, and rows without a price no margins.
+    """
+    cotacao = df['cotacao'].to_numpy(dtype=np.float64)
+    pl = df['pl'].to_numpy(dtype=np.float64)
+    pvp = df['pvp'].to_numpy(dtype=np.float64)
+    dy = df['dy'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lpa = np.where(pl != 0, cotacao / pl, 0.0)
+        vpa = np.where(pvp != 0, cotacao / pvp, 0.0)
+        graham = np.sqrt(np.where((lpa > 0) & (vpa > 0), 22.5 * lpa * vpa, 0.0))
+        priced = cotacao > 0
+        margem_graham = np.where(priced & (graham > 0), (graham / cotacao - 1) * 100, 0.0)
+        teto = dy * cotacao / 0.06
+        margem_barsi = np.where(priced, (teto / cotacao - 1) * 100, 0.0)
+    return pd.DataFrame(dict(zip(VALUATION_COLUMNS, [graham, margem_graham, teto, margem_barsi, lpa, vpa])),
+                        index=df.index)
 
-    if lpa > 0 and vpa > 0:
-        preco_graham = np.sqrt(22.5 * vpa * lpa)
-        margem_graham = ((preco_graham / cotacao) - 1) * 100 if cotacao > 0 else 0
-    else:
-        preco_graham = 0
-        margem_graham = 0
-    
-    dividendos_estimados = dy * cotacao
-    preco_teto_6 = dividendos_estimados / 0.06
-    margem_barsi = ((preco_teto_6 / cotacao) - 1) * 100 if cotacao > 0 else 0
-    
-    return pd.Series([preco_graham, margem_graham, preco_teto_6, margem_barsi, lpa, vpa], 
-                     index=['Preço Justo (Graham)', 'Margem Graham %', 'Preço Teto (6%)', 'Margem Barsi %', 'LPA', 'VPA'])
+_valuation_extensions = []
+_extension_versions = {}
+
+def add_valuation_extension(extension, version=None):
+    """
+    Registers `extension(df, as_of=None)`, returning extra valuation columns
+    indexed like the market frame `df` it gets, to be appended by
+    valuation_table. For an archived frame `as_of` is its day, and the columns
+    must come from data as of that day (or be left empty). `version()`
+    returns a value that changes whenever the data behind the columns does
+    (part of table_version); without it the columns are taken as constant.
+    """
+    if extension not in _valuation_extensions:
+        _valuation_extensions.append(extension)
+    if version is not None:
+        _extension_versions[extension] = version
+
+def valuation_table(df, as_of=None):
+    """
+    Appends the valuation columns (and those of valuation extensions) to a market
+    frame and cleans inf/NaN so it serializes to JSON. `as_of` is the day of an
+    archived frame (None for live data), passed on to the extensions.
+    """
+    parts = [df, valuation_indicators(df)]
+    for extension in _valuation_extensions:
+        try:
+            parts.append(extension(df, as_of=as_of).reindex(df.index))
+        except Exception as e:
+            print(f"Erro ao calcular colunas de {getattr(extension, '__name__', extension)}: {e}")
+    df_final = pd.concat(parts, axis=1)
+    return df_final.replace([np.inf, -np.inf], 0).fillna(0)
+
+def _round_significant(values, digits=7):
+    """
+    Rounds to `digits` significant digits (float32 holds ~7), so a stored 10.53
+    is served as 10.53 and not 10.529999732971191.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    scale = 10.0 ** (digits - 1 - np.nan_to_num(magnitude, nan=0.0, posinf=0.0, neginf=0.0))
+    return np.round(values * scale) / scale
+
+def table_records(df):
+    """
+    Converts a valued table (indexed by ticker) to the list of dicts the dashboard expects.
+    """
+    frame = df.copy()
+    # Amounts are stored in float64 and served as they are
+    numeric = [c for c in frame.select_dtypes(include='number').columns if c not in AMOUNT_COLUMNS]
+    frame[numeric] = _round_significant(frame[numeric].to_numpy(dtype=np.float64))
+    frame = frame.reset_index()
+    frame = frame.rename(columns={frame.columns[0]: 'ticker'})
+    return frame.to_dict(orient='records')
@@ -0,0 +1,349 @@
+"""
+Local dividend event store and forward yield projection.
+
+Events (ticker, ex-date, pay date, amount per share, type) are kept in SQLite
+and refreshed incrementally: stale tickers are downloaded in batches with
+yf.download(actions=True), 5 years the first time and the last year afterwards,
+and only events newer than the last stored ex-date are inserted. Yahoo gives
+ex-dates and amounts only, so pay_date stays empty and type is 'dividendo'
+(JCP included).
+
+The projection is vectorized over every stored ticker at once and is appended to
+the valuation table (a valuation extension, see runtime.install) from the store alone, so it
+costs no upstream call per request. Refreshes run in the background when a new
+market snapshot arrives, or from the CLI:
+
+    python dividends.py --refresh [TICKER ...]
+
+Processes notice refreshes made by others (CLI, other workers) through the
+store itself (store_version, checked at most every STORE_VERSION_CHECK
+seconds), so a scheduled refresh only reaches the app when
+DIVIDEND_DB points to storage they share: on serverless runtimes the default
+path is read-only and each instance falls back to its own temp file.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import core
+
+DIVIDEND_DB = os.environ.get('DIVIDEND_DB', os.path.join(core.BASE_DIR, 'data', 'dividends.sqlite'))
+TEMP_DIVIDEND_DB = os.path.join(core.TEMP_DIR, 'dividends.sqlite')
+
+AUTO_REFRESH = os.environ.get('DIVIDEND_AUTO_REFRESH', '1') != '0'
+REFRESH_TTL = 24 * 3600  # dividends are announced a few times a year
+FULL_REFRESH_AGE = 300 * 86400  # older syncs download the full 5 years again
+REFRESH_CHUNK = 50
+STORE_VERSION_CHECK = 60  # seconds between checks for events written by other processes
+PROJECTION_YEARS = 5
+MAX_GROWTH = 0.3  # clip on the growth applied to the projection
+PROJECTIONS_KEPT = 8  # days (today and as-of queries) kept projected
+
+PROJECTION_COLUMNS = ['DY Proj. 12m %', 'Preço Teto Proj. (6%)', 'Cresc. Div. %', 'Regularidade Div. %']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dividend_events (
+    ticker TEXT NOT NULL,
+    ex_date TEXT NOT NULL,
+    pay_date TEXT,
+    amount REAL NOT NULL,
+    type TEXT NOT NULL DEFAULT 'dividendo',
+    PRIMARY KEY (ticker, ex_date, type)
+);
+CREATE TABLE IF NOT EXISTS dividend_sync (
+    ticker TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    last_ex_date TEXT
+);
+"""
+
+_lock = threading.Lock()
+_state = {'path': None, 'refreshing': False}
+_projections = OrderedDict()  # (store version, day) -> project() frame
+_version = {'value': None, 'checked_at': 0.0}
+
+def db_path():
+    """
+    DIVIDEND_DB if its directory is writable, else a temp file (read-only deploys;
+    that file is per instance, so set DIVIDEND_DB to shared storage there).
+    """
+    if _state['path'] is None:
+        path = DIVIDEND_DB
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.access(os.path.dirname(path), os.W_OK):
+                raise PermissionError(path)
+        except OSError:
+            path = TEMP_DIVIDEND_DB
+        conn = sqlite3.connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _state['path'] = path
+    return _state['path']
+
+@contextmanager
+def _connect():
+    # Commits on success, rolls back on error, always closes
+    conn = sqlite3.connect(db_path(), timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def ingest(ticker, dividends):
+    """
+    Stores the events of `dividends` (ex-date -> amount) newer than the last
+    stored ex-date of `ticker` and marks it synced. Returns the number of new events.
+    """
+    dividends = dividends[dividends > 0]
+    if isinstance(dividends.index, pd.DatetimeIndex) and dividends.index.tz is not None:
+        dividends.index = dividends.index.tz_localize(None)
+    with _lock, _connect() as conn:
+        row = conn.execute("SELECT last_ex_date FROM dividend_sync WHERE ticker = ?", (ticker,)).fetchone()
+        last = row[0] if row and row[0] else ''
+        events = [(ticker, d.strftime('%Y-%m-%d'), float(a)) for d, a in dividends.items()
+                  if d.strftime('%Y-%m-%d') > last]
+        conn.executemany("INSERT OR IGNORE INTO dividend_events (ticker, ex_date, amount) VALUES (?, ?, ?)", events)
+        newest = max([e[1] for e in events], default=last) or None
+        conn.execute("INSERT OR REPLACE INTO dividend_sync (ticker, synced_at, last_ex_date) VALUES (?, ?, ?)",
+                     (ticker, time.time(), newest))
+        if events:
+            _version['checked_at'] = 0.0
+    return len(events)
+
+def sync_times(tickers):
+    """
+    {ticker: synced_at} for the tickers present in the store.
+    """
+    with _connect() as conn:
+        rows = conn.execute("SELECT ticker, synced_at FROM dividend_sync").fetchall()
+    wanted = set(tickers)
+    return {t: synced_at for t, synced_at in rows if t in wanted}
+
+def _download(tickers, period):
+    # {ticker: dividends series} from one batched history download, for the
+    # tickers Yahoo returned prices for. yfinance reports failures as missing or
+    # all-NaN columns (or an empty frame) rather than raising, so those are left out.
+    symbols = [core._yahoo_symbol(t) for t in tickers]
+    try:
+        data = yf.download(symbols, period=period, group_by='ticker', actions=True,
+                           progress=False, threads=True)
+    except Exception as e:
+        print(f"Erro ao baixar dividendos de {symbols}: {e}")
+        return {}
+    if data is None or data.empty:
+        return {}
+    result = {}
+    for t, symbol in zip(tickers, symbols):
+        if isinstance(data.columns, pd.MultiIndex):
+            if symbol not in data.columns.get_level_values(0):
+                continue
+            hist = data[symbol]
+        else:
+            hist = data
+        hist = hist.dropna(how='all')
+        if not hist.empty:
+            result[t] = core.history_dividends(hist)
+    return result
+
+def refresh(tickers, max_age=REFRESH_TTL, chunk=REFRESH_CHUNK):
+    """
+    Incrementally refreshes the tickers not synced in the last `max_age` seconds.
+    Only tickers Yahoo answered for are marked synced (with or without dividends):
+    failed ones are retried on the next refresh. Returns the number of new events stored.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    synced = sync_times(tickers)
+    now = time.time()
+    stale = [t for t in tickers if now - synced.get(t, 0) > max_age]
+    # Recently synced tickers only need the last year; new ones get the full 5 years
+    groups = {
+        '1y': [t for t in stale if now - synced.get(t, 0) <= FULL_REFRESH_AGE],
+        '5y': [t for t in stale if now - synced.get(t, 0) > FULL_REFRESH_AGE],
+    }
+    added, failed = 0, 0
+    for period, group in groups.items():
+        for i in range(0, len(group), chunk):
+            batch = group[i:i + chunk]
+            downloaded = _download(batch, period)
+            failed += len(batch) - len(downloaded)
+            for t, series in downloaded.items():
+                added += ingest(t, series)
+    if failed:
+        print(f"Dividendos: {failed} ativos sem resposta do Yahoo, tentados de novo na próxima atualização.")
+    return added
+
+def refresh_in_background(frame):
+    """
+    Snapshot listener: refreshes the dividend store for the snapshot tickers and
+    saved portfolios in a background thread (skipped on serverless runtimes and
+    with DIVIDEND_AUTO_REFRESH=0; use the CLI from a scheduled job there).
+    """
+    if core.SERVERLESS or not AUTO_REFRESH:
+        return
+    with _lock:
+        if _state['refreshing']:
+            return
+        _state['refreshing'] = True
+
+    def run():
+        try:
+            tickers = list(frame.tickers)
+            for portfolio in core.load_portfolios().values():
+                tickers.extend(portfolio)
+            added = refresh(tickers)
+            print(f"Dividendos atualizados: {added} novos eventos.")
+        except Exception as e:
+            print(f"Erro ao atualizar dividendos: {e}")
+        finally:
+            with _lock:
+                _state['refreshing'] = False
+
+    threading.Thread(target=run, name='dividend-refresh', daemon=True).start()
+
+def load_events(tickers=None):
+    """
+    Stored events as a DataFrame with columns ticker, ex_date (datetime), pay_date, amount, type.
+    """
+    query = "SELECT ticker, ex_date, pay_date, amount, type FROM dividend_events"
+    params = []
+    if tickers is not None:
+        tickers = list(tickers)
+        query += f" WHERE ticker IN ({','.join('?' * len(tickers))})"
+        params = tickers
+    with _connect() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+    df['ex_date'] = pd.to_datetime(df['ex_date'])
+    return df
+
+def project(events, as_of=None):
+    """
+    Per-ticker dividend projection from `events` (see load_events), all tickers at once:
+      ttm:         amount paid in the last 12 months
+      growth:      annual growth rate (CAGR) of the 12-month sums over the longest span available (<= 4 years)
+      consistency: share of the covered 12-month periods (<= PROJECTION_YEARS) with payments
+      forward_12m: ttm grown by growth, clipped to +-MAX_GROWTH
+    """
+    as_of = pd.Timestamp(as_of or pd.Timestamp.today()).normalize()
+    columns = ['ttm', 'growth', 'consistency', 'forward_12m']
+    if events.empty:
+        return pd.DataFrame(columns=columns, dtype=float)
+
+    codes, tickers = pd.factorize(events['ticker'])
+    ex_dates = events['ex_date'].to_numpy(dtype='datetime64[D]')
+    days_ago = (np.datetime64(as_of.date(), 'D') - ex_dates).astype(np.int64)
+    years_ago = days_ago // 365
+    valid = (days_ago >= 0) & (years_ago < PROJECTION_YEARS)
+
+    # tickers x trailing years of dividends paid
+    yearly = np.zeros((len(tickers), PROJECTION_YEARS))
+    np.add.at(yearly, (codes[valid], years_ago[valid]), events['amount'].to_numpy()[valid])
+
+    # Years covered by the ticker's event history, from its first stored ex-date
+    first = np.full(len(tickers), -1, dtype=np.int64)
+    np.maximum.at(first, codes[valid], years_ago[valid])
+    covered = first + 1
+
+    ttm = yearly[:, 0]
+    growth = np.full(len(tickers), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in range(1, PROJECTION_YEARS):
+            usable = (ttm > 0) & (yearly[:, k] > 0) & (covered > k)
+            growth = np.where(usable, (ttm / yearly[:, k]) ** (1 / k) - 1, growth)
+        paid = (yearly > 0) & (np.arange(PROJECTION_YEARS) < covered[:, None])
+        consistency = np.where(covered > 0, paid.sum(axis=1) / covered, 0.0)
+
+    forward = ttm * (1 + np.clip(np.nan_to_num(growth), -MAX_GROWTH, MAX_GROWTH))
+    return pd.DataFrame({'ttm': ttm, 'growth': growth, 'consistency': consistency, 'forward_12m': forward},
+                        index=pd.Index(tickers, name='papel'))
+
+def store_version():
+    """
+    Changes whenever events are added to the store, by this process or any other
+    (events are only ever inserted, so the highest rowid is enough). Kept in
+    memory: the store is read again after this process ingests events, or
+    STORE_VERSION_CHECK seconds after the last read.
+    """
+    now = time.time()
+    with _lock:
+        if now - _version['checked_at'] < STORE_VERSION_CHECK:
+            return _version['value']
+    with _connect() as conn:
+        value = conn.execute("SELECT MAX(rowid) FROM dividend_events").fetchone()[0]
+    with _lock:
+        _version.update(value=value, checked_at=now)
+    return value
+
+def projections(as_of=None):
+    """
+    project() over the whole store as of `as_of` (default today), recomputed
+    only when the store changes; the last PROJECTIONS_KEPT days are kept.
+    """
+    day = pd.Timestamp(as_of or pd.Timestamp.today()).normalize()
+    key = (store_version(), day)
+    with _lock:
+        if key in _projections:
+            _projections.move_to_end(key)
+            return _projections[key]
+    frame = project(load_events(), day)
+    with _lock:
+        _projections[key] = frame
+        while len(_projections) > PROJECTIONS_KEPT:
+            _projections.popitem(last=False)
+    return frame
+
+def valuation_version():
+    """
+    Changes with the data behind valuation_columns: the store and the day.
+    """
+    return store_version(), pd.Timestamp.today().strftime('%Y-%m-%d')
+
+def valuation_columns(df, as_of=None):
+    """
+    Valuation extension: projected 12-month yield and Barsi ceiling, dividend
+    growth and regularity for the rows of the market frame `df`, from the
+    events stored up to `as_of` (default today).
+    """
+    proj = projections(as_of).reindex(df.index)
+    cotacao = df['cotacao'].to_numpy(dtype=np.float64)
+    forward = proj['forward_12m'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dy_forward = np.where(cotacao > 0, forward / cotacao * 100, np.nan)
+    return pd.DataFrame({
+        'DY Proj. 12m %': dy_forward,
+        'Preço Teto Proj. (6%)': forward / 0.06,
+        'Cresc. Div. %': proj['growth'].to_numpy() * 100,
+        'Regularidade Div. %': proj['consistency'].to_numpy() * 100,
+    }, index=df.index)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Base local de dividendos")
+    parser.add_argument('--refresh', action='store_true', help="atualiza os ativos desatualizados")
+    parser.add_argument('--max-age', type=float, default=REFRESH_TTL, help="segundos desde a última atualização")
+    parser.add_argument('tickers', nargs='*', help="padrão: snapshot do Fundamentus e carteiras salvas")
+    args = parser.parse_args(argv)
+
+    tickers = args.tickers
+    if not tickers:
+        frame, _ = core.get_market_snapshot()
+        tickers = list(frame.tickers) + [t for p in core.load_portfolios().values() for t in p]
+    if args.refresh:
+        print(f"{refresh(tickers, args.max_age)} novos eventos.")
+    proj = projections()
+    print(f"{len(proj)} ativos com dividendos na base {db_path()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Intraday minute bars for the tickers being followed, and the live quotes
+served from them.
+
+Each ticker gets a RingBuffer: fixed-size arrays of INTRADAY_BARS minute bars
+(open, high, low, close) that overwrite the oldest bar when full, so memory is
+capped per ticker (~40 bytes a bar) and the store keeps at most
+INTRADAY_MAX_TICKERS tickers, dropping the one updated longest ago. Only bars
+where the price moved are stored; the minutes in between are filled in with the
+previous close when the bars are read, within B3 trading hours (TRADING_HOURS).
+
+One poller thread per process fetches quotes for every tracked ticker once per
+QUOTE_INTERVAL and appends them to the buffers. Only tickers shown live are
+tracked (the live stream and intraday charts), for INTRADAY_TRACK_TTL seconds
+after they were last asked for and at most INTRADAY_MAX_TICKERS of them. The
+table's 'cotacao' (the quote source runtime.install sets) and the quote hub read the buffers
+and only fetch the tickers they don't hold fresh; intraday charts read the
+buffers only and never call the upstream. On serverless runtimes and with
+INTRADAY_POLL=0 there is no poller: quotes are fetched on demand and still
+recorded, so charts show what was seen.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import core
+
+QUOTE_INTERVAL = float(os.environ.get('QUOTE_INTERVAL', 60))  # seconds
+INTRADAY_BARS = int(os.environ.get('INTRADAY_BARS', 480))  # minute bars per ticker, one B3 session
+INTRADAY_MAX_TICKERS = int(os.environ.get('INTRADAY_MAX_TICKERS', 256))
+INTRADAY_TRACK_TTL = float(os.environ.get('INTRADAY_TRACK_TTL', 1800))  # seconds since last asked for
+POLL = os.environ.get('INTRADAY_POLL', '1') != '0'
+# A poller-fed price is fresh until the next poll is overdue
+FRESHNESS = 2 * QUOTE_INTERVAL
+TIMEZONE = 'America/Sao_Paulo'
+TRADING_HOURS = (10 * 60, 18 * 60)  # local minutes of the day, weekdays
+BAR_COLUMNS = ['open', 'high', 'low', 'close']
+# Gaps are filled over at most this span back from the last quote
+FILL_SPAN = 7 * 86400
+
+def _trading_minutes(start, end):
+    # Epoch seconds of every trading minute in [start, end]
+    minutes = np.arange(start, end + 1, 60, dtype=np.int64)
+    local = pd.to_datetime(minutes, unit='s', utc=True).tz_convert(TIMEZONE)
+    of_day = local.hour * 60 + local.minute
+    open_ = (local.dayofweek < 5) & (of_day >= TRADING_HOURS[0]) & (of_day < TRADING_HOURS[1])
+    return minutes[np.asarray(open_)]
+
+class RingBuffer:
+    """
+    The last `capacity` minute bars of one ticker in preallocated arrays.
+    """
+    def __init__(self, capacity=INTRADAY_BARS):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.int64)  # bar start, epoch seconds
+        self.bars = np.zeros((capacity, 4), dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        self.updated_at = 0.0
+
+    def record(self, price, at):
+        """
+        Adds a quote taken at `at` (epoch seconds) to the bar of its minute. A new
+        bar is only opened when the price moved, so a closed market doesn't fill
+        the buffer with copies of the last close. Quotes older than the last one are ignored.
+        """
+        if at < self.updated_at:
+            return
+        minute = int(at // 60) * 60
+        self.updated_at = at
+        if self.count:
+            last = (self.start + self.count - 1) % self.capacity
+            bar = self.bars[last]
+            if minute == self.times[last]:
+                bar[1] = max(bar[1], price)
+                bar[2] = min(bar[2], price)
+                bar[3] = price
+                return
+            if bar[3] == price:
+                return
+        if self.count < self.capacity:
+            slot = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[slot] = minute
+        self.bars[slot] = price
+
+    def last(self):
+        """
+        (close, updated_at) of the newest bar, or None when empty.
+        """
+        if not self.count:
+            return None
+        return float(self.bars[(self.start + self.count - 1) % self.capacity, 3]), self.updated_at
+
+    def frame(self):
+        """
+        The last `capacity` bars in time order, as a DataFrame indexed by minute
+        (local time). Trading minutes up to the last quote without a stored bar
+        (the price didn't move) get a flat bar at the previous close.
+        """
+        order = (self.start + np.arange(self.count)) % self.capacity
+        times, bars = self.times[order], self.bars[order]
+        if self.count:
+            last_minute = int(self.updated_at // 60) * 60
+            start = max(int(times[0]), last_minute - FILL_SPAN)
+            minutes = np.union1d(times, _trading_minutes(start, last_minute))
+            minutes = minutes[minutes >= times[0]][-self.capacity:]
+            previous = np.searchsorted(times, minutes, side='right') - 1
+            filled = bars[previous]
+            flat = times[previous] != minutes
+            filled[flat] = filled[flat, 3:4]
+            times, bars = minutes, filled
+        index = pd.to_datetime(times, unit='s', utc=True).tz_convert(TIMEZONE)
+        return pd.DataFrame(bars, index=index, columns=BAR_COLUMNS)
+
+class IntradayStore:
+    """
+    RingBuffers by ticker, at most `max_tickers` of them.
+    """
+    def __init__(self, capacity=INTRADAY_BARS, max_tickers=INTRADAY_MAX_TICKERS):
+        self.capacity = capacity
+        self.max_tickers = max_tickers
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, quotes, at=None):
+        """
+        Adds {ticker: price} quotes taken at `at` (default now).
+        """
+        at = time.time() if at is None else at
+        with self._lock:
+            for t, price in quotes.items():
+                buffer = self._buffers.get(t)
+                if buffer is None:
+                    buffer = self._buffers[t] = RingBuffer(self.capacity)
+                buffer.record(float(price), at)
+                self._buffers.move_to_end(t)
+            while len(self._buffers) > self.max_tickers:
+                self._buffers.popitem(last=False)
+
+    def latest(self, tickers, max_age=FRESHNESS):
+        """
+        {ticker: price} for the tickers quoted within the last `max_age` seconds.
+        """
+        now = time.time()
+        quotes = {}
+        with self._lock:
+            for t in tickers:
+                buffer = self._buffers.get(t)
+                last = buffer.last() if buffer is not None else None
+                if last is not None and now - last[1] <= max_age:
+                    quotes[t] = last[0]
+        return quotes
+
+    def quoted_at(self, tickers):
+        """
+        {ticker: epoch seconds of its last quote} for the tickers held.
+        """
+        with self._lock:
+            return {t: self._buffers[t].updated_at for t in tickers if t in self._buffers}
+
+    def bars(self, ticker):
+        """
+        The minute bars held for `ticker` (empty DataFrame when none).
+        """
+        with self._lock:
+            buffer = self._buffers.get(ticker)
+            if buffer is None:
+                return pd.DataFrame(columns=BAR_COLUMNS)
+            return buffer.frame()
+
+    def memory_usage(self):
+        with self._lock:
+            return sum(b.times.nbytes + b.bars.nbytes for b in self._buffers.values())
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+store = IntradayStore()
+
+_lock = threading.Lock()
+_state = {'tracked': OrderedDict(), 'poller': None}  # tracked: ticker -> expiry, oldest first
+
+def polling():
+    """
+    True when a background poller feeds the store in this process.
+    """
+    return POLL and not core.SERVERLESS
+
+def track(tickers):
+    """
+    Keeps `tickers` polled for the next INTRADAY_TRACK_TTL seconds, starting the
+    poller if needed. Past INTRADAY_MAX_TICKERS the ones asked for longest ago
+    stop being polled.
+    """
+    expires = time.time() + INTRADAY_TRACK_TTL
+    with _lock:
+        tracked = _state['tracked']
+        for t in tickers:
+            tracked[t] = expires
+            tracked.move_to_end(t)
+        while len(tracked) > INTRADAY_MAX_TICKERS:
+            tracked.popitem(last=False)
+        if polling() and _state['poller'] is None:
+            _state['poller'] = threading.Thread(target=_run, name='intraday-poller', daemon=True)
+            _state['poller'].start()
+
+def _prune():
+    now = time.time()
+    tracked = _state['tracked']
+    for t in [t for t, expires in tracked.items() if expires < now]:
+        del tracked[t]
+    return tracked
+
+def tracked_tickers():
+    """
+    Tracked tickers whose tracking hasn't expired (expired ones are dropped).
+    """
+    with _lock:
+        return sorted(_prune())
+
+def poll_once():
+    """
+    Fetches quotes for every tracked ticker into the store. Returns how many were quoted.
+    """
+    tickers = tracked_tickers()
+    if not tickers:
+        return 0
+    quotes = core.fetch_quotes(tickers)
+    store.record(quotes)
+    return len(quotes)
+
+def _run():
+    # Whoever tracked the tickers just fetched them: the first poll is one interval away
+    while True:
+        time.sleep(QUOTE_INTERVAL)
+        # Decided under the lock, so a concurrent track() either sees the poller gone or gets polled
+        with _lock:
+            if not _prune():
+                _state['poller'] = None
+                return
+        try:
+            poll_once()
+        except Exception as e:
+            print(f"Erro ao atualizar cotações intradiárias: {e}")
+
+def latest_quotes(tickers):
+    """
+    {ticker: price} for `tickers`: from the store when quoted within FRESHNESS
+    (the poller keeps tracked tickers fresh), fetched and recorded otherwise.
+    The tickers are not tracked by this.
+    """
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    quotes = store.latest(tickers)
+    missing = [t for t in tickers if t not in quotes]
+    if missing:
+        fetched = core.fetch_quotes(missing)
+        store.record(fetched)
+        quotes.update(fetched)
+    return quotes
+
+def history(ticker):
+    """
+    Minute bars of `ticker` from the store only (never the upstream); tracks it,
+    so a ticker seen for the first time starts filling on the next poll.
+    Callers check the ticker is a known one first.
+    """
+    track([ticker])
+    return store.bars(ticker)
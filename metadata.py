@@ -0,0 +1,331 @@
+"""
+Company metadata (sector and segment) and per-sector aggregates.
+
+Fundamentus only shows a company's sector and segment on its detail page, one
+scrape per company. The table here is built in bulk instead:
+  1. the sector listings (resultado.php?setor=N, one page per sector, ~42 pages)
+     give the sector of every listed ticker;
+  2. detail pages are only fetched for companies (the 4-letter root shared by
+     PETR3/PETR4) whose segment is not known yet, since it rarely changes.
+Both go through `crawl`, a thread pool capped at METADATA_WORKERS concurrent
+requests, against a replaceable upstream (set_upstream), so a refresh costs the
+sector pages plus the new listings. The table is stored as Parquet and
+refreshed every METADATA_TTL, in the background when a new market snapshot
+arrives, or from the CLI:
+
+    python metadata.py --refresh
+
+Median P/L, P/VP, DY and Graham margin per sector and segment are computed for
+the whole snapshot at once, once per (snapshot, table) version, and appended to
+the valuation table (a valuation extension, see runtime.install).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import fundamentus
+
+import archive
+import core
+
+METADATA_FILE = os.environ.get('METADATA_FILE', os.path.join(core.BASE_DIR, 'data', 'metadata.parquet'))
+TEMP_METADATA_FILE = os.path.join(core.TEMP_DIR, 'metadata.parquet')
+
+AUTO_REFRESH = os.environ.get('METADATA_AUTO_REFRESH', '1') != '0'
+METADATA_TTL = 7 * 86400  # sectors change on corporate events, not daily
+METADATA_WORKERS = int(os.environ.get('METADATA_WORKERS', 4))  # concurrent upstream requests
+
+TABLE_COLUMNS = ['papel', 'setor', 'segmento', 'atualizado_em']
+LEVELS = ['setor', 'segmento']
+AGGREGATE_COLUMNS = ['P/L', 'P/VP', 'DY %', 'Margem Graham %', 'Ativos']
+
+class FundamentusUpstream:
+    """
+    Sector listings and detail pages from fundamentus.com.br.
+    """
+    def sectors(self):
+        # {sector id: name}; the library's table has a duplicated label, not a duplicated id
+        return {int(row.id): row.desc for row in fundamentus.setor.df.itertuples()}
+
+    def sector_tickers(self, sector_id):
+        return fundamentus.list_papel_setor(sector_id)
+
+    def details(self, ticker):
+        df = fundamentus.get_papel(ticker)
+        if df is None or df.empty:
+            return None
+        row = df.iloc[0]
+        return {'setor': row.get('Setor'), 'segmento': row.get('Subsetor')}
+
+_lock = threading.Lock()
+_state = {'path': None, 'table': None, 'generation': 0, 'refreshing': False,
+          'upstream': FundamentusUpstream()}
+_aggregates = {'key': None, 'frames': None}
+_archived_aggregates = {'key': None, 'frames': None}  # last archived snapshot asked for
+
+def set_upstream(upstream):
+    """
+    Replaces the metadata source (an object with sectors(), sector_tickers(id)
+    and details(ticker)) and returns the previous one.
+    """
+    with _lock:
+        previous, _state['upstream'] = _state['upstream'], upstream
+    return previous
+
+def metadata_path():
+    """
+    METADATA_FILE if its directory is writable, else a temp file (read-only deploys).
+    """
+    if _state['path'] is None:
+        path = METADATA_FILE
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.access(os.path.dirname(path), os.W_OK):
+                raise PermissionError(path)
+        except OSError:
+            path = TEMP_METADATA_FILE
+        _state['path'] = path
+    return _state['path']
+
+def load_table():
+    """
+    The metadata table (papel, setor, segmento, atualizado_em), read from disk once.
+    """
+    with _lock:
+        if _state['table'] is not None:
+            return _state['table']
+    path = metadata_path()
+    table = pd.DataFrame({c: pd.Series(dtype=float if c == 'atualizado_em' else object) for c in TABLE_COLUMNS})
+    if os.path.exists(path):
+        try:
+            table = pd.read_parquet(path)
+        except Exception as e:
+            print(f"Erro ao carregar metadados de {path}: {e}")
+    with _lock:
+        if _state['table'] is None:
+            _state['table'] = table
+        return _state['table']
+
+def _save(table):
+    path = metadata_path()
+    tmp = f"{path}.tmp"
+    table.to_parquet(tmp, compression='zstd', index=False)
+    os.replace(tmp, path)
+    with _lock:
+        _state['table'] = table
+        _state['generation'] += 1
+
+def table_age():
+    """
+    Seconds since the oldest row was refreshed (inf when the table is empty).
+    """
+    table = load_table()
+    if table.empty:
+        return float('inf')
+    return time.time() - float(table['atualizado_em'].min())
+
+def crawl(fetch, items, workers=METADATA_WORKERS):
+    """
+    fetch(item) for every item with at most `workers` calls in flight.
+    Returns {item: result} for the calls that succeeded and returned something.
+    """
+    def call(item):
+        try:
+            return item, fetch(item)
+        except Exception as e:
+            print(f"Erro ao buscar metadados de {item}: {e}")
+            return item, None
+
+    items = list(items)
+    if not items:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items)))) as pool:
+        return {item: result for item, result in pool.map(call, items) if result is not None}
+
+def _root(ticker):
+    return ticker[:4]
+
+def refresh(max_age=METADATA_TTL, tickers=(), workers=METADATA_WORKERS):
+    """
+    Rebuilds the table from the sector listings when it is older than `max_age`
+    seconds, and fetches the detail page of one ticker per company whose segment
+    is unknown (`tickers` adds tickers missing from the listings).
+    Returns the number of detail pages fetched, or None if the table was fresh.
+    """
+    if table_age() <= max_age:
+        return None
+    upstream = _state['upstream']
+    table = load_table().set_index('papel')
+
+    sectors = upstream.sectors()
+    listings = crawl(upstream.sector_tickers, sectors, workers)
+    setor = {t.strip().upper(): sectors[sector_id] for sector_id, listed in listings.items() for t in listed}
+    if not setor and sectors:
+        raise RuntimeError("nenhuma listagem de setor disponível")
+    # Rows of sectors whose page failed are kept as stored, refresh time included,
+    # so they keep their sector and the table stays due for another refresh
+    failed = {name for sector_id, name in sectors.items() if sector_id not in listings}
+    kept = table[table['setor'].isin(failed) & ~table.index.isin(list(setor))]
+    for t in tickers:
+        t = t.strip().upper()
+        if t not in kept.index:
+            setor.setdefault(t, None)
+
+    # Segment is per company: reuse what is stored for any class of the same root
+    known = table['segmento'].dropna()
+    segmento = {_root(t): s for t, s in known.items()}
+    pending = {}
+    for t in sorted(setor):
+        if _root(t) not in segmento:
+            pending.setdefault(_root(t), t)
+    details = crawl(upstream.details, pending.values(), workers)
+    for t, info in details.items():
+        segmento[_root(t)] = info.get('segmento')
+        if setor.get(t) is None:
+            setor[t] = info.get('setor')
+
+    now = time.time()
+    papel = sorted(setor)
+    fresh = pd.DataFrame({
+        'papel': papel,
+        'setor': [setor[t] for t in papel],
+        'segmento': [segmento.get(_root(t)) for t in papel],
+        'atualizado_em': np.full(len(papel), now),
+    })
+    if not kept.empty:
+        fresh = pd.concat([fresh, kept.reset_index()[TABLE_COLUMNS]]).sort_values('papel', ignore_index=True)
+        print(f"Metadados: {len(failed)} setores sem resposta, {len(kept)} ativos mantidos da tabela anterior.")
+    _save(fresh)
+    print(f"Metadados atualizados: {len(papel)} ativos, {len(sectors)} setores, {len(details)} páginas de detalhe.")
+    return len(details)
+
+def sector_aggregates(market, table, level='setor'):
+    """
+    Medians of P/L, P/VP, DY (%) and Graham margin (%) per sector or segment over
+    the market frame `market`, plus the number of companies ('Ativos') in each.
+    Only traded rows count, and only positive P/L and P/VP (the Graham margin
+    needs both).
+    """
+    groups = table.set_index('papel')[level].reindex(market.index)
+    cotacao = market['cotacao'].to_numpy(dtype=np.float64)
+    pl = market['pl'].to_numpy(dtype=np.float64)
+    pvp = market['pvp'].to_numpy(dtype=np.float64)
+    traded = (cotacao > 0) & (market['liq2m'].to_numpy(dtype=np.float64) > 0)
+    valued = traded & (pl > 0) & (pvp > 0)
+    margem = core.valuation_indicators(market)['Margem Graham %'].to_numpy()
+    values = pd.DataFrame({
+        'P/L': np.where(valued, pl, np.nan),
+        'P/VP': np.where(valued, pvp, np.nan),
+        'DY %': np.where(traded, market['dy'].to_numpy(dtype=np.float64) * 100, np.nan),
+        'Margem Graham %': np.where(valued, margem, np.nan),
+        'Ativos': traded.astype(np.int64),
+    }, index=market.index)
+    grouped = values.groupby(groups.to_numpy(), sort=True)
+    result = grouped[AGGREGATE_COLUMNS[:-1]].median()
+    result['Ativos'] = grouped['Ativos'].sum()
+    result.index.name = level
+    return result[AGGREGATE_COLUMNS]
+
+def aggregates(frame=None, archived=False):
+    """
+    {level: sector_aggregates} for `frame` (default: the loaded snapshot; None
+    if there is none yet), recomputed only when the snapshot or the table changes.
+    Archived snapshots (`archived`) are cached apart, so as-of queries don't
+    evict the live medians.
+    """
+    frame = frame if frame is not None else core.peek_market_snapshot()
+    if frame is None:
+        return None
+    cache = _archived_aggregates if archived else _aggregates
+    with _lock:
+        key = (frame.version, _state['generation'])
+        if cache['key'] == key:
+            return cache['frames']
+    table = load_table()
+    market = frame.to_frame()
+    frames = {level: sector_aggregates(market, table, level) for level in LEVELS}
+    with _lock:
+        cache.update(key=key, frames=frames)
+    return frames
+
+def on_snapshot(frame):
+    """
+    Snapshot listener: precomputes the aggregates of the new snapshot and, when
+    the table is stale, refreshes it in a background thread (skipped on
+    serverless runtimes and with METADATA_AUTO_REFRESH=0; use the CLI there).
+    """
+    aggregates(frame)
+    if core.SERVERLESS or not AUTO_REFRESH or table_age() <= METADATA_TTL:
+        return
+    with _lock:
+        if _state['refreshing']:
+            return
+        _state['refreshing'] = True
+
+    def run():
+        try:
+            refresh(tickers=[t for p in core.load_portfolios().values() for t in p])
+        except Exception as e:
+            print(f"Erro ao atualizar metadados: {e}")
+        finally:
+            with _lock:
+                _state['refreshing'] = False
+
+    threading.Thread(target=run, name='metadata-refresh', daemon=True).start()
+
+def valuation_version():
+    """
+    Changes with the data behind valuation_columns: the loaded snapshot (for
+    the medians) and the sector table.
+    """
+    frame = core.peek_market_snapshot()
+    return (frame.version if frame is not None else None), _state['generation']
+
+def valuation_columns(df, as_of=None):
+    """
+    Valuation extension: sector and segment of the rows of the market frame `df`
+    and the sector medians they compare against: of the live snapshot (empty
+    until one is loaded) or, with `as_of`, of the snapshot archived that day.
+    Sectors come from the current table for both.
+    """
+    table = load_table().set_index('papel')
+    if as_of is not None:
+        archived = archive.load_snapshot(as_of)[0]
+        frames = aggregates(archived, archived=True) if archived is not None else None
+    else:
+        frames = aggregates()
+    sector = frames['setor'] if frames is not None else pd.DataFrame(columns=AGGREGATE_COLUMNS, dtype=float)
+    setor = table['setor'].reindex(df.index)
+    medians = sector.reindex(setor.to_numpy())
+    return pd.DataFrame({
+        'Setor': setor.fillna('').to_numpy(),
+        'Segmento': table['segmento'].reindex(df.index).fillna('').to_numpy(),
+        'P/L Setor': medians['P/L'].to_numpy(),
+        'P/VP Setor': medians['P/VP'].to_numpy(),
+        'DY Setor %': medians['DY %'].to_numpy(),
+        'Margem Graham Setor %': medians['Margem Graham %'].to_numpy(),
+    }, index=df.index)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Setor e segmento das empresas")
+    parser.add_argument('--refresh', action='store_true', help="atualiza a tabela se estiver desatualizada")
+    parser.add_argument('--max-age', type=float, default=METADATA_TTL, help="segundos desde a última atualização")
+    parser.add_argument('--workers', type=int, default=METADATA_WORKERS, help="requisições simultâneas")
+    args = parser.parse_args(argv)
+
+    if args.refresh:
+        fetched = refresh(args.max_age, [t for p in core.load_portfolios().values() for t in p], args.workers)
+        if fetched is None:
+            print("Tabela de metadados já está atualizada.")
+    table = load_table()
+    print(f"{len(table)} ativos, {table['setor'].nunique()} setores, "
+          f"{table['segmento'].nunique()} segmentos em {metadata_path()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Opt-in sampling profiler for API requests.
+
+Enabled per request by an admin (see api/index.py): a background thread samples
+the Python stacks of every thread running this app's code (frames from files
+under ROOT_DIR) every PROFILE_INTERVAL seconds. Each sample is classified as
+upstream network time (sockets, HTTP clients), compute (pandas/NumPy/pyarrow)
+or other Python, and the result is kept as folded stacks, which flamegraph.pl
+and speedscope render as a flame graph, plus a per-function summary.
+
+Samples from other requests running at the same time are included too, so
+profile on a quiet instance when possible.
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')  # unset: profiling disabled
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+PROFILES_KEPT = 32
+
+# Matched against frame file paths, from the innermost frame outwards
+NETWORK_PATHS = ('socket.py', 'ssl.py', 'http/client.py', 'urllib/request.py', 'selectors.py',
+                 '/urllib3/', '/requests/', '/requests_cache/', '/curl_cffi/', '/httpx/', '/httpcore/')
+COMPUTE_PATHS = ('/pandas/', '/numpy/', '/pyarrow/', '/scipy/')
+CATEGORIES = ('network', 'compute', 'other')
+
+# Longest first, so site-packages wins over the stdlib directory that contains it
+_PREFIXES = sorted({p + os.sep for p in sysconfig.get_paths().values()} | {ROOT_DIR + os.sep}, key=len, reverse=True)
+_EXCLUDED = (os.path.join(ROOT_DIR, 'profiling.py'), os.path.join(ROOT_DIR, 'benchmarks') + os.sep)
+
+def _is_app_frame(filename):
+    return filename.startswith(ROOT_DIR) and not filename.startswith(_EXCLUDED)
+
+def _label(code):
+    filename = code.co_filename
+    for prefix in _PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+def _classify(codes):
+    # codes are innermost first; the first library frame decides
+    for code in codes:
+        filename = code.co_filename.replace(os.sep, '/')
+        if any(p in filename for p in NETWORK_PATHS):
+            return 'network'
+        if any(p in filename for p in COMPUTE_PATHS):
+            return 'compute'
+    return 'other'
+
+class SamplingProfiler:
+    """
+    Samples stacks that pass through the app's code until stop() is called.
+    Each stack is weighted by the wall time since the previous sample.
+    """
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()  # (category, innermost-first code tuple) -> seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                codes = []
+                in_app = False
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    in_app = in_app or _is_app_frame(frame.f_code.co_filename)
+                    frame = frame.f_back
+                if in_app:
+                    self.stacks[(_classify(codes), tuple(codes))] += weight
+
+    def folded(self):
+        """
+        Folded stacks ("outer;...;inner milliseconds"), rooted at the category.
+        """
+        lines = Counter()
+        for (category, codes), seconds in self.stacks.items():
+            lines[';'.join([category] + [_label(c) for c in reversed(codes)])] += seconds
+        return '\n'.join(f"{stack} {round(seconds * 1000)}" for stack, seconds in lines.most_common())
+
+    def summary(self, top=25):
+        """
+        Time per category and the functions with the most self/total time, in ms.
+        """
+        categories = dict.fromkeys(CATEGORIES, 0.0)
+        own, total = Counter(), Counter()
+        for (category, codes), seconds in self.stacks.items():
+            categories[category] += seconds
+            own[_label(codes[0])] += seconds
+            for label in {_label(c) for c in codes}:
+                total[label] += seconds
+        ms = lambda s: round(s * 1000, 2)
+        return {
+            "duration_ms": ms(self.duration),
+            "sampled_ms": ms(sum(categories.values())),
+            "categories_ms": {k: ms(v) for k, v in categories.items()},
+            "self_ms": [{"function": f, "ms": ms(s)} for f, s in own.most_common(top)],
+            "total_ms": [{"function": f, "ms": ms(s)} for f, s in total.most_common(top)],
+        }
+
+_lock = threading.Lock()
+_profiles = OrderedDict()  # id -> stored profile
+
+def store(profiler, method, path):
+    """
+    Keeps the profile of a request (last PROFILES_KEPT) and returns its id.
+    """
+    profile_id = uuid.uuid4().hex[:12]
+    profile = {
+        "id": profile_id,
+        "method": method,
+        "path": path,
+        "created_at": time.time(),
+        **profiler.summary(),
+        "folded": profiler.folded(),
+    }
+    with _lock:
+        _profiles[profile_id] = profile
+        while len(_profiles) > PROFILES_KEPT:
+            _profiles.popitem(last=False)
+    return profile_id
+
+def get_profile(profile_id):
+    with _lock:
+        return _profiles.get(profile_id)
+
+def list_profiles():
+    with _lock:
+        return [{k: p[k] for k in ("id", "method", "path", "created_at", "duration_ms", "categories_ms")}
+                for p in reversed(_profiles.values())]
+
+def server_timing(profiler):
+    """
+    Server-Timing header value: network/compute/other sampled time and the total.
+    """
+    summary = profiler.summary(top=0)
+    parts = [f"{k};dur={v}" for k, v in summary["categories_ms"].items()]
+    return ', '.join(parts + [f"total;dur={summary['duration_ms']}"])
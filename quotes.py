@@ -0,0 +1,161 @@
+"""
+Live quote push for open dashboards.
+
+One QuoteHub per process reads quotes for the union of all subscribed tickers
+once per interval, recomputes the valuation rows of the tickers whose price
+moved, and fans the rows out to every subscriber that follows them. Quotes come
+from the intraday store (intraday.latest_quotes), fed by the shared poller, so
+upstream cost grows with the number of distinct tickers, not with connected users.
+"""
+import asyncio
+import itertools
+import threading
+import time
+
+import pandas as pd
+
+import core
+import intraday
+
+QUOTE_INTERVAL = intraday.QUOTE_INTERVAL  # seconds
+UNKNOWN_TTL = 3600  # seconds before a ticker that had no data is looked up again
+
+
+class Subscriber:
+    def __init__(self, sub_id, tickers):
+        self.id = sub_id
+        self.tickers = set(tickers)
+        self.queue = asyncio.Queue(maxsize=16)
+
+    def push(self, rows):
+        # A slow client only ever needs the latest rows; drop the oldest batch
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(rows)
+
+
+class QuoteHub:
+    def __init__(self, interval=QUOTE_INTERVAL):
+        self.interval = interval
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._task = None
+        self._lock = threading.Lock()
+        # Subscribers change on the event loop and are read from worker threads
+        self._subscribers_lock = threading.Lock()
+        # Market rows (without valuation) for every ticker being followed
+        self._base = pd.DataFrame()
+        self._base_version = None
+        self._unknown = {}  # ticker without data -> when to look it up again
+
+    def subscribers(self):
+        with self._subscribers_lock:
+            return list(self._subscribers.values())
+
+    def tracked_tickers(self):
+        tickers = set()
+        for sub in self.subscribers():
+            tickers |= sub.tickers
+        return tickers
+
+    async def subscribe(self, tickers):
+        sub = Subscriber(next(self._ids), tickers)
+        with self._subscribers_lock:
+            self._subscribers[sub.id] = sub
+        await asyncio.to_thread(self._ensure_base, sub.tickers)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._subscribers_lock:
+            self._subscribers.pop(sub.id, None)
+            empty = not self._subscribers
+        self._prune_base(self.tracked_tickers())
+        if empty and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _prune_base(self, tickers):
+        # Rows of tickers no subscriber follows anymore are dropped
+        with self._lock:
+            gone = self._base.index.difference(list(tickers))
+            if len(gone):
+                self._base = self._base.drop(gone)
+
+    def _ensure_base(self, tickers, rebuild=False):
+        """
+        Loads snapshot rows (or Yahoo rows for tickers outside Fundamentus) for
+        tickers not yet followed; with `rebuild`, reloads `tickers` and drops every
+        other row. Returns the tickers that were (re)loaded.
+        """
+        with self._lock:
+            frame, version = core.get_market_snapshot()
+            if rebuild:
+                self._base = pd.DataFrame()
+            now = time.time()
+            self._unknown = {t: retry for t, retry in self._unknown.items() if retry > now}
+            missing = [t for t in tickers if t not in self._base.index and t not in self._unknown]
+            if not missing:
+                return []
+
+            rows = frame.take(missing)
+            outside = [t for t in missing if t not in frame]
+            if outside:
+                df_yf = core.fetch_yf_data(outside)
+                if not df_yf.empty:
+                    rows = pd.concat([rows, core.MarketFrame.from_frame(df_yf, 'yahoo').to_frame()], axis=0)
+                self._unknown.update((t, now + UNKNOWN_TTL) for t in set(outside) - set(rows.index))
+            self._base = pd.concat([self._base, rows], axis=0)
+            self._base_version = version
+            return list(rows.index)
+
+    def _poll_once(self):
+        """
+        Reads quotes for all followed tickers and returns the valued rows that changed.
+        """
+        tickers = self.tracked_tickers()
+        if not tickers:
+            return pd.DataFrame()
+
+        # Snapshot refreshed since the rows were loaded: every row may have changed
+        _, version = core.get_market_snapshot()
+        # A subscriber that left during the last poll may have had rows loaded again
+        self._prune_base(tickers)
+        reloaded = []
+        if version != self._base_version:
+            reloaded = self._ensure_base(tickers, rebuild=True)
+        else:
+            self._ensure_base(tickers)
+
+        # Streamed tickers are shown live: keep them polled into the intraday store
+        intraday.track(tickers)
+        quotes = intraday.latest_quotes(sorted(tickers))
+        with self._lock:
+            base = self._base
+            moved = [t for t, p in quotes.items() if t in base.index and base.at[t, 'cotacao'] != p]
+            for t in moved:
+                base.at[t, 'cotacao'] = quotes[t]
+            changed = sorted(set(moved) | set(reloaded))
+            if not changed:
+                return pd.DataFrame()
+            return core.valuation_table(base.loc[changed].fillna(0))
+
+    def _fan_out(self, rows):
+        for sub in self.subscribers():
+            mine = rows[rows.index.isin(sub.tickers)]
+            if not mine.empty:
+                sub.push(core.table_records(mine))
+
+    async def _run(self):
+        while self.subscribers():
+            try:
+                rows = await asyncio.to_thread(self._poll_once)
+                if not rows.empty:
+                    self._fan_out(rows)
+            except Exception as e:
+                print(f"Erro ao atualizar cotações: {e}")
+            await asyncio.sleep(self.interval)
+
+
+hub = QuoteHub()
@@ -0,0 +1,308 @@
+"""
+Bulk report export for every saved portfolio.
+
+    python reports.py --out reports/ --format xlsx --workers 8
+
+The market table and the 5-year price/indicator history are computed once for
+the union of all portfolio tickers, in chunks of CHUNK_SIZE tickers (one batched
+price download per chunk, statements fetched in a thread pool, indicators built
+in core's process pool) and one report is written per portfolio:
+  - xlsx: <out>/<portfolio>.xlsx with sheets "Valuation" and "Histórico";
+  - parquet: <out>/<portfolio>/valuation.parquet and historico.parquet.
+Portfolio names that slug to the same file name get a numeric suffix.
+
+Portfolios are written as soon as all their tickers are ready, with streaming
+writers (openpyxl write-only mode, one Parquet row group per ticker), and a
+ticker's history is released once every portfolio that holds it is written.
+Prices downloaded for the export are not kept in core's history store, so
+memory stays flat as the number of portfolios grows.
+
+The API runs exports as background jobs (start_export): the zip is kept for
+REPORT_JOB_TTL seconds after the job finishes.
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import core
+
+HISTORY_COLUMNS = ['Fechamento', 'Preço Justo (Graham)', 'Preço Teto (6%)']
+CHUNK_SIZE = 64
+REPORT_JOB_TTL = 3600  # seconds a finished export is kept for download
+
+_lock = threading.Lock()
+_jobs = {}  # job id -> job (see start_export)
+
+def portfolio_tickers(portfolios):
+    """
+    Normalized tickers per portfolio and their union, in first-seen order.
+    """
+    normalized = {name: list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+                  for name, tickers in portfolios.items()}
+    union = list(dict.fromkeys(t for tickers in normalized.values() for t in tickers))
+    return normalized, union
+
+def ticker_history(ticker, indicators, hist=None):
+    """
+    Daily close plus the Graham and Barsi indicator lines (from
+    core.get_historical_financials) for `ticker`, indexed by date. `hist` is
+    its price history when already fetched.
+    """
+    if hist is None:
+        hist = core.get_price_history(ticker)
+    if hist.empty:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    df = pd.DataFrame({'Fechamento': hist['Close']}, index=hist.index)
+    if not indicators.empty:
+        df = df.join(indicators)
+    df = df.reindex(columns=HISTORY_COLUMNS)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df.index.name = 'Data'
+    return df.astype(np.float64).round(4)
+
+def _file_name(name):
+    return re.sub(r'[^\w\-]+', '_', name).strip('_') or 'carteira'
+
+def file_names(names):
+    """
+    A distinct file name per portfolio name: its slug, plus a numeric suffix when
+    an earlier name took it ("a b" and "a_b" -> a_b and a_b_2). Compared
+    case-insensitively, for case-insensitive file systems.
+    """
+    taken, result = set(), {}
+    for name in names:
+        base = candidate = _file_name(name)
+        n = 2
+        while candidate.lower() in taken:
+            candidate = f"{base}_{n}"
+            n += 1
+        taken.add(candidate.lower())
+        result[name] = candidate
+    return result
+
+def _cell(value):
+    # openpyxl has no NaN
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+class XlsxReportWriter:
+    """
+    One workbook per portfolio, written row by row (openpyxl write-only mode).
+    """
+    def __init__(self, out_dir, file_name):
+        from openpyxl import Workbook
+
+        self.path = os.path.join(out_dir, f"{file_name}.xlsx")
+        self.workbook = Workbook(write_only=True)
+        self.valuation = self.workbook.create_sheet('Valuation')
+        self.history = self.workbook.create_sheet('Histórico')
+        self.history.append(['Data', 'Ativo'] + HISTORY_COLUMNS)
+
+    def write_table(self, table):
+        self.valuation.append(['Ativo'] + list(table.columns))
+        for ticker, row in zip(table.index, table.itertuples(index=False)):
+            self.valuation.append([ticker] + [_cell(v) for v in row])
+
+    def write_history(self, ticker, history):
+        for date, row in zip(history.index.to_pydatetime(), history.itertuples(index=False)):
+            self.history.append([date, ticker] + [_cell(v) for v in row])
+
+    def close(self):
+        self.workbook.save(self.path)
+        return self.path
+
+class ParquetReportWriter:
+    """
+    One directory per portfolio; the history file gets one row group per ticker.
+    """
+    def __init__(self, out_dir, file_name):
+        self.path = os.path.join(out_dir, file_name)
+        os.makedirs(self.path, exist_ok=True)
+        self._history_writer = None
+
+    def write_table(self, table):
+        table.rename_axis('Ativo').reset_index().to_parquet(
+            os.path.join(self.path, 'valuation.parquet'), compression='zstd', index=False)
+
+    def write_history(self, ticker, history):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = history.reset_index()
+        df.insert(1, 'Ativo', ticker)
+        batch = pa.Table.from_pandas(df, preserve_index=False)
+        if self._history_writer is None:
+            self._history_writer = pq.ParquetWriter(os.path.join(self.path, 'historico.parquet'),
+                                                    batch.schema, compression='zstd')
+        self._history_writer.write_table(batch.cast(self._history_writer.schema))
+
+    def close(self):
+        if self._history_writer is not None:
+            self._history_writer.close()
+        return self.path
+
+WRITERS = {'xlsx': XlsxReportWriter, 'parquet': ParquetReportWriter}
+
+def export_reports(out_dir, fmt='xlsx', portfolios=None, workers=8, processes=None):
+    """
+    Writes one report per portfolio into `out_dir`. Returns the list of paths.
+    `workers` threads fetch from Yahoo; `processes` build indicators
+    (default core.INDICATOR_WORKERS).
+    """
+    writer_cls = WRITERS[fmt]
+    if portfolios is None:
+        portfolios = core.load_portfolios()
+    normalized, union = portfolio_tickers(portfolios)
+    if not union:
+        return []
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Market table once for the union: one snapshot read, one Yahoo fallback batch
+    market = core.get_market_data(union)
+    table = core.valuation_table(market) if not market.empty else pd.DataFrame()
+    names = file_names(normalized)
+
+    # How many unwritten portfolios still need each ticker
+    pending = {name: set(tickers) for name, tickers in normalized.items()}
+    refcount = Counter(t for tickers in normalized.values() for t in tickers)
+    histories = {}
+    paths = []
+
+    def write(name):
+        writer = writer_cls(out_dir, names[name])
+        tickers = normalized[name]
+        writer.write_table(table.reindex([t for t in tickers if t in table.index]))
+        for t in tickers:
+            if not histories[t].empty:
+                writer.write_history(t, histories[t])
+            refcount[t] -= 1
+            if refcount[t] == 0:
+                del histories[t]
+        paths.append(writer.close())
+        print(f"Relatório '{name}' salvo em {paths[-1]}")
+
+    for name in [n for n, tickers in pending.items() if not tickers]:
+        del pending[name]
+        write(name)
+
+    for i in range(0, len(union), CHUNK_SIZE):
+        chunk = union[i:i + CHUNK_SIZE]
+        # One download per chunk, not kept in the history store (read once here)
+        prices = core.get_price_histories(chunk, store=False)
+        prices = {t: prices.get(t, pd.DataFrame()) for t in chunk}
+        indicators = core.get_historical_financials_many(chunk, processes, fetch_workers=workers,
+                                                         histories=prices)
+        for t in chunk:
+            try:
+                histories[t] = ticker_history(t, indicators[t], prices[t])
+            except Exception as e:
+                print(f"Erro ao calcular histórico de {t}: {e}")
+                histories[t] = pd.DataFrame(columns=HISTORY_COLUMNS)
+        del indicators, prices
+
+        ready = []
+        for name, waiting in pending.items():
+            waiting.difference_update(chunk)
+            if not waiting:
+                ready.append(name)
+        for name in ready:
+            del pending[name]
+            write(name)
+    return paths
+
+def _public(job):
+    return {k: job[k] for k in ('id', 'format', 'status', 'error', 'started_at', 'finished_at')}
+
+def _prune_jobs():
+    # Finished jobs past REPORT_JOB_TTL are dropped with their files
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if job['finished_at'] is not None and now - job['finished_at'] > REPORT_JOB_TTL:
+            del _jobs[job_id]
+            shutil.rmtree(job['dir'], ignore_errors=True)
+
+def _run_job(job):
+    out_dir = os.path.join(job['dir'], 'relatorios')
+    result = {'status': 'done', 'error': None, 'zip': None}
+    try:
+        if export_reports(out_dir, job['format']):
+            result['zip'] = shutil.make_archive(out_dir, 'zip', out_dir)
+        else:
+            result['status'] = 'empty'
+        shutil.rmtree(out_dir, ignore_errors=True)
+    except Exception as e:
+        print(f"Erro ao exportar relatórios: {e}")
+        result.update(status='failed', error=str(e))
+    with _lock:
+        job.update(result, finished_at=time.time())
+
+def start_export(fmt='xlsx'):
+    """
+    Starts exporting every saved portfolio into a zip, in a background thread
+    (inline on serverless runtimes, where threads don't outlive the request).
+    An export of the same format still running is reused. Returns the job:
+    id, format, status ('running', 'done', 'empty' without portfolios, or
+    'failed' with its error), started_at and finished_at.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Formato inválido: {fmt}")
+    with _lock:
+        _prune_jobs()
+        for job in _jobs.values():
+            if job['format'] == fmt and job['status'] == 'running':
+                return _public(job)
+        job = {'id': uuid.uuid4().hex[:12], 'format': fmt, 'status': 'running', 'error': None,
+               'started_at': time.time(), 'finished_at': None, 'zip': None,
+               'dir': tempfile.mkdtemp(prefix='reports_', dir=core.TEMP_DIR)}
+        _jobs[job['id']] = job
+    if core.SERVERLESS:
+        _run_job(job)
+    else:
+        threading.Thread(target=_run_job, args=(job,), name='reports', daemon=True).start()
+    return job_status(job['id'])
+
+def job_status(job_id):
+    """
+    The export job `job_id` (see start_export), or None when unknown or expired.
+    """
+    with _lock:
+        _prune_jobs()
+        job = _jobs.get(job_id)
+        return _public(job) if job is not None else None
+
+def job_file(job_id):
+    """
+    Path of the zip of a finished export, or None.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        return job['zip'] if job is not None else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta um relatório por carteira salva")
+    parser.add_argument('--out', default='reports')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='xlsx')
+    parser.add_argument('--workers', type=int, default=8, help="threads fetching from Yahoo")
+    parser.add_argument('--processes', type=int, default=None, help="processes building indicators")
+    args = parser.parse_args(argv)
+
+    paths = export_reports(args.out, args.format, workers=args.workers, processes=args.processes)
+    if not paths:
+        print("Nenhuma carteira salva.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
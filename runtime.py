@@ -0,0 +1,75 @@
+"""
+Process setup shared by the entry points: the API (api/index.py), the
+Streamlit app (app.py), the benchmarks and the tests.
+
+The data modules keep their files under BASE_DIR/data unless told otherwise
+(SNAPSHOT_ARCHIVE_DIR, DIVIDEND_DB, METADATA_FILE, ALERTS_FILE and core's
+TABLE_VERSIONS_DB, read when they are imported) and nothing is hooked into core by importing them: install()
+registers the snapshot listeners, the valuation extensions and the quote
+source, so the API and the app build the same table.
+
+Offline runs call isolate(data_dir) before importing any data module, to keep
+every data file in `data_dir` and turn the background refreshes and the
+intraday poller off.
+"""
+import os
+import threading
+
+# Data file settings -> name under the isolated data directory
+DATA_FILES = {
+    'SNAPSHOT_ARCHIVE_DIR': 'snapshots',
+    'DIVIDEND_DB': 'dividends.sqlite',
+    'METADATA_FILE': 'metadata.parquet',
+    'ALERTS_FILE': 'alerts.json',
+    'TABLE_VERSIONS_DB': 'table_versions.sqlite',
+}
+# Background work turned off by isolate(): dividend and sector refreshes, the quote poller
+BACKGROUND_SWITCHES = ['DIVIDEND_AUTO_REFRESH', 'METADATA_AUTO_REFRESH', 'INTRADAY_POLL']
+
+_lock = threading.Lock()
+_state = {'installed': False}
+
+def isolate(data_dir, override=False):
+    """
+    Points every data file at `data_dir` and turns background work off, through
+    the environment. Settings already in the environment are kept unless
+    `override`. Must run before the data modules are imported.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    settings = {name: os.path.join(data_dir, file) for name, file in DATA_FILES.items()}
+    settings.update({name: '0' for name in BACKGROUND_SWITCHES})
+    for name, value in settings.items():
+        if override:
+            os.environ[name] = value
+        else:
+            os.environ.setdefault(name, value)
+    return data_dir
+
+def install():
+    """
+    Hooks the data modules into core, once per process: intraday quotes for the
+    table's 'cotacao', the dividend and sector valuation columns, and the
+    snapshot listeners (daily archive, dividend and sector refreshes, alerts).
+    """
+    import alerts
+    import archive
+    import core
+    import dividends
+    import intraday
+    import metadata
+
+    with _lock:
+        if _state['installed']:
+            return
+        _state['installed'] = True
+    core.set_quote_source(intraday.latest_quotes, intraday.store.record)
+    core.add_valuation_extension(dividends.valuation_columns, dividends.valuation_version)
+    core.add_valuation_extension(metadata.valuation_columns, metadata.valuation_version)
+    # One Fundamentus snapshot a day for as-of queries
+    core.add_snapshot_listener(archive.archive_current_snapshot)
+    # Keep the dividend store current for the projection columns
+    core.add_snapshot_listener(dividends.refresh_in_background)
+    # Sector medians for the new snapshot, and the sector/segment table when stale
+    core.add_snapshot_listener(metadata.on_snapshot)
+    # Alert rules are checked against every new snapshot
+    core.add_snapshot_listener(alerts.evaluate_in_background)
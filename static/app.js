@@ -2,8 +2,11 @@ const API_BASE = '/api';
 
 // State
 let currentData = [];
+let currentVersion = null; // ETag of currentData, used for conditional/delta refreshes
+let currentKey = null;     // tickers currentData was loaded for
 let currentAsset = null;
 let portfolios = {};
+let quoteStream = null;    // EventSource with live price updates for currentKey
 
 // DOM Elements
 const portfolioSelect = document.getElementById('portfolioSelect');
@@ -12,11 +15,15 @@ const tableHeader = document.getElementById('tableHeader');
 const tableBody = document.getElementById('tableBody');
 const assetSelect = document.getElementById('assetSelect');
 const indicatorSelect = document.getElementById('indicatorSelect');
+const chartModeSelect = document.getElementById('chartModeSelect');
 const statusBar = document.getElementById('statusBar');
+const tickerSuggestions = document.getElementById('tickerSuggestions');
 
 // Initialization
 document.addEventListener('DOMContentLoaded', () => {
     fetchPortfolios();
+    manualTickers.addEventListener('input', scheduleSuggestions);
+    manualTickers.addEventListener('blur', () => setTimeout(clearSuggestions, 150));
 });
 
 function setStatus(msg) {
@@ -53,20 +60,87 @@ async function fetchAndRender(tickers) {
 
     setStatus('Carregando dados...');
     try {
-        const params = new URLSearchParams({ tickers: tickers.join(',') });
-        const res = await fetch(`${API_BASE}/tickers?${params}`);
+        const key = tickers.join(',');
+        const params = new URLSearchParams({ tickers: key });
+        const headers = {};
+        // Same table as on screen: ask only for what changed since our version
+        if (key === currentKey && currentVersion) {
+            params.set('since', currentVersion);
+            headers['If-None-Match'] = `"${currentVersion}"`;
+        }
+
+        const res = await fetch(`${API_BASE}/tickers?${params}`, { headers });
+        if (res.status === 304) {
+            setStatus('Dados já atualizados.');
+            return;
+        }
         if (!res.ok) throw new Error('Falha na API');
 
-        currentData = await res.json();
+        const data = await res.json();
+        if (Array.isArray(data)) {
+            currentData = data;
+        } else if (data.delta) {
+            applyDelta(data);
+        }
+        currentVersion = (res.headers.get('ETag') || '').replace(/"/g, '') || null;
+        currentKey = key;
+
         renderTable();
         updateAssetSelect();
-        setStatus('Dados carregados com sucesso.');
+        openQuoteStream(currentData.map(d => d.ticker));
+        setStatus('Dados carregados com sucesso.' + tickerNotes(res.headers));
     } catch (e) {
         setStatus('Erro ao buscar dados.');
         console.error(e);
     }
 }
 
+function tickerNotes(headers) {
+    // Typed tickers the API corrected or ignored (see universe.resolve)
+    let notes = '';
+    const corrections = headers.get('X-Ticker-Corrections');
+    const rejected = headers.get('X-Ticker-Rejected');
+    const suggestions = headers.get('X-Ticker-Suggestions');
+    if (corrections) notes += ` Corrigidos: ${corrections.replace(/=/g, ' → ').replace(/,/g, ', ')}.`;
+    if (rejected) notes += ` Ignorados (desconhecidos): ${rejected.replace(/,/g, ', ')}.`;
+    if (suggestions) notes += ` Você quis dizer: ${suggestions.replace(/=/g, ' → ').replace(/\|/g, ' ou ').replace(/,/g, '; ')}?`;
+    return notes;
+}
+
+function applyDelta(delta) {
+    // Patch currentData in place: replace changed rows, append new ones, drop removed
+    const position = new Map(currentData.map((row, i) => [row.ticker, i]));
+    delta.rows.forEach(row => {
+        if (position.has(row.ticker)) currentData[position.get(row.ticker)] = row;
+        else currentData.push(row);
+    });
+    if (delta.removed.length) {
+        const removed = new Set(delta.removed);
+        for (let i = currentData.length - 1; i >= 0; i--) {
+            if (removed.has(currentData[i].ticker)) currentData.splice(i, 1);
+        }
+    }
+}
+
+function openQuoteStream(tickers) {
+    if (quoteStream) quoteStream.close();
+    quoteStream = null;
+    if (!tickers.length || !window.EventSource) return;
+
+    const params = new URLSearchParams({ tickers: tickers.join(',') });
+    quoteStream = new EventSource(`${API_BASE}/stream?${params}`);
+    quoteStream.addEventListener('quotes', (event) => {
+        const rows = JSON.parse(event.data);
+        applyDelta({ rows, removed: [] });
+        renderTable();
+        if (rows.some(r => r.ticker === currentAsset)) {
+            updateDetails();
+            // The intraday chart gains a bar with every new price
+            if (chartModeSelect.value === 'intraday') updateChart();
+        }
+    });
+}
+
 async function handleManualSearch() {
     // Clear others
     portfolioSelect.value = "";
@@ -78,10 +152,58 @@ async function handleManualSearch() {
         return;
     }
 
+    clearSuggestions();
     const tickers = manual.split(',').map(s => s.trim().toUpperCase()).filter(s => s);
     fetchAndRender([...new Set(tickers)]);
 }
 
+// Ticker autocomplete for the manual input: completes the token being typed
+let suggestTimer = null;
+let suggestSeq = 0;
+
+function scheduleSuggestions() {
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(fetchSuggestions, 120);
+}
+
+function clearSuggestions() {
+    tickerSuggestions.innerHTML = '';
+}
+
+async function fetchSuggestions() {
+    const token = manualTickers.value.split(',').pop().trim().toUpperCase();
+    if (!token) {
+        clearSuggestions();
+        return;
+    }
+
+    const seq = ++suggestSeq;
+    try {
+        const res = await fetch(`${API_BASE}/tickers/search?${new URLSearchParams({ q: token, limit: 8 })}`);
+        if (!res.ok || seq !== suggestSeq) return; // a newer keystroke already asked
+        const items = await res.json();
+        clearSuggestions();
+        items.filter(item => item.ticker !== token).forEach(item => {
+            const btn = document.createElement('button');
+            btn.type = 'button';
+            btn.className = 'suggestion';
+            btn.textContent = item.ticker;
+            btn.title = item.tipo;
+            btn.addEventListener('mousedown', (e) => {
+                e.preventDefault(); // keep focus in the textarea
+                const parts = manualTickers.value.split(',');
+                parts[parts.length - 1] = (parts.length > 1 ? ' ' : '') + item.ticker;
+                manualTickers.value = parts.join(',') + ', ';
+                clearSuggestions();
+                manualTickers.focus();
+            });
+            tickerSuggestions.appendChild(btn);
+        });
+    } catch (e) {
+        console.error(e);
+    }
+}
+
 async function handlePortfolioLoad() {
     // Clear others
     manualTickers.value = "";
@@ -198,19 +320,29 @@ async function deletePortfolio() {
 // Rendering
 const COLUMNS = {
     'ticker': 'Ativo',
+    'Setor': 'Setor',
     'cotacao': 'Preço',
     'Preço Justo (Graham)': 'Graham',
     'Margem Graham %': 'Mg. Graham %',
     'Preço Teto (6%)': 'Teto (6%)',
     'Margem Barsi %': 'Mg. Barsi %',
     'dy': 'DY',
+    'DY Proj. 12m %': 'DY Proj. 12m',
+    'Preço Teto Proj. (6%)': 'Teto Proj. (6%)',
+    'Cresc. Div. %': 'Cresc. Div.',
+    'Regularidade Div. %': 'Regul. Div.',
     'pl': 'P/L',
+    'P/L Setor': 'P/L Setor',
     'pvp': 'P/VP',
+    'P/VP Setor': 'P/VP Setor',
+    'DY Setor %': 'DY Setor',
+    'Margem Graham Setor %': 'Mg. Graham Setor',
     'c5y': 'Cres',
     'ev_ebitda': 'EV/EBITDA',
     'return_on_equity': 'Return on Equity (ROE)'
 
 };
+const TEXT_COLUMNS = ['ticker', 'Setor', 'Segmento'];
 
 function renderTable() {
     tableHeader.innerHTML = '';
@@ -233,7 +365,7 @@ function renderTable() {
             const td = document.createElement('td');
             let val = row[key];
 
-            if (key === 'ticker') {
+            if (TEXT_COLUMNS.includes(key)) {
                 val = val || '-';
             } else {
                 // Convert to number if it's a string (e.g. "10,50")
@@ -247,7 +379,7 @@ function renderTable() {
                 // Formatting
                 if (num !== null && !isNaN(num) && typeof num === 'number') {
                     // Prioritize explicit BRL columns
-                    if (['cotacao', 'Preço Justo (Graham)', 'Preço Teto (6%)'].includes(key)) {
+                    if (['cotacao', 'Preço Justo (Graham)', 'Preço Teto (6%)', 'Preço Teto Proj. (6%)'].includes(key)) {
                         val = num.toLocaleString('pt-BR', { style: 'currency', currency: 'BRL' });
                     } else if (key.includes('%') || key === 'dy') {
                         if (key === 'dy') val = (num * 100).toFixed(2) + '%';
@@ -305,14 +437,14 @@ function updateDetails() {
     for (const [key, label] of Object.entries(COLUMNS)) {
         let val = row[key];
 
-        if (key === 'ticker') {
+        if (TEXT_COLUMNS.includes(key)) {
             val = val || '-';
         } else {
             let num = val;
             if (typeof val === 'string') num = parseFloat(val.replace(',', '.'));
 
             if (num !== null && !isNaN(num) && typeof num === 'number') {
-                if (['cotacao', 'Preço Justo (Graham)', 'Preço Teto (6%)'].includes(key)) {
+                if (['cotacao', 'Preço Justo (Graham)', 'Preço Teto (6%)', 'Preço Teto Proj. (6%)'].includes(key)) {
                     val = num.toLocaleString('pt-BR', { style: 'currency', currency: 'BRL' });
                 } else if (key.includes('%') || key === 'dy') {
                     if (key === 'dy') val = (num * 100).toFixed(2) + '%';
@@ -350,8 +482,15 @@ async function updateChart() {
     try {
         let url = `${API_BASE}/history/${currentAsset}?indicator=${encodeURIComponent(indicator)}`;
         if (indVal) url += `&indicator_value=${indVal}`;
+        url += `&mode=${chartModeSelect.value}`;
 
         const res = await fetch(url);
+        if (res.status === 404 && chartModeSelect.value === 'intraday') {
+            // The ticker is followed from now on; bars show up after the next quote poll
+            Plotly.purge('chartDiv');
+            setStatus(`Aguardando cotações intradiárias de ${currentAsset}...`);
+            return;
+        }
         if (!res.ok) throw new Error('Erro no gráfico');
 
         const data = await res.json();
@@ -0,0 +1,49 @@
+"""
+Shared test setup: every data file lives in a temp directory, background
+refreshes and the intraday poller are off, and the upstream is replayed from
+synthetic fixtures (benchmarks.fixtures), so nothing touches the network.
+"""
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import runtime
+
+DATA_DIR = runtime.isolate(tempfile.mkdtemp(prefix='dashboard_tests_'), override=True)
+
+import pytest
+
+import core
+from benchmarks.fixtures import load_fixtures
+from benchmarks.replay import replay
+
+runtime.install()
+core.ACTIVE_PORTFOLIO_FILE = os.path.join(DATA_DIR, 'portfolios.json')
+with open(core.ACTIVE_PORTFOLIO_FILE, 'w') as f:
+    f.write('{}')
+
+
+@pytest.fixture(scope='session')
+def fixtures():
+    return load_fixtures(os.path.join(DATA_DIR, 'fixtures'))
+
+
+@pytest.fixture
+def upstream(fixtures):
+    """
+    Replays the fixtures; yields the Counter of upstream calls made.
+    """
+    with replay(fixtures) as calls:
+        yield calls
+
+
+@pytest.fixture(scope='session')
+def client():
+    from fastapi.testclient import TestClient
+    import api.index
+
+    return TestClient(api.index.app)
@@ -0,0 +1,87 @@
+import threading
+
+import numpy as np
+import pytest
+
+import alerts
+import core
+
+
+def _rule(rule_id, op, value, column='cotacao', ticker='AAAA3'):
+    return {'id': rule_id, 'ticker': ticker, 'portfolio': None, 'column': column,
+            'op': op, 'value': value, 'ref': None}
+
+
+def _step(compiled, price):
+    events, state = alerts.find_events(compiled, np.array([[price, 1.0]]))
+    compiled.state = state
+    return events
+
+
+def test_comparison_fires_only_when_it_turns_true():
+    compiled = alerts.CompiledRules([_rule('r1', '<', 10.0)], {}, ['AAAA3'], ['cotacao', 'dy'])
+
+    assert [e['rule_id'] for e in _step(compiled, 5.0)] == ['r1']
+    assert _step(compiled, 4.0) == []
+    assert _step(compiled, 15.0) == []
+    assert [e['value'] for e in _step(compiled, 9.0)] == [9.0]
+
+
+def test_crossing_needs_a_known_side_and_keeps_it_on_the_line():
+    compiled = alerts.CompiledRules([_rule('r1', 'crosses', 10.0)], {}, ['AAAA3'], ['cotacao', 'dy'])
+
+    assert _step(compiled, 8.0) == []          # first sighting only sets the side
+    assert _step(compiled, 10.0) == []         # on the line: still below
+    assert [e['direction'] for e in _step(compiled, 12.0)] == ['up']
+    assert [e['direction'] for e in _step(compiled, 7.0)] == ['down']
+    assert _step(compiled, np.nan) == []       # missing data changes nothing
+    assert _step(compiled, 6.0) == []
+
+
+def test_rule_on_a_column_reference():
+    rule = {**_rule('r1', '>', None), 'ref': 'dy'}
+    compiled = alerts.CompiledRules([rule], {}, ['AAAA3'], ['cotacao', 'dy'])
+    events = _step(compiled, 2.0)
+    assert events[0]['reference'] == 1.0
+
+
+@pytest.fixture
+def rules(upstream):
+    core.get_market_snapshot()
+    # The snapshot listener may still be evaluating in the background
+    for thread in threading.enumerate():
+        if thread.name == 'alerts':
+            thread.join()
+    yield
+    for rule in alerts.list_rules():
+        alerts.delete_rule(rule['id'])
+
+
+def test_rules_on_tickers_outside_fundamentus_fire(rules):
+    success, rule = alerts.add_rule({'ticker': 'MXRF11', 'column': 'cotacao', 'op': '>', 'value': 0})
+    assert success
+
+    events = alerts.evaluate()
+    assert [(e['rule_id'], e['ticker']) for e in events] == [(rule['id'], 'MXRF11')]
+    assert alerts.evaluate() == []
+
+
+def test_add_rule_validates_operator_and_threshold(rules):
+    assert not alerts.add_rule({'column': 'dy', 'op': '=', 'value': 1})[0]
+    assert not alerts.add_rule({'column': 'dy', 'op': '>', 'value': 1, 'ref': 'pl'})[0]
+    assert not alerts.add_rule({'column': 'nope', 'op': '>', 'value': 1})[0]
+
+
+def test_add_rule_validates_columns_and_portfolio_without_a_snapshot(monkeypatch, tmp_path):
+    core.invalidate_market_snapshot()
+    monkeypatch.setattr(core, 'ACTIVE_PORTFOLIO_FILE', str(tmp_path / 'portfolios.json'))
+    core.save_portfolio('dividendos', ['TAEE11'])
+    monkeypatch.setattr(alerts, '_save_store', lambda: None)
+    monkeypatch.setitem(alerts._state, 'store', {'rules': [], 'state': {}})
+
+    assert 'Margem Barsi %' in alerts.known_columns()
+    assert 'DY Setor %' in alerts.known_columns()
+    assert not alerts.add_rule({'column': 'nope', 'op': '>', 'value': 1})[0]
+    assert not alerts.add_rule({'column': 'dy', 'op': '>', 'ref': 'nope'})[0]
+    assert not alerts.add_rule({'portfolio': 'outra', 'column': 'dy', 'op': '>', 'value': 0.08})[0]
+    assert alerts.add_rule({'portfolio': 'dividendos', 'column': 'DY Setor %', 'op': '>', 'value': 8})[0]
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+import core
+
+
+@pytest.fixture(scope='module')
+def prices():
+    rng = np.random.default_rng(7)
+    drift = np.array([0.0008, 0.0002, 0.0005, -0.0003, 0.0004, 0.0001])
+    returns = rng.normal(drift, 0.015, (756, len(drift)))
+    columns = ['AAAA3', 'BBBB4', 'CCCC3', 'DDDD3', 'EEEE11', 'FFFF3']
+    return pd.DataFrame(np.exp(np.cumsum(returns, axis=0)) * 20, columns=columns,
+                        index=pd.bdate_range(end='2026-01-02', periods=756))
+
+
+def test_project_simplex_lands_on_the_simplex():
+    rng = np.random.default_rng(0)
+    v = rng.normal(0, 2, (50, 8))
+    w = analytics.project_simplex(v)
+    assert np.all(w >= 0)
+    assert np.allclose(w.sum(axis=1), 1)
+    # Points already on the simplex stay where they are
+    assert np.allclose(analytics.project_simplex(w), w)
+
+
+def test_solver_matches_the_closed_form_when_it_is_long_only():
+    cov = np.diag([0.04, 0.09, 0.16])
+    w = analytics.solve_mean_variance(cov, np.zeros((1, 3)), iterations=5000, tolerance=1e-12)[0]
+    expected = (1 / np.diag(cov)) / (1 / np.diag(cov)).sum()
+    assert np.allclose(w, expected, atol=1e-6)
+    assert np.allclose(analytics.min_variance_weights(cov), expected)
+
+
+def test_min_variance_is_long_only_when_the_closed_form_shorts():
+    # Two highly correlated assets: the unconstrained solution shorts the riskier one
+    cov = np.array([[0.04, 0.058], [0.058, 0.09]])
+    w = analytics.min_variance_weights(cov)
+    assert np.all(w >= 0) and np.isclose(w.sum(), 1)
+    assert np.allclose(w, [1, 0], atol=1e-6)
+
+
+def test_report_weights_are_long_only_and_fully_invested(prices):
+    report = analytics.optimize_report(prices, list(prices.columns) + ['GONE3'])
+    assert report['missing'] == ['GONE3']
+    for name, portfolio in report['portfolios'].items():
+        weights = np.array(list(portfolio['weights'].values()))
+        assert np.all(weights >= 0), name
+        assert abs(weights.sum() - 1) < 1e-3, name
+
+    sharpe = {name: p['sharpe'] for name, p in report['portfolios'].items()}
+    vol = {name: p['volatility'] for name, p in report['portfolios'].items()}
+    assert sharpe['max_sharpe'] >= max(sharpe['min_variance'], sharpe['equal_weight']) - 1e-9
+    assert vol['min_variance'] <= min(vol['max_sharpe'], vol['equal_weight']) + 1e-9
+    frontier_vol = [p['volatility'] for p in report['frontier']]
+    assert frontier_vol == sorted(frontier_vol)
+
+
+def test_valuation_tilt_moves_weight_towards_cheap_assets(prices):
+    tickers = list(prices.columns)
+    scores = [0, 0, 0, 0, 0, 1.0]
+    report = analytics.optimize_report(prices, tickers, scores=scores, tilt=0.5)
+    tilted = report['portfolios']['valuation_tilted']['weights']['FFFF3']
+    plain = report['portfolios']['max_sharpe']['weights']['FFFF3']
+    assert tilted > plain
+
+
+def test_report_without_enough_history():
+    prices = pd.DataFrame({'AAAA3': [10.0]}, index=pd.bdate_range(end='2026-01-02', periods=1))
+    report = analytics.optimize_report(prices, ['AAAA3'])
+    assert report['tickers'] == [] and 'portfolios' not in report
+
+
+def test_risk_report_of_a_benchmark_copy(prices):
+    # An asset that is the benchmark itself has beta and correlation 1
+    with_benchmark = prices.assign(**{analytics.BENCHMARK: prices['AAAA3']})
+    report = analytics.risk_report(with_benchmark, ['AAAA3', 'BBBB4', 'GONE3'])
+
+    assert report['tickers'] == ['AAAA3', 'BBBB4']
+    assert report['missing'] == ['GONE3']
+    assert report['beta']['AAAA3'] == pytest.approx(1)
+    assert report['correlation']['matrix'][0][0] == pytest.approx(1)
+    assert report['max_drawdown']['AAAA3'] < 0
+    daily = prices['AAAA3'].pct_change().std()
+    assert report['volatility']['AAAA3'] == pytest.approx(daily * np.sqrt(analytics.TRADING_DAYS))
+
+
+def test_portfolio_risk_is_recomputed_when_histories_reload(upstream):
+    analytics._risk_cache.clear()
+    first = analytics.portfolio_risk('carteira', ['PETR4', 'VALE3'])
+    assert analytics.portfolio_risk('carteira', ['PETR4', 'VALE3']) is first
+
+    core.clear_price_history()
+    assert analytics.portfolio_risk('carteira', ['PETR4', 'VALE3']) is not first
+
+
+def test_incomplete_risk_reports_are_not_cached(upstream):
+    analytics._risk_cache.clear()
+    report = analytics.portfolio_risk('carteira', ['PETR4', 'NOPE3'])
+
+    assert report['missing'] == ['NOPE3']
+    assert analytics._risk_cache == {}
+
+
+def test_optimizer_without_valuation_scores_says_so(upstream, monkeypatch, capsys):
+    def fail(tickers):
+        raise RuntimeError("snapshot indisponível")
+    monkeypatch.setattr(analytics, 'valuation_scores', fail)
+    analytics._optimize_cache.clear()
+    report = analytics.portfolio_optimize('carteira', ['PETR4', 'VALE3'])
+
+    assert report['valuation_scores'] is None
+    assert 'snapshot indisponível' in capsys.readouterr().out
+    assert analytics._optimize_cache == {}
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+pytest.importorskip('streamlit')
+from streamlit.testing.v1 import AppTest
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+
+def _app():
+    at = AppTest.from_file(APP_FILE, default_timeout=60)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def test_multiselect_offers_funds_and_etfs(upstream):
+    options = _app().sidebar.multiselect[0].options
+
+    assert 'PETR4' in options
+    assert 'HGLG11' in options
+    assert 'BOVA11' in options
+
+
+def test_app_shows_funds_with_the_extension_columns(upstream):
+    # Same hooks as the API (runtime.install): the dividend projection is in the table
+    at = _app()
+    at.sidebar.multiselect[0].select('PETR4').select('HGLG11').run()
+    assert not at.exception
+
+    table = at.dataframe[0].value
+    assert sorted(table.columns) == ['HGLG11', 'PETR4']
+    assert 'DY Proj. 12m %' in table.index
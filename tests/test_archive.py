@@ -0,0 +1,82 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import archive
+import core
+import dividends
+import metadata
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(archive._state, 'dir', str(tmp_path / 'snapshots'))
+    return archive._state['dir']
+
+
+def _archive_day(day, rows):
+    df = pd.DataFrame(rows).T.rename_axis('papel')
+    archive.archive_snapshot(core.MarketFrame.from_frame(df, 'fundamentus'), day)
+
+
+def test_as_of_dividend_projection_ignores_later_events(client, archive_dir):
+    _archive_day(datetime.date(2024, 6, 3), {'DIVX3': {'cotacao': 10.0}})
+    dividends.ingest('DIVX3', pd.Series([0.5, 0.7], index=pd.to_datetime(['2024-03-01', '2025-03-01'])))
+
+    res = client.get('/api/tickers', params={'tickers': 'DIVX3', 'as_of': '2024-06-05'})
+
+    assert res.status_code == 200
+    assert res.headers['X-Snapshot-Date'] == '2024-06-03'
+    # Only the 2024-03-01 event had gone ex by then
+    assert res.json()[0]['DY Proj. 12m %'] == pytest.approx(5.0)
+
+
+def test_as_of_sector_medians_come_from_the_archived_day(client, archive_dir, monkeypatch):
+    table = pd.DataFrame({'papel': ['SECA3', 'SECB3', 'SECC3'], 'setor': 'Setor X', 'segmento': 'Seg X',
+                          'atualizado_em': 0.0})
+    monkeypatch.setattr(metadata, 'load_table', lambda: table.copy())
+    _archive_day(datetime.date(2024, 6, 3), {
+        t: {'cotacao': 10.0, 'pl': pl, 'pvp': 1.0, 'liq2m': 1e6, 'dy': 0.05}
+        for t, pl in [('SECA3', 4.0), ('SECB3', 6.0), ('SECC3', 11.0)]
+    })
+
+    res = client.get('/api/tickers', params={'tickers': 'SECA3', 'as_of': '2024-06-03'})
+
+    row = res.json()[0]
+    assert row['Setor'] == 'Setor X'
+    assert row['P/L Setor'] == pytest.approx(6.0)
+    assert row['DY Setor %'] == pytest.approx(5.0)
+
+
+def test_portfolio_funds_are_archived(client, upstream, archive_dir, monkeypatch, tmp_path):
+    monkeypatch.setattr(core, 'ACTIVE_PORTFOLIO_FILE', str(tmp_path / 'portfolios.json'))
+    core.save_portfolio('fundos', ['MXRF11', 'PETR4'])
+    frame, _ = core.get_market_snapshot()
+
+    archive.archive_current_snapshot(frame)
+    archived, day = archive.load_snapshot(archive.today())
+
+    assert day == archive.today()
+    assert archived.source_of('MXRF11') == 'yahoo'
+    assert len(archived) == len(frame) + 1
+    res = client.get('/api/tickers', params={'tickers': 'MXRF11', 'as_of': day.isoformat()})
+    assert [row['ticker'] for row in res.json()] == ['MXRF11']
+    assert 'X-Ticker-Rejected' not in res.headers
+
+
+def test_table_version_depends_on_the_as_of_day():
+    df = pd.DataFrame({'cotacao': [1.0]}, index=pd.Index(['AAAA3'], name='papel'))
+
+    versions = {core.table_version(df), core.table_version(df, datetime.date(2024, 6, 3)),
+                core.table_version(df, datetime.date(2024, 6, 4))}
+    assert len(versions) == 3
+
+
+def test_today_is_the_b3_day(monkeypatch):
+    # 01:30 UTC is still the previous day in São Paulo
+    now = pd.Timestamp('2025-01-02 01:30', tz='UTC')
+    monkeypatch.setattr(archive.pd.Timestamp, 'now', lambda tz=None: now.tz_convert(tz))
+
+    assert archive.today() == datetime.date(2025, 1, 1)
@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import api.index
+import assets
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / 'app.js').write_text("console.log('painel');\n" * 200)
+    (tmp_path / 'style.css').write_text("body { margin: 0; }\n")
+    (tmp_path / 'index.html').write_text('<link href="style.css"><script src="app.js"></script>')
+    return tmp_path
+
+
+def test_bundle_hashes_names_and_rewrites_the_index(static_dir):
+    bundle = assets.AssetBundle(str(static_dir))
+    body = (static_dir / 'app.js').read_bytes()
+    hashed = f"app.{hashlib.sha256(body).hexdigest()[:10]}.js"
+
+    assert bundle.urls['app.js'] == hashed
+    asset = bundle.get(hashed)
+    assert asset.cache_control == assets.IMMUTABLE
+    assert gzip.decompress(asset.encodings['gzip']) == body
+    if assets.brotli is not None:
+        assert assets.brotli.decompress(asset.encodings['br']) == body
+    html = bundle.get('').encodings['identity'].decode()
+    assert f'src="{hashed}"' in html and f'href="{bundle.urls["style.css"]}"' in html
+    assert bundle.get('index.html').cache_control == 'no-cache'
+
+
+def test_pick_follows_accept_encoding(static_dir):
+    asset = assets.AssetBundle(str(static_dir)).get('')
+    assert asset.pick('gzip, deflate, br')[0] == ('br' if assets.brotli is not None else 'gzip')
+    assert asset.pick('gzip;q=1.0')[0] == 'gzip'
+    assert asset.pick('')[0] == 'identity'
+
+
+def test_hashed_assets_are_served_precompressed_and_immutable(client):
+    name, asset = next((n, a) for n, a in api.index.bundle.assets.items() if n.startswith('app.'))
+    body = asset.encodings['identity']
+
+    for encoding in [e for e in ('br', 'gzip') if e in asset.encodings]:
+        res = client.get(f'/{name}', headers={'Accept-Encoding': encoding})
+        assert res.headers['Content-Encoding'] == encoding
+        assert res.content == body
+        assert res.headers['Cache-Control'] == assets.IMMUTABLE
+    res = client.get(f'/{name}', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in res.headers and res.content == body
+    assert client.get(f'/{name}', headers={'If-None-Match': asset.etag}).status_code == 304
+
+
+def test_index_is_revalidated_and_points_at_hashed_names(client):
+    res = client.get('/')
+    assert res.headers['Cache-Control'] == 'no-cache'
+    for hashed in api.index.bundle.urls.values():
+        assert hashed in res.text
+
+
+def test_compression_leaves_server_sent_events_alone():
+    app = FastAPI()
+    api.index.add_compression(app)
+    events = "event: quotes\ndata: {}\n\n" * 200
+
+    @app.get('/api/stream')
+    def stream():
+        return StreamingResponse(iter([events]), media_type='text/event-stream')
+
+    @app.get('/api/big')
+    def big():
+        return JSONResponse({'rows': ['x' * 40] * 100})
+
+    client = TestClient(app)
+    assert client.get('/api/big', headers={'Accept-Encoding': 'br, gzip'}).headers['Content-Encoding'] in ('br', 'gzip')
+    res = client.get('/api/stream', headers={'Accept-Encoding': 'br, gzip'})
+    assert 'Content-Encoding' not in res.headers
+    assert res.text == events
@@ -0,0 +1,24 @@
+import json
+import os
+
+from benchmarks import fixtures as fixture_sets
+from benchmarks.run import compare
+from conftest import DATA_DIR
+
+BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'baseline.json')
+
+
+def test_committed_baseline_matches_the_synthesized_fixtures(fixtures):
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    assert baseline['fixtures'] == fixture_sets.digest(os.path.join(DATA_DIR, 'fixtures'))
+
+
+def test_more_upstream_calls_is_a_regression_on_any_machine():
+    baseline = {'case': {'median': 0.010, 'upstream_calls': 1.0, 'repeat': 5}}
+    slower = {'case': {'median': 0.020, 'upstream_calls': 1.0, 'repeat': 5}}
+    chattier = {'case': {'median': 0.010, 'upstream_calls': 2.0, 'repeat': 5}}
+
+    assert compare(slower, baseline, 0.25) == ['case']
+    assert compare(slower, baseline, 0.25, calls_only=True) == []
+    assert compare(chattier, baseline, 0.25, calls_only=True) == ['case']
@@ -0,0 +1,40 @@
+import sqlite3
+
+import pandas as pd
+import yfinance as yf
+
+import dividends
+
+
+def test_projections_see_events_written_by_another_process(monkeypatch):
+    dividends.ingest('TEST3', pd.Series([1.0], index=pd.to_datetime([pd.Timestamp.today().normalize()])))
+    before = dividends.projections()
+    assert before.loc['TEST3', 'ttm'] == 1.0
+
+    # Another process (e.g. `dividends.py --refresh`) writes straight to the database
+    conn = sqlite3.connect(dividends.db_path())
+    with conn:
+        conn.execute("INSERT INTO dividend_events (ticker, ex_date, amount) VALUES ('OTHR3', ?, 2.0)",
+                     (pd.Timestamp.today().strftime('%Y-%m-%d'),))
+    conn.close()
+
+    # Seen once the store version is checked again, without a query per call before that
+    assert 'OTHR3' not in dividends.projections().index
+    monkeypatch.setattr(dividends, 'STORE_VERSION_CHECK', 0)
+    assert dividends.projections().loc['OTHR3', 'ttm'] == 2.0
+
+
+def test_projections_are_cached_while_the_store_is_unchanged():
+    assert dividends.projections() is dividends.projections()
+
+
+
+def test_refresh_only_marks_answered_tickers_synced(upstream, monkeypatch):
+    # PETR4 has history in the fixtures; Yahoo returns nothing for NOPE3
+    dividends.refresh(['PETR4', 'NOPE3'], max_age=0)
+    assert set(dividends.sync_times(['PETR4', 'NOPE3'])) == {'PETR4'}
+
+    # A failed batch download (yfinance returns an empty frame) marks nothing synced
+    monkeypatch.setattr(yf, 'download', lambda *args, **kwargs: pd.DataFrame())
+    dividends.refresh(['VALE3'], max_age=0)
+    assert dividends.sync_times(['VALE3']) == {}
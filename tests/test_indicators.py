@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import core
+from benchmarks.fixtures import PORTFOLIO_STOCKS
+from benchmarks.replay import replay
+
+
+@pytest.fixture(scope='module')
+def inputs(fixtures):
+    with replay(fixtures):
+        inputs = {t: core.fetch_financial_inputs(t) for t in PORTFOLIO_STOCKS[:4]}
+    return {t: args for t, args in inputs.items() if args is not None}
+
+
+def _assert_same(results, inputs):
+    assert set(results) == set(inputs)
+    for t, args in inputs.items():
+        expected = core.build_indicators(*args)
+        assert list(results[t].columns) == list(expected.columns), t
+        assert results[t].index.equals(expected.index), t
+        assert np.allclose(results[t].to_numpy(), expected.to_numpy(), equal_nan=True), t
+
+
+def test_builds_in_process_by_default(inputs):
+    assert core.INDICATOR_WORKERS == 1
+    assert core.get_indicator_executor() is None
+    _assert_same(core.build_indicators_many(inputs), inputs)
+
+
+def test_small_batches_skip_the_pool(inputs, monkeypatch):
+    monkeypatch.setattr(core, 'get_indicator_executor', lambda workers=None: pytest.fail("pool started"))
+    core.build_indicators_many(inputs, workers=2)
+
+
+def test_pool_and_shared_memory_match_in_process(inputs, monkeypatch):
+    monkeypatch.setattr(core, 'INDICATOR_POOL_MIN_TICKERS', 2)
+    try:
+        assert core.get_indicator_executor(2) is not None
+        _assert_same(core.build_indicators_many(inputs, workers=2), inputs)
+    finally:
+        core.shutdown_indicator_executor()
@@ -0,0 +1,132 @@
+import time
+
+import pandas as pd
+import pytest
+
+import core
+import intraday
+import universe
+
+
+@pytest.fixture(autouse=True)
+def clean_store():
+    intraday.store.clear()
+    intraday._state['tracked'].clear()
+    yield
+    intraday.store.clear()
+    intraday._state['tracked'].clear()
+
+
+def test_ring_buffer_keeps_the_last_bars_in_order():
+    buffer = intraday.RingBuffer(capacity=3)
+    for minute in range(5):
+        buffer.record(10.0 + minute, minute * 60)
+
+    bars = buffer.frame()
+    assert buffer.count == 3
+    assert bars['close'].tolist() == [12.0, 13.0, 14.0]
+    assert bars.index.is_monotonic_increasing
+    assert buffer.times.nbytes + buffer.bars.nbytes == 3 * 40
+
+
+def test_ring_buffer_aggregates_a_minute_and_skips_flat_ones():
+    buffer = intraday.RingBuffer(capacity=4)
+    for price, at in [(10.0, 0), (12.0, 20), (9.0, 40), (11.0, 50)]:
+        buffer.record(price, at)
+    buffer.record(11.0, 60)   # unchanged: no new bar
+    buffer.record(5.0, 30)    # older than the last bar: ignored
+
+    bars = buffer.frame()
+    assert len(bars) == 1
+    assert bars.iloc[0].tolist() == [10.0, 12.0, 9.0, 11.0]
+    assert buffer.last() == (11.0, 60)
+
+
+def test_ring_buffer_fills_flat_trading_minutes():
+    opening = pd.Timestamp('2026-10-19 10:00', tz=intraday.TIMEZONE).timestamp()
+    buffer = intraday.RingBuffer(capacity=8)
+    buffer.record(10.0, opening)
+    buffer.record(11.0, opening + 180)
+    buffer.record(11.0, opening + 300)  # unchanged: stored as the same bar
+
+    bars = buffer.frame()
+    assert buffer.count == 2
+    assert bars.index.strftime('%H:%M').tolist() == ['10:00', '10:01', '10:02', '10:03', '10:04', '10:05']
+    assert bars['close'].tolist() == [10.0, 10.0, 10.0, 11.0, 11.0, 11.0]
+    assert bars.iloc[1].tolist() == [10.0] * 4
+
+
+def test_ring_buffer_does_not_fill_a_closed_market():
+    closing = pd.Timestamp('2026-10-16 17:59', tz=intraday.TIMEZONE).timestamp()  # a Friday
+    buffer = intraday.RingBuffer(capacity=1000)
+    buffer.record(10.0, closing)
+    buffer.record(10.0, closing + 3 * 86400)  # Monday night
+
+    days = buffer.frame().index.strftime('%a').unique().tolist()
+    assert days == ['Fri', 'Mon']
+    assert len(buffer.frame()) == 1 + (intraday.TRADING_HOURS[1] - intraday.TRADING_HOURS[0])
+
+
+def test_store_evicts_the_ticker_updated_longest_ago():
+    store = intraday.IntradayStore(capacity=2, max_tickers=2)
+    store.record({'AAAA3': 1.0, 'BBBB3': 2.0}, at=0)
+    store.record({'AAAA3': 1.5}, at=60)
+    store.record({'CCCC3': 3.0}, at=120)
+
+    assert store.bars('BBBB3').empty
+    assert store.latest(['AAAA3', 'CCCC3'], max_age=float('inf')) == {'AAAA3': 1.5, 'CCCC3': 3.0}
+
+
+def test_tracked_tickers_are_capped(monkeypatch):
+    monkeypatch.setattr(intraday, 'INTRADAY_MAX_TICKERS', 3)
+    intraday.track(['AAAA3', 'BBBB3', 'CCCC3'])
+    intraday.track(['AAAA3'])
+    intraday.track(['DDDD3'])
+
+    assert intraday.tracked_tickers() == ['AAAA3', 'CCCC3', 'DDDD3']
+
+
+def test_table_quotes_do_not_track(upstream):
+    core.get_market_data(['PETR4', 'VALE3'])
+    assert intraday.tracked_tickers() == []
+    assert set(intraday.store.latest(['PETR4', 'VALE3'])) == {'PETR4', 'VALE3'}
+
+
+def test_intraday_history_refuses_unknown_tickers(client, upstream):
+    core.get_market_snapshot()
+    res = client.get('/api/history/FAKE9', params={'mode': 'intraday'})
+    assert res.status_code == 404
+    assert intraday.tracked_tickers() == []
+
+
+def test_intraday_history_loads_the_snapshot_on_a_cold_process(client, upstream):
+    core.invalidate_market_snapshot()
+    universe._state.update(index=None, version=None)
+    intraday.store.record({'VALE3': 60.0})
+
+    res = client.get('/api/history/VALE3', params={'mode': 'intraday'})
+    assert res.status_code == 200
+    assert res.json()['prices'] == [60.0]
+
+
+def test_intraday_history_serves_the_store_only(client, upstream):
+    core.get_market_snapshot()
+    assert client.get('/api/history/PETR4', params={'mode': 'intraday'}).status_code == 404
+    assert intraday.tracked_tickers() == ['PETR4']
+
+    intraday.store.record({'PETR4': 30.0}, at=0)
+    intraday.store.record({'PETR4': 31.0}, at=60)
+    calls = sum(upstream.values())
+    res = client.get('/api/history/PETR4', params={'mode': 'intraday'})
+    assert res.status_code == 200
+    assert res.json()['prices'] == [30.0, 31.0]
+    assert sum(upstream.values()) == calls
+
+
+def test_table_says_how_old_its_quotes_are(client, upstream):
+    intraday.store.record({'PETR4': 30.0}, at=time.time() - 90)
+    res = client.get('/api/tickers', params={'tickers': 'PETR4'})
+
+    assert res.headers['X-Quotes-As-Of'] < pd.Timestamp.now(tz='UTC').isoformat()
+    max_age = int(res.headers['Cache-Control'].split('max-age=')[1])
+    assert max_age <= intraday.FRESHNESS - 90
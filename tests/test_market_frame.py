@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+import archive
+import core
+
+
+def _frame(fixtures):
+    df = core._normalize_resultado(fixtures['resultado'].copy())
+    return df, core.MarketFrame.from_frame(df, 'fundamentus')
+
+
+def test_amounts_keep_full_precision(fixtures):
+    df, frame = _frame(fixtures)
+    rows = frame.to_frame()
+    assert (rows['patrliq'] == df['patrliq'].astype(float)).all()
+    assert (rows['liq2m'] == df['liq2m'].astype(float)).all()
+    assert np.allclose(rows['pl'], df['pl'], rtol=1e-6)
+
+
+def test_take_skips_unknown_and_overlong_symbols(fixtures):
+    _, frame = _frame(fixtures)
+    first, second = frame.tickers[:2]
+    rows = frame.take([second, 'NOPE3', first, second, first + 'XXXXXXXXXX'])
+    assert list(rows.index) == [second, first]
+    assert first in frame and 'NOPE3' not in frame
+    assert frame.source_of(first) == 'fundamentus'
+
+
+def test_empty_frame():
+    frame = core.MarketFrame(np.empty((0, len(core.MARKET_COLUMNS))), [], pd.Categorical([]))
+    assert len(frame) == 0 and 'PETR4' not in frame
+    assert frame.take(['PETR4']).empty
+
+
+def test_smaller_than_the_dataframe(fixtures):
+    df, frame = _frame(fixtures)
+    assert frame.memory_usage() < 0.8 * df.memory_usage(deep=True).sum()
+
+
+def test_archive_round_trip_keeps_amounts(fixtures, tmp_path):
+    _, frame = _frame(fixtures)
+    day = pd.Timestamp('2024-05-02').date()
+    archive.archive_snapshot(frame, day, base_dir=str(tmp_path))
+    restored = archive.read_snapshot(day, base_dir=str(tmp_path))
+    assert restored.version == frame.version
+    pd.testing.assert_frame_equal(restored.to_frame(), frame.to_frame())
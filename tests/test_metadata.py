@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import core
+import metadata
+from benchmarks.replay import ReplayMetadataUpstream
+
+
+class FailingSector(ReplayMetadataUpstream):
+    def sector_tickers(self, sector_id):
+        if sector_id == 3:
+            raise ConnectionError("timeout")
+        return super().sector_tickers(sector_id)
+
+
+@pytest.fixture
+def sectors(fixtures, upstream):
+    frame, _ = core.get_market_snapshot()
+    replayed = ReplayMetadataUpstream(frame.tickers)
+    previous = metadata.set_upstream(replayed)
+    metadata.refresh(max_age=-1)
+    yield replayed
+    metadata.set_upstream(previous)
+
+
+def test_failed_sector_pages_keep_their_stored_rows(sectors):
+    before = metadata.load_table().set_index('papel')
+    in_sector_3 = before.index[before['setor'] == 'Setor 3']
+    assert len(in_sector_3)
+
+    metadata.set_upstream(FailingSector(list(before.index)))
+    metadata.refresh(max_age=-1)
+
+    after = metadata.load_table().set_index('papel')
+    assert after.index.equals(before.index)
+    assert (after.loc[in_sector_3, 'setor'] == 'Setor 3').all()
+    # Kept rows keep their refresh time, so the table is refreshed again soon
+    assert (after.loc[in_sector_3, 'atualizado_em'] == before.loc[in_sector_3, 'atualizado_em']).all()
+    assert after['atualizado_em'].max() > before['atualizado_em'].max()
+
+
+def test_sector_aggregates_use_traded_valued_rows():
+    market = pd.DataFrame({
+        'cotacao': [10.0, 20.0, 30.0, 5.0, 8.0],
+        'pl': [5.0, 15.0, -3.0, 10.0, 4.0],
+        'pvp': [1.0, 2.0, 1.5, 1.0, 0.5],
+        'dy': [0.04, 0.06, 0.0, 0.1, 0.02],
+        'liq2m': [1e6, 1e6, 1e6, 0.0, 1e6],
+        'lpa': [2.0, 1.3, -10.0, 0.5, 2.0],
+        'vpa': [10.0, 10.0, 20.0, 5.0, 16.0],
+    }, index=['AAAA3', 'AAAB3', 'AAAC3', 'BBBB3', 'BBBC3'])
+    table = pd.DataFrame({'papel': market.index, 'setor': ['A', 'A', 'A', 'B', 'B'],
+                          'segmento': ['A1'] * 5, 'atualizado_em': 0.0})
+
+    result = metadata.sector_aggregates(market, table)
+    assert result.loc['A', 'P/L'] == 10.0  # AAAC3 loses money: no P/L median for it
+    assert result.loc['A', 'DY %'] == pytest.approx(4.0)
+    assert result.loc['A', 'Ativos'] == 3
+    assert result.loc['B', 'Ativos'] == 1  # BBBB3 doesn't trade
+    assert result.loc['B', 'P/L'] == 4.0
+
+
+def test_valuation_columns_compare_against_the_sector(sectors):
+    df = core.get_market_data(['PETR4', 'VALE3'])
+    columns = metadata.valuation_columns(df)
+    medians = metadata.aggregates()['setor']
+    table = metadata.load_table().set_index('papel')
+
+    for t in ['PETR4', 'VALE3']:
+        setor = table.loc[t, 'setor']
+        assert columns.loc[t, 'Setor'] == setor
+        assert columns.loc[t, 'P/L Setor'] == medians.loc[setor, 'P/L']
+
+
+def test_sectors_route(client, sectors):
+    body = client.get('/api/sectors').json()
+    medians = metadata.aggregates()['setor']
+
+    assert [row['setor'] for row in body] == list(medians.index)
+    assert all(isinstance(row['Ativos'], int) for row in body)
+    assert sum(row['Ativos'] for row in body) == medians['Ativos'].sum()
+    assert client.get('/api/sectors', params={'level': 'segmento'}).json()[0].keys() >= {'segmento', 'P/L'}
@@ -0,0 +1,18 @@
+import pytest
+
+import profiling
+
+
+@pytest.mark.parametrize('token', ['sécret', 'x' * 8, ''])
+def test_wrong_or_non_ascii_profile_token_is_ignored(client, monkeypatch, token):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'segredo')
+    res = client.get('/api/portfolios', params={'profile': token})
+    assert res.status_code == 200
+    assert 'X-Profile-Id' not in res.headers
+
+
+def test_non_ascii_profile_token_is_accepted_when_it_matches(client, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'sécret')
+    res = client.get('/api/portfolios', params={'profile': 'sécret'})
+    assert res.status_code == 200
+    assert 'X-Profile-Id' in res.headers
@@ -0,0 +1,57 @@
+import asyncio
+
+import pandas as pd
+
+import core
+import quotes
+
+
+def test_tickers_without_data_are_retried_after_the_ttl(upstream, monkeypatch):
+    lookups = []
+
+    def fetch_yf_data(tickers):
+        lookups.append(list(tickers))
+        return pd.DataFrame()
+
+    monkeypatch.setattr(core, 'fetch_yf_data', fetch_yf_data)
+    hub = quotes.QuoteHub()
+    assert hub._ensure_base(['ZZZZ11']) == []
+    assert hub._ensure_base(['ZZZZ11']) == []
+    assert lookups == [['ZZZZ11']]           # blacklisted for UNKNOWN_TTL
+
+    hub._unknown['ZZZZ11'] = 0               # TTL elapsed
+    hub._ensure_base(['ZZZZ11'])
+    assert lookups == [['ZZZZ11'], ['ZZZZ11']]
+
+
+def test_subscribers_are_read_from_a_snapshot(upstream):
+    hub = quotes.QuoteHub()
+    core.get_market_snapshot()
+
+    async def scenario():
+        a = await hub.subscribe(['PETR4'])
+        b = await hub.subscribe(['VALE3', 'PETR4'])
+        subscribers = hub.subscribers()
+        hub.unsubscribe(a)
+        # The snapshot taken before is unaffected by the change
+        assert [s.id for s in subscribers] == [a.id, b.id]
+        assert hub.tracked_tickers() == {'VALE3', 'PETR4'}
+        hub.unsubscribe(b)
+        assert hub.tracked_tickers() == set()
+
+    asyncio.run(scenario())
+
+
+def test_rows_are_dropped_when_the_last_subscriber_leaves(upstream):
+    hub = quotes.QuoteHub()
+
+    async def scenario():
+        a = await hub.subscribe(['PETR4', 'VALE3'])
+        b = await hub.subscribe(['PETR4'])
+        assert sorted(hub._base.index) == ['PETR4', 'VALE3']
+        hub.unsubscribe(a)
+        assert list(hub._base.index) == ['PETR4']
+        hub.unsubscribe(b)
+        assert hub._base.empty
+
+    asyncio.run(scenario())
@@ -0,0 +1,50 @@
+import os
+import time
+
+import pytest
+
+import core
+import reports
+from benchmarks.fixtures import PORTFOLIO_FIIS, PORTFOLIO_STOCKS
+
+
+def test_file_names_are_unique():
+    names = reports.file_names(['a b', 'a_b', 'A-B', 'a/b', 'A_B', ''])
+
+    assert names == {'a b': 'a_b', 'a_b': 'a_b_2', 'A-B': 'A-B', 'a/b': 'a_b_3',
+                     'A_B': 'A_B_4', '': 'carteira'}
+
+
+def test_export_writes_every_portfolio_and_keeps_no_history(upstream, tmp_path):
+    pytest.importorskip('pyarrow')
+    core.clear_price_history()
+    portfolios = {'a b': PORTFOLIO_STOCKS[:3], 'a_b': PORTFOLIO_STOCKS[2:5] + PORTFOLIO_FIIS[:1]}
+
+    paths = reports.export_reports(str(tmp_path), 'parquet', portfolios)
+
+    assert sorted(os.path.basename(p) for p in paths) == ['a_b', 'a_b_2']
+    assert all(os.path.exists(os.path.join(p, 'historico.parquet')) for p in paths)
+    assert upstream['yahoo.download'] == 1
+    # Prices read for the export are not left in the history store
+    assert core.history_loaded_at(PORTFOLIO_STOCKS[:5]) == (None,) * 5
+
+
+def test_export_runs_as_a_job(client, upstream, monkeypatch, tmp_path):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(core, 'ACTIVE_PORTFOLIO_FILE', str(tmp_path / 'portfolios.json'))
+    core.save_portfolio('dividendos', PORTFOLIO_STOCKS[:2])
+
+    res = client.post('/api/reports', params={'format': 'parquet'})
+    assert res.status_code == 202
+    job_id = res.json()['id']
+    assert res.headers['Location'] == f"/api/reports/{job_id}"
+
+    deadline = time.time() + 30
+    while client.get(f'/api/reports/{job_id}').json()['status'] == 'running' and time.time() < deadline:
+        time.sleep(0.05)
+    assert client.get(f'/api/reports/{job_id}').json()['status'] == 'done'
+
+    res = client.get(f'/api/reports/{job_id}/download')
+    assert res.status_code == 200
+    assert res.headers['content-type'] == 'application/zip'
+    assert client.get('/api/reports/nope').status_code == 404
@@ -0,0 +1,34 @@
+import os
+
+import core
+import dividends
+import intraday
+import metadata
+import runtime
+
+
+def test_isolate_keeps_settings_already_in_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('DIVIDEND_DB', '/shared/dividends.sqlite')
+    for name in list(runtime.DATA_FILES) + runtime.BACKGROUND_SWITCHES:
+        if name != 'DIVIDEND_DB':
+            monkeypatch.delenv(name, raising=False)
+
+    runtime.isolate(str(tmp_path))
+
+    assert os.environ['DIVIDEND_DB'] == '/shared/dividends.sqlite'
+    assert os.environ['ALERTS_FILE'] == os.path.join(str(tmp_path), 'alerts.json')
+    assert os.environ['INTRADAY_POLL'] == '0'
+
+
+def test_install_wires_the_data_modules_once():
+    # conftest already installed: a second call registers nothing twice
+    extensions = list(core._valuation_extensions)
+    listeners = list(core._snapshot_listeners)
+
+    runtime.install()
+
+    assert core._valuation_extensions == extensions
+    assert core._snapshot_listeners == listeners
+    assert dividends.valuation_columns in extensions
+    assert metadata.valuation_columns in extensions
+    assert core._quote_source['fetch'] is intraday.latest_quotes
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+import core
+import intraday
+
+TICKERS = 'PETR4,VALE3,HGLG11'
+
+
+@pytest.fixture(autouse=True)
+def fresh_versions():
+    core._table_versions.clear()
+    intraday.store.clear()
+    yield
+    core._table_versions.clear()
+
+
+def test_not_modified_skips_the_upstream_and_the_valuation(client, upstream, monkeypatch):
+    first = client.get('/api/tickers', params={'tickers': TICKERS})
+    assert first.status_code == 200
+    calls = +upstream
+
+    def fail(df):
+        raise AssertionError("valuation_table called for a 304")
+    monkeypatch.setattr(core, 'valuation_table', fail)
+    res = client.get('/api/tickers', params={'tickers': TICKERS},
+                     headers={'If-None-Match': first.headers['ETag']})
+
+    assert res.status_code == 304
+    assert +upstream == calls
+
+
+def test_version_changes_with_a_price():
+    df = pd.DataFrame({'cotacao': [10.0, 20.0]}, index=['AAAA3', 'BBBB3'])
+    moved = df.copy()
+    moved.loc['BBBB3', 'cotacao'] = 21.0
+
+    assert core.table_version(df) == core.table_version(df.copy())
+    assert core.table_version(df) != core.table_version(moved)
+
+
+def test_delta_against_a_version_registered_by_another_worker():
+    old = pd.DataFrame({'cotacao': [10.0, 20.0, 5.0]}, index=['AAAA3', 'BBBB3', 'CCCC3'])
+    new = pd.DataFrame({'cotacao': [10.0, 21.0, 7.0]}, index=['AAAA3', 'BBBB3', 'DDDD3'])
+    core.register_table_version('old', old)
+    core.register_table_version('new', new)
+    # This process never served 'old': it is read from the shared store
+    del core._table_versions['old']
+
+    changed, removed = core.table_delta(new, 'new', 'old')
+    assert changed.index.tolist() == ['BBBB3', 'DDDD3']
+    assert removed == ['CCCC3']
+    assert core.table_delta(new, 'new', 'unknown') is None
+
+
+def test_since_returns_the_changed_rows(client, upstream):
+    first = client.get('/api/tickers', params={'tickers': TICKERS})
+    version = first.headers['ETag'].strip('"')
+    core._table_versions.clear()
+    intraday.store.record({'PETR4': 99.0})
+
+    res = client.get('/api/tickers', params={'tickers': TICKERS, 'since': version})
+    body = res.json()
+    assert body['delta'] is True
+    assert [row['ticker'] for row in body['rows']] == ['PETR4']
+    assert body['removed'] == []
@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import archive
+import core
+import universe
+
+
+def _archive_day(day, tickers):
+    values = np.ones((len(tickers), len(core.MARKET_COLUMNS)), dtype=np.float32)
+    sources = pd.Categorical(['fundamentus'] * len(tickers), categories=core.MARKET_SOURCES)
+    archive.archive_snapshot(core.MarketFrame(values, list(tickers), sources), day)
+
+
+def test_as_of_checks_tickers_against_the_archive(client, upstream):
+    # WEGE4 would be corrected to WEGE3 and OLDX3 rejected by today's universe
+    _archive_day(datetime.date(2025, 1, 2), ['WEGE4', 'OLDX3'])
+    res = client.get('/api/tickers', params={'tickers': 'WEGE4,OLDX3,NOPE3', 'as_of': '2025-01-02'})
+
+    assert res.status_code == 200
+    assert sorted(row['ticker'] for row in res.json()) == ['OLDX3', 'WEGE4']
+    assert 'X-Ticker-Corrections' not in res.headers
+    assert res.headers['X-Ticker-Rejected'] == 'NOPE3'
+    assert upstream['fundamentus.get_resultado'] == 0
+
+
+def test_resolve_never_downloads_the_snapshot(upstream):
+    core.invalidate_market_snapshot()
+    universe.resolve(['PETR4', 'VAEL3'])
+    assert upstream['fundamentus.get_resultado'] == 0
+
+
+def test_live_resolution_corrects_typos(upstream):
+    accepted, corrections, rejected = universe.resolve(['VALE3', 'VAEL3', 'XXXX'], load=True)
+    assert accepted == ['VALE3']
+    assert corrections == {'VAEL3': 'VALE3'}
+    assert rejected == ['XXXX']
+
+
+def test_corrects_only_unambiguous_typos():
+    index = universe.TickerIndex({'PETR4': 'acao', 'VALE3': 'acao', 'ITUB3': 'acao', 'ITUB4': 'acao'})
+
+    assert index.correction('VAEL3') == 'VALE3'
+    assert index.correction('PETR44') == 'PETR4'
+    # A listed class of a known company may just be missing from the snapshot
+    assert index.correction('PETR3') is None
+    # Two known symbols are as close
+    assert index.correction('ITUB') is None
+    assert index.close_matches('PETR3') == ['PETR4']
+
+
+def test_rejected_tickers_come_with_suggestions(client, upstream):
+    res = client.get('/api/tickers', params={'tickers': 'VALE3,VALE5'})
+
+    assert [row['ticker'] for row in res.json()] == ['VALE3']
+    assert res.headers['X-Ticker-Rejected'] == 'VALE5'
+    assert res.headers['X-Ticker-Suggestions'] == 'VALE5=VALE3'
+    assert 'X-Ticker-Corrections' not in res.headers
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import core
+
+
+def test_graham_and_barsi_prices_and_margins():
+    df = pd.DataFrame({
+        'cotacao': [20.0, 10.0, 10.0, 0.0],
+        'pl': [5.0, -4.0, 0.0, 5.0],
+        'pvp': [1.0, 1.0, 2.0, 1.0],
+        'dy': [0.09, 0.03, 0.0, 0.05],
+    }, index=['LUCR3', 'PREJ3', 'SEMP3', 'ZERO3'])
+    v = core.valuation_indicators(df)
+
+    assert list(v.columns) == core.VALUATION_COLUMNS
+    # LPA 4, VPA 20: sqrt(22.5 * 4 * 20) = 42.43; ceiling 0.09 * 20 / 0.06 = 30
+    assert v.loc['LUCR3', 'Preço Justo (Graham)'] == pytest.approx(np.sqrt(22.5 * 4 * 20))
+    assert v.loc['LUCR3', 'Margem Graham %'] == pytest.approx((np.sqrt(1800) / 20 - 1) * 100)
+    assert v.loc['LUCR3', 'Preço Teto (6%)'] == pytest.approx(30)
+    assert v.loc['LUCR3', 'Margem Barsi %'] == pytest.approx(50)
+    # Losses (negative LPA) and a missing P/L get no Graham price
+    assert v.loc['PREJ3', ['Preço Justo (Graham)', 'Margem Graham %']].tolist() == [0, 0]
+    assert v.loc['SEMP3', ['LPA', 'Preço Justo (Graham)']].tolist() == [0, 0]
+    assert v.loc['SEMP3', 'Margem Barsi %'] == -100
+    # No price, no margins
+    assert v.loc['ZERO3', ['Margem Graham %', 'Margem Barsi %']].tolist() == [0, 0]
+
+
+def test_valuation_table_appends_the_indicators(upstream):
+    df = core.get_market_data(['PETR4', 'VALE3'])
+    table = core.valuation_table(df)
+
+    assert table[core.VALUATION_COLUMNS].equals(core.valuation_indicators(df))
+    assert np.isfinite(table.select_dtypes('number').to_numpy()).all()
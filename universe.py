@@ -0,0 +1,223 @@
+"""
+Universe of known B3 tickers, for autocomplete and for validating typed symbols.
+
+Built from the Fundamentus snapshot (stocks and units), KNOWN_FIIS/KNOWN_ETFS
+(funds are not in the Fundamentus table) and saved portfolios, and kept as a
+sorted list so prefix lookups are two bisects. Typed symbols outside the
+universe are corrected when they are a clear typo of one known symbol, and
+otherwise rejected (with the close known ones as suggestions) before anything
+is sent to Yahoo.
+"""
+import bisect
+import difflib
+import re
+import threading
+from collections import defaultdict
+
+import core
+
+# 4 characters + share class: 3-8 for stocks, 11 for units/funds, 31-35/39 for BDRs
+TICKER_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{3}(\d{1,2})$')
+# Classes the universe doesn't cover exhaustively: unknown ones are checked on Yahoo
+UNLISTED_CLASSES = {'11', '31', '32', '33', '34', '35', '39'}
+# Every share class B3 lists
+LISTED_CLASSES = {'3', '4', '5', '6', '7', '8'} | UNLISTED_CLASSES
+
+KNOWN_FIIS = [
+    'ALZR11', 'BCFF11', 'BCRI11', 'BPML11', 'BRCO11', 'BTCI11', 'BTLG11', 'CPTS11',
+    'DEVA11', 'GARE11', 'GGRC11', 'HCTR11', 'HFOF11', 'HGBS11', 'HGCR11', 'HGLG11',
+    'HGPO11', 'HGRE11', 'HGRU11', 'HSML11', 'IRDM11', 'JSRE11', 'KNCA11', 'KNCR11',
+    'KNHY11', 'KNIP11', 'KNRI11', 'KNSC11', 'LVBI11', 'MCCI11', 'MXRF11', 'PVBI11',
+    'RBRF11', 'RBRP11', 'RBRR11', 'RBVA11', 'RECR11', 'RZAK11', 'RZTR11', 'SNAG11',
+    'TGAR11', 'TRXF11', 'TVRI11', 'VGHF11', 'VGIP11', 'VILG11', 'VINO11', 'VISC11',
+    'VRTA11', 'XPCI11', 'XPLG11', 'XPML11',
+]
+
+KNOWN_ETFS = [
+    'ACWI11', 'B5P211', 'BBSD11', 'BITH11', 'BOVA11', 'BOVB11', 'BOVV11', 'BRAX11',
+    'DEBB11', 'DIVO11', 'ECOO11', 'ETHE11', 'FIND11', 'FIXA11', 'GOLD11', 'HASH11',
+    'IMAB11', 'IRFM11', 'IVVB11', 'MATB11', 'NASD11', 'NTNS11', 'PIBB11', 'QBTC11',
+    'SMAL11', 'SPXI11', 'USDB11', 'XBOV11',
+]
+
+# Minimum difflib ratio to consider a known symbol close to a typed one: one
+# wrong, missing, extra or swapped character in a 5-6 character ticker
+# (VAEL3 -> VALE3, PETR44 -> PETR4)
+CORRECTION_CUTOFF = 0.8
+
+class TickerIndex:
+    """
+    Sorted ticker symbols with their kind ('acao', 'fii', 'etf', 'carteira', 'yahoo'),
+    plus a one-edit neighbor index for corrections.
+    """
+    def __init__(self, kinds):
+        self.kinds = dict(kinds)
+        self.symbols = sorted(self.kinds)
+        # Symmetric-delete index: two symbols one edit apart share a key
+        self._neighbors = defaultdict(set)
+        for symbol in self.symbols:
+            for key in _edit_keys(symbol):
+                self._neighbors[key].add(symbol)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.kinds
+
+    def search(self, prefix, limit=10):
+        """
+        Up to `limit` symbols starting with `prefix`, in alphabetical order.
+        """
+        prefix = prefix.strip().upper()
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.symbols, prefix)
+        # '~' sorts after every letter and digit
+        end = bisect.bisect_left(self.symbols, prefix + '~', lo=start)
+        return self.symbols[start:min(end, start + limit)]
+
+    def close_matches(self, symbol, limit=3):
+        """
+        Up to `limit` known symbols close to `symbol`, closest first.
+        """
+        candidates = set()
+        for key in _edit_keys(symbol):
+            candidates.update(self._neighbors.get(key, ()))
+        return difflib.get_close_matches(symbol, sorted(candidates), n=limit, cutoff=CORRECTION_CUTOFF)
+
+    def correction(self, symbol):
+        """
+        The known symbol `symbol` is a typo of, or None. Only unambiguous typos are
+        corrected: exactly one close symbol, and `symbol` is not a listed class of
+        a known company (PETR3 missing from the snapshot is not PETR4).
+        """
+        match = TICKER_PATTERN.match(symbol)
+        if match and match.group(1) in LISTED_CLASSES and self.has_company(symbol[:4]):
+            return None
+        matches = self.close_matches(symbol, limit=2)
+        return matches[0] if len(matches) == 1 else None
+
+    def has_company(self, root):
+        """
+        True when a known symbol starts with the 4-letter company `root`.
+        """
+        start = bisect.bisect_left(self.symbols, root)
+        return start < len(self.symbols) and self.symbols[start].startswith(root)
+
+def _edit_keys(symbol):
+    # The symbol and every way of deleting one character from it
+    return {symbol} | {symbol[:i] + symbol[i + 1:] for i in range(len(symbol))}
+
+_lock = threading.Lock()
+_state = {'index': None, 'version': None}
+# Unverified symbols Yahoo had no data for since the current snapshot
+_not_found = set()
+
+def build_index(frame=None):
+    """
+    Builds a TickerIndex from a MarketFrame, the known funds and saved portfolios.
+    """
+    kinds = {}
+    try:
+        for tickers in core.load_portfolios().values():
+            kinds.update((t.strip().upper(), 'carteira') for t in tickers if t.strip())
+    except Exception as e:
+        print(f"Erro ao carregar carteiras para o índice de ativos: {e}")
+    kinds.update((t, 'etf') for t in KNOWN_ETFS)
+    kinds.update((t, 'fii') for t in KNOWN_FIIS)
+    if frame is not None:
+        kinds.update((t, 'acao') for t in frame.tickers)
+    return TickerIndex(kinds)
+
+def get_index(load=False):
+    """
+    Index for the loaded market snapshot, rebuilt when the snapshot changes.
+    With load=True the snapshot is downloaded first when missing or stale (for
+    live requests, which need it anyway); otherwise nothing is fetched.
+    """
+    frame, version = core.peek_market_snapshot(), None
+    if load:
+        try:
+            frame, version = core.get_market_snapshot()
+        except Exception as e:
+            print(f"Erro ao carregar snapshot para o índice de ativos: {e}")
+    if frame is not None:
+        version = frame.version
+
+    with _lock:
+        if _state['index'] is None or version != _state['version']:
+            _state['index'] = build_index(frame)
+            _state['version'] = version
+            # Yahoo-only tickers are re-checked once per snapshot
+            _not_found.clear()
+        return _state['index']
+
+def normalize(symbols):
+    """
+    Typed symbols stripped, upper-cased and deduplicated, in order.
+    """
+    return list(dict.fromkeys(s.strip().upper() for s in symbols if s.strip()))
+
+def resolve(symbols, load=False):
+    """
+    Validates typed symbols against the universe before any upstream call
+    (see get_index for `load`).
+    Returns (accepted, corrections, rejected):
+      - known symbols are accepted as is;
+      - unambiguous typos of a known symbol are replaced by it ({typed: corrected},
+        see TickerIndex.correction);
+      - unknown ones of a fund/unit/BDR class (UNLISTED_CLASSES) are accepted
+        once and checked on Yahoo (see learn);
+      - anything else is rejected (see suggest).
+    """
+    index = get_index(load)
+    accepted, corrections, rejected = [], {}, []
+    for symbol in normalize(symbols):
+        if symbol in index:
+            accepted.append(symbol)
+            continue
+        match = TICKER_PATTERN.match(symbol)
+        unverified = match is not None and match.group(1) in UNLISTED_CLASSES and symbol not in _not_found
+        corrected = None if unverified else index.correction(symbol)
+        if corrected:
+            corrections[symbol] = corrected
+            accepted.append(corrected)
+        elif unverified:
+            accepted.append(symbol)
+        else:
+            rejected.append(symbol)
+    return list(dict.fromkeys(accepted)), corrections, rejected
+
+def suggest(symbols):
+    """
+    {symbol: [close known symbols]} for rejected symbols that have any, for the
+    caller to offer instead of guessing.
+    """
+    index = get_index()
+    suggestions = {s: index.close_matches(s) for s in symbols}
+    return {s: matches for s, matches in suggestions.items() if matches}
+
+def learn(requested, df):
+    """
+    Records which unverified symbols Yahoo had data for, given the market table
+    returned for `requested`: found ones join the universe, the others are
+    rejected from then on.
+    """
+    index = get_index()
+    found = set(df.index[df['cotacao'] > 0]) if not df.empty and 'cotacao' in df.columns else set()
+    unverified = [s for s in requested if s not in index]
+    add([s for s in unverified if s in found], kind='yahoo')
+    with _lock:
+        _not_found.update(s for s in unverified if s not in found)
+
+def add(symbols, kind='carteira'):
+    """
+    Adds symbols to the current universe (e.g. tickers of a newly saved portfolio).
+    """
+    with _lock:
+        index = _state['index']
+        if index is not None:
+            new = {s.strip().upper(): kind for s in symbols if s.strip() and s.strip().upper() not in index}
+            if new:
+                _state['index'] = TickerIndex({**new, **index.kinds})
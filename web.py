@@ -84,7 +84,7 @@ def get_analysis(tickers: Optional[str] = Query(None)):
         return []
 
     # Calculate Valuation
-    df_valuation = df_analise.apply(core.calcular_valuation, axis=1)
+    df_valuation = core.valuation_indicators(df_analise)
     df_final = pd.concat([df_analise, df_valuation], axis=1)
 
     # Format for JSON